@@ -0,0 +1,28 @@
+"""messages (thread_id, created_at) index
+
+Revision ID: 7c1d9e4a2b6f
+Revises: 50e3252bd1e4
+Create Date: 2025-10-02 10:12:41.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1d9e4a2b6f'
+down_revision: Union[str, Sequence[str], None] = '50e3252bd1e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_messages_thread_id_created_at', 'messages', ['thread_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_thread_id_created_at', table_name='messages')
@@ -0,0 +1,62 @@
+"""messages full-text search (FTS5 on SQLite, tsvector + GIN on Postgres)
+
+Revision ID: b4e8f2c91d07
+Revises: 7c1d9e4a2b6f
+Create Date: 2025-10-06 15:27:09.118342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e8f2c91d07'
+down_revision: Union[str, Sequence[str], None] = '7c1d9e4a2b6f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        # Standalone FTS table: messages has no INTEGER PRIMARY KEY, so its
+        # rowids may change on VACUUM and cannot back an external-content index
+        op.execute(
+            "CREATE VIRTUAL TABLE messages_fts USING fts5("
+            "content, message_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "CREATE TRIGGER messages_fts_ai AFTER INSERT ON messages BEGIN "
+            "INSERT INTO messages_fts (content, message_id) VALUES (new.content, new.id); END"
+        )
+        op.execute(
+            "CREATE TRIGGER messages_fts_ad AFTER DELETE ON messages BEGIN "
+            "DELETE FROM messages_fts WHERE message_id = old.id; END"
+        )
+        op.execute(
+            "CREATE TRIGGER messages_fts_au AFTER UPDATE OF content ON messages BEGIN "
+            "UPDATE messages_fts SET content = new.content WHERE message_id = old.id; END"
+        )
+        op.execute("INSERT INTO messages_fts (content, message_id) SELECT content, id FROM messages")
+    elif dialect == 'postgresql':
+        op.execute(
+            "ALTER TABLE messages ADD COLUMN search tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED"
+        )
+        op.create_index('ix_messages_search', 'messages', ['search'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS messages_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS messages_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS messages_fts_ai")
+        op.execute("DROP TABLE IF EXISTS messages_fts")
+    elif dialect == 'postgresql':
+        op.drop_index('ix_messages_search', table_name='messages')
+        op.drop_column('messages', 'search')
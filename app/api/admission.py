@@ -0,0 +1,25 @@
+# GET /admission/stats, /admission/transport, /admission/routing
+from fastapi import APIRouter
+from app.core.admission import admission
+from app.core.model_router import model_router
+from app.core.openai_client import transport_stats
+
+router = APIRouter(prefix="/admission", tags=["admission"])
+
+
+@router.get("/stats")
+async def admission_stats():
+    """Live slots, queue depth and wait times per limiter"""
+    return admission.stats()
+
+
+@router.get("/transport")
+async def admission_transport():
+    """Shared HTTP pool utilization, retry and hedging settings"""
+    return transport_stats()
+
+
+@router.get("/routing")
+async def admission_routing():
+    """EWMA time-to-first-token, error rate and failovers per model"""
+    return model_router.stats()
@@ -1,18 +1,28 @@
-# POST /charts
+# POST /charts, GET /charts/uploads/stats
 import os
 import re
 import uuid
 import json
 import base64
+import logging
 from fastapi import HTTPException, APIRouter
 from fastapi.staticfiles import StaticFiles
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+from app.core.admission import admission
 from app.core.openai_client import client
 from app.core.schemas import ChartIn
+from app.services.chart_render import ChartDataError, remote_dataset, render_local
+from app.services.dataset_uploads import dataset_uploads, store_dataset
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/charts", tags=["charts"])
 
+# local: matplotlib in the chart process pool; remote: Code Interpreter
+CHART_ENGINE = os.getenv("CHART_ENGINE", "local")
+# Retry a failed default local render remotely (never when local was asked for)
+CHART_REMOTE_FALLBACK = os.getenv("CHART_REMOTE_FALLBACK", "1") in ("1", "true", "True")
+CHART_REMOTE_MODEL = "gpt-4.1-mini"
+
 STORAGE_DIR = "storage"
 os.makedirs(STORAGE_DIR, exist_ok=True)
 router.mount("/static", StaticFiles(directory=STORAGE_DIR), name="static")
@@ -51,38 +61,88 @@ def _parse_base64_payload(text: str):
 
 @router.post("/")
 async def create_chart(payload: ChartIn):
-    chart_id = uuid.uuid4().hex[:8]
+    """Render a chart locally, or with Code Interpreter when asked to.
 
-    raw_filename = f"data_{chart_id}.txt"
-    raw_path = os.path.join(STORAGE_DIR, raw_filename)
+    Local rendering makes no upstream call and so takes no admission
+    slot; the remote path holds a "charts" slot for the model.
+    """
+    chart_id = uuid.uuid4().hex[:8]
+    engine = payload.engine or CHART_ENGINE
+    if engine == "local":
+        try:
+            return await _render_local(payload, chart_id)
+        except ChartDataError as e:
+            if payload.engine == "local" or not CHART_REMOTE_FALLBACK:
+                raise HTTPException(status_code=422, detail=f"Cannot chart data locally: {e}")
+            logger.info("chart %s: local renderer rejected data (%s), falling back to remote", chart_id, e)
+        except Exception as e:
+            if payload.engine == "local" or not CHART_REMOTE_FALLBACK:
+                raise HTTPException(status_code=500, detail=f"Local chart rendering failed: {e}")
+            logger.exception("chart %s: local rendering failed, falling back to remote", chart_id)
+    async with admission.admit("charts", CHART_REMOTE_MODEL):
+        return await _render_remote(payload, chart_id)
+
+
+@router.get("/uploads/stats")
+async def upload_stats():
+    return dataset_uploads.stats()
+
+
+def _spec(payload: ChartIn) -> dict:
+    return {
+        "chart_type": payload.chart_type,
+        "data": payload.data,
+        "title": payload.title,
+        "x_label": payload.x_label,
+        "y_label": payload.y_label,
+        "output_format": payload.output_format,
+    }
+
+
+async def _render_local(payload: ChartIn, chart_id: str) -> dict:
+    blob, render_ms, points = await render_local(_spec(payload))
+    filename = f"chart_{chart_id}.{payload.output_format}"
+    with open(os.path.join(STORAGE_DIR, filename), "wb") as fh:
+        fh.write(blob)
+    return {
+        "chart_id": chart_id,
+        "download_url": f"/static/{filename}",
+        "response_id": None,
+        "filename": filename,
+        "chart_type": payload.chart_type,
+        "output_format": payload.output_format,
+        "content_preview": None,
+        "engine": "local",
+        "render_ms": round(render_ms, 1),
+        **points,
+    }
+
+
+async def _render_remote(payload: ChartIn, chart_id: str) -> dict:
+    # Upload the downsampled columns rather than every raw point
+    dataset_note = ""
+    points = {}
     try:
+        data_text, points = await remote_dataset(_spec(payload))
+        if payload.chart_type == "histogram":
+            dataset_note = " The data is pre-binned: draw one bar per row from bin_start to bin_end with height count."
+    except ChartDataError:
+        data_text = None
+
+    if data_text is None:
+        ext = "txt" if isinstance(payload.data, str) else "json"
         data_text = payload.data if isinstance(payload.data, str) else json.dumps(payload.data, ensure_ascii=False)
-        with open(raw_path, "w", encoding="utf-8") as raw_file:
-            raw_file.write(data_text)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save raw data: {e}")
-
-    pdf_filename = f"data_{chart_id}.pdf"
-    pdf_path = os.path.join(STORAGE_DIR, pdf_filename)
+    else:
+        ext = "csv"
+    data = data_text.encode("utf-8")
     try:
-        c = canvas.Canvas(pdf_path, pagesize=letter)
-        width, height = letter
-        text_obj = c.beginText(40, height - 50)
-        for line in data_text.splitlines() or [""]:
-            text_obj.textLine(line)
-            if text_obj.getY() <= 40:
-                c.drawText(text_obj)
-                c.showPage()
-                text_obj = c.beginText(40, height - 50)
-        c.drawText(text_obj)
-        c.save()
+        store_dataset(data, STORAGE_DIR, ext)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to convert data to PDF: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to save raw data: {e}")
 
+    # Identical datasets reuse the file uploaded for an earlier chart
     try:
-        with open(pdf_path, "rb") as f:
-            uploaded_file = await client.files.create(file=f, purpose="user_data")
-        file_id = uploaded_file.id
+        file_id, upload_reused = await dataset_uploads.file_id(data, ext)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to upload data file: {e}")
 
@@ -91,7 +151,7 @@ async def create_chart(payload: ChartIn):
 You are a python data scientist running inside Code Interpreter.
 
 Steps:
-1. Read and parse the attached input_file (PDF with the dataset text/JSON).
+1. Read and parse the dataset file in /mnt/data ({ext.upper()}).{dataset_note}
 2. Create a {payload.chart_type} chart using matplotlib (seaborn optional).
 3. Add labels and title:
    - Title: {payload.title or f"{payload.chart_type.title()} Chart"}
@@ -104,16 +164,14 @@ Steps:
 """
 
     try:
-        tools_cfg = [{"type": "code_interpreter"}]
-        if os.getenv("OPENAI_REQUIRE_CONTAINER", "0") in ("1", "true", "True"):
-            tools_cfg = [{"type": "code_interpreter", "container": {"type": "auto"}}]
+        # Code Interpreter reads the dataset straight from its container
+        tools_cfg = [{"type": "code_interpreter", "container": {"type": "auto", "file_ids": [file_id]}}]
 
         response = await client.responses.create(
-            model="gpt-4.1-mini",
+            model=CHART_REMOTE_MODEL,
             input=[{
                 "role": "user",
                 "content": [
-                    {"type": "input_file", "file_id": file_id},
                     {"type": "input_text", "text": instruction},
                 ],
             }],
@@ -169,6 +227,9 @@ Steps:
             "chart_type": payload.chart_type,
             "output_format": payload.output_format,
             "content_preview": output_text[:500] if output_text else None,
+            "engine": "remote",
+            "upload_reused": upload_reused,
+            **points,
         }
 
     except HTTPException:
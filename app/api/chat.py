@@ -1,44 +1,160 @@
 # POST /chat/stream
-from fastapi import APIRouter
+import asyncio
+import logging
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse
-from app.core.openai_client import client
+from app.core.admission import Ticket, admission
+from app.core.model_router import MODEL_ROUTING, AllCandidatesFailed, model_router
+from app.core.openai_client import STREAM_TIMEOUT, client
 from app.core.schemas import ChatStreamIn
-from app.core.sse import sse_headers, sse_event
+from app.core.sse import coalesce_deltas, sse_delta_bytes, sse_event_bytes, sse_headers
 from app.services.chat_history import save_entry
+from app.services.compaction import CHAT_COMPACTION, compact_context
+from app.services.response_cache import (
+    CHAT_CACHE_ENABLED,
+    CHAT_CACHE_REPLAY_DELAY_MS,
+    CachedResponse,
+    cache_key,
+    response_cache,
+)
+from app.services.retrieval import build_instructions, retrieve
+from app.services.singleflight import CHAT_SINGLEFLIGHT, CHAT_SINGLEFLIGHT_SCOPE_HEADER, chat_flights
+from app.services.stream_registry import parse_event_id, stream_registry
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
-async def event_generator_responses(payload: ChatStreamIn):
+
+def _cache_key(payload: ChatStreamIn) -> str:
+    return cache_key(
+        model=payload.model,
+        system=payload.system,
+        message=payload.message,
+        previous_response_id=payload.previous_response_id,
+        retrieval=payload.retrieval.model_dump() if payload.retrieval else None,
+        compact=payload.compact,
+    )
+
+
+async def replay_cached(entry: CachedResponse, delay_ms: float = CHAT_CACHE_REPLAY_DELAY_MS):
+    """Replay a cached answer as the same delta/final/response/done sequence"""
+    for delta in entry.deltas:
+        yield sse_delta_bytes(delta)
+        if delay_ms > 0:
+            await asyncio.sleep(delay_ms / 1000)
+    if entry.final_text:
+        yield sse_event_bytes({"type": "final", "content": entry.final_text})
+    yield sse_event_bytes({"type": "response", "response_id": entry.response_id, "cached": True})
+    yield sse_event_bytes({"type": "done"})
+
+
+async def event_generator_responses(
+    payload: ChatStreamIn,
+    use_cache: bool = False,
+    candidates: Optional[List[str]] = None,
+    ticket: Optional[Ticket] = None,
+):
+    """Upstream chat stream as SSE frames; cache hits are served by the caller.
+
+    ``candidates`` pins the routing order the admission slot was taken for,
+    and on failover ``ticket``'s model slot follows the model actually used.
+    """
+    deltas = []
+    started_id = None
+    routing = None
     try:
+        key = _cache_key(payload) if use_cache else None
+        instructions = payload.system or "You are a helpful assistant."
+        if payload.retrieval:
+            hits, timings = await retrieve(
+                payload.message,
+                k=payload.retrieval.k,
+                filters=payload.retrieval.filters,
+                min_score=payload.retrieval.min_score,
+            )
+            instructions = build_instructions(instructions, hits)
+            yield sse_event_bytes({
+                "type": "retrieval",
+                "latency_ms": timings["total_ms"],
+                "timings": timings,
+                "chunks": [
+                    {"id": h["id"], "score": round(h["score"], 4), "source": h["metadata"].get("source")}
+                    for h in hits
+                ],
+            })
+
+        compaction = None
+        compact = CHAT_COMPACTION if payload.compact is None else payload.compact
+        if compact and payload.previous_response_id:
+            try:
+                compaction = await compact_context(payload.previous_response_id, payload.message)
+            except Exception:
+                # Fall back to chaining the full history
+                logger.exception("context compaction failed")
+            if compaction:
+                yield sse_event_bytes(compaction.report())
+
         request_data = {
             "model": payload.model,
-            "input": payload.message,
-            "instructions": payload.system or "You are a helpful assistant.",
+            "input": compaction.input if compaction else payload.message,
+            "instructions": instructions,
+            # Read timeout here bounds the idle gap between stream chunks
+            "timeout": STREAM_TIMEOUT,
         }
-        if payload.previous_response_id:
+        if payload.previous_response_id and not compaction:
             request_data["previous_response_id"] = payload.previous_response_id
 
-        async with client.responses.stream(**request_data) as stream:
+        errored = False
+        # With routing on, a stalled or failing model is swapped before its first delta
+        opened = (
+            model_router.stream(
+                request_data,
+                candidates,
+                charge=(lambda model: admission.switch_model(ticket, model)) if ticket else None,
+            )
+            if MODEL_ROUTING else client.responses.stream(**request_data)
+        )
+        async with opened as stream:
+            if MODEL_ROUTING:
+                routing = stream.decision
             final = None
-            async for event in stream:
+            # SSE_COALESCE_MS > 0 merges bursts of deltas into fewer frames
+            async for event in coalesce_deltas(stream):
                 event_type = getattr(event, "type", None)
                 if event_type == "response.output_text.delta":
                     delta = getattr(event, "delta", "")
                     if delta:
-                        yield sse_event({"type": "delta", "content": delta})
+                        deltas.append(delta)
+                        yield sse_delta_bytes(delta)
+                elif event_type == "response.created":
+                    started_id = getattr(getattr(event, "response", None), "id", None)
                 elif event_type == "response.error":
+                    errored = True
                     error = getattr(event, "error", "")
                     msg = getattr(error, "message", "unknown error") if error else "unknown error"
-                    yield sse_event({"type": "error", "message": msg})
+                    yield sse_event_bytes({"type": "error", "message": msg})
 
             final = await stream.get_final_response()
             final_text = getattr(final, "output_text", None)
             if final_text:
-                yield sse_event({"type": "final", "content": final_text})
+                yield sse_event_bytes({"type": "final", "content": final_text})
 
         response_id = getattr(final, "id", None)
-        yield sse_event({"type": "response", "response_id": response_id})
-        yield sse_event({"type": "done"})
+        response_event = {"type": "response", "response_id": response_id}
+        if routing:
+            response_event["routing"] = routing
+        yield sse_event_bytes(response_event)
+        yield sse_event_bytes({"type": "done"})
+
+        if key and response_id and not errored:
+            response_cache.put(key, CachedResponse(
+                deltas=deltas,
+                final_text=final_text,
+                response_id=response_id,
+                model=getattr(final, "model", None),
+            ))
 
         if response_id:
             user_text = payload.message
@@ -53,13 +169,101 @@ async def event_generator_responses(payload: ChatStreamIn):
                 model=model,
                 created_at=created_at,
             )
+    except asyncio.CancelledError:
+        # Every client went away: the stream context above has already
+        # closed the upstream request; keep what was generated so far
+        if started_id:
+            await save_entry(
+                response_id=started_id,
+                previous_response_id=payload.previous_response_id,
+                user_text=payload.message,
+                assistant_text="".join(deltas) or None,
+                model=routing["model"] if routing else payload.model,
+                created_at=None,
+                metadata={"partial": True, "reason": "client_disconnected"},
+            )
+        raise
+    except AllCandidatesFailed as e:
+        yield sse_event_bytes({"type": "error", "message": str(e), "routing": e.decision})
     except Exception as e:
-        yield sse_event({"type": "error", "message": str(e)})
+        yield sse_event_bytes({"type": "error", "message": str(e)})
 
 @router.post("/stream")
-async def stream_chat(payload: ChatStreamIn):
+async def stream_chat(payload: ChatStreamIn, request: Request):
+    # A reconnect carrying Last-Event-ID continues the buffered stream
+    resumed = stream_registry.resume(request.headers.get("last-event-id"))
+    if resumed is not None:
+        return StreamingResponse(resumed, media_type="text/event-stream", headers=sse_headers())
+
+    no_cache = "no-cache" in request.headers.get("cache-control", "").lower()
+    use_cache = CHAT_CACHE_ENABLED and not no_cache
+    if CHAT_CACHE_ENABLED and no_cache:
+        response_cache.bypasses += 1
+
+    key = _cache_key(payload)
+    cached = response_cache.get(key) if use_cache else None
+    if cached is not None:
+        # Replays make no upstream call, so they take no admission slot
+        buffer = stream_registry.start(lambda: replay_cached(cached))
+        return StreamingResponse(
+            buffer.follow(),
+            media_type="text/event-stream",
+            headers={**sse_headers(), "X-Stream-Id": buffer.stream_id},
+        )
+
+    # A continuation belongs to one caller's thread and is never shared
+    coalesce = CHAT_SINGLEFLIGHT and not no_cache and not payload.previous_response_id
+    # Identical concurrent requests from the same caller share one upstream
+    # stream (and its response_id) and need no slot
+    flight_key = f"{request.headers.get(CHAT_SINGLEFLIGHT_SCOPE_HEADER, '')}\x00{key}"
+    buffer = chat_flights.attach(flight_key) if coalesce else None
+    if buffer is None:
+        # Count the model the router will open first, not the one asked for
+        candidates = model_router.candidates(payload.model) if MODEL_ROUTING else None
+        # Raises 429/503 with Retry-After when chat capacity is exhausted
+        ticket = await admission.acquire("chat", candidates[0] if candidates else payload.model)
+        factory = lambda: event_generator_responses(
+            payload, use_cache=use_cache, candidates=candidates, ticket=ticket
+        )
+        if coalesce:
+            buffer, started = chat_flights.join(flight_key, factory, on_done=ticket.release)
+            if not started:
+                ticket.release()
+        else:
+            buffer = stream_registry.start(factory, on_done=ticket.release)
+    return StreamingResponse(
+        buffer.follow(),
+        media_type="text/event-stream",
+        headers={**sse_headers(), "X-Stream-Id": buffer.stream_id},
+    )
+
+
+@router.get("/stream/{stream_id}")
+async def reattach_stream(stream_id: str, request: Request, last_event_id: Optional[str] = None):
+    """Attach to a live or recently finished stream from another connection"""
+    buffer = stream_registry.get(stream_id)
+    if buffer is None:
+        raise HTTPException(status_code=404, detail="Stream not found or expired")
+    parsed = parse_event_id(request.headers.get("last-event-id") or last_event_id)
+    after = parsed[1] if parsed and parsed[0] == stream_id else -1
+    stream_registry.resumes += 1
     return StreamingResponse(
-        event_generator_responses(payload),
+        buffer.follow(after),
         media_type="text/event-stream",
-        headers=sse_headers(),
-    )
\ No newline at end of file
+        headers={**sse_headers(), "X-Stream-Id": stream_id},
+    )
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    return response_cache.stats()
+
+
+@router.get("/singleflight/stats")
+async def singleflight_stats():
+    return chat_flights.stats()
+
+
+@router.get("/streams/stats")
+async def streams_stats():
+    return stream_registry.stats()
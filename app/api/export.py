@@ -4,7 +4,8 @@ import uuid
 import json
 import csv
 import io
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from app.core.admission import admission
 from app.core.schemas import ExportIn
 from app.core.openai_client import client
 
@@ -98,7 +99,7 @@ def _collect_output_files(response) -> list:
     return files
 
 
-@router.post("/")
+@router.post("/", dependencies=[Depends(admission.slot("export", "gpt-4.1"))])
 async def export_content(payload: ExportIn):
     """Export content to various formats"""
     
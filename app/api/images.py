@@ -1,15 +1,16 @@
 # POST/images
 import os
 import uuid
-import requests
-from fastapi import HTTPException, APIRouter
-from app.core.openai_client import client
+import httpx
+from fastapi import Depends, HTTPException, APIRouter
+from app.core.admission import admission
+from app.core.openai_client import client, get_with_retries
 from app.core.schemas import ImageIn
 
 router = APIRouter(prefix="/images", tags=["images"])
 
 
-@router.post("/")
+@router.post("/", dependencies=[Depends(admission.slot("images", "dall-e-3"))])
 async def generate_image(payload: ImageIn):
     """Generate image using gpt-image-1"""
 
@@ -28,8 +29,7 @@ async def generate_image(payload: ImageIn):
 
         # Download image
         download_url = response.data[0].url
-        img_response = requests.get(download_url)
-        img_response.raise_for_status()
+        img_response = await get_with_retries(download_url)
 
         # Save image
         img_id = str(uuid.uuid4())
@@ -47,7 +47,7 @@ async def generate_image(payload: ImageIn):
             "size": payload.size,
             "model": "dall-e-3",
         }
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to download image: {str(e)}"
         )
@@ -0,0 +1,25 @@
+# POST /ingest
+from fastapi import HTTPException, APIRouter
+from app.services.ingestion import STORAGE_DIR, ingest_directory
+from app.services.embeddings import CachedEmbedder, get_embedder
+from app.services.retrieval import get_index
+
+router = APIRouter(prefix="/ingest", tags=["ingest"])
+
+
+@router.post("/")
+async def ingest(force: bool = False):
+    """Incrementally index new or changed files under storage/"""
+    try:
+        return await ingest_directory(STORAGE_DIR, force=force)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ingestion failed: {str(e)}")
+
+
+@router.get("/stats")
+async def ingest_stats():
+    embedder = get_embedder()
+    return {
+        "index": get_index().stats(),
+        "embedding_store": embedder.store.stats() if isinstance(embedder, CachedEmbedder) else None,
+    }
@@ -1,13 +1,25 @@
-# POST /reports
+# POST /reports, /reports/stream, /reports/batch, GET /reports/cache/stats
+import asyncio
 import json
 import os
-import uuid
-from fastapi import HTTPException, APIRouter
-from app.core.openai_client import client
-from app.core.schemas import ReportIn
+import time
+from typing import AsyncIterator, Optional
+from fastapi import Depends, HTTPException, APIRouter
+from fastapi.responses import StreamingResponse
+from app.core.admission import ROUTE_LIMITS, admission
+from app.core.openai_client import STREAM_TIMEOUT, client
+from app.core.schemas import ReportBatchIn, ReportIn
+from app.core.sse import sse_event_bytes, sse_headers
+from app.services.json_stream import IncrementalJSONParser
+from app.services.report_cache import report_cache, report_key
 
 router = APIRouter(prefix="/reports", tags=["reports"])
 
+REPORT_BATCH_CONCURRENCY = int(os.getenv("REPORT_BATCH_CONCURRENCY", "4"))
+# Share of the "reports" route limit one batch may hold, so single
+# reports and other batches still get slots
+REPORT_BATCH_ROUTE_SHARE = float(os.getenv("REPORT_BATCH_ROUTE_SHARE", "0.5"))
+
 # optimized JSON schemas
 SCHEMAS = {
     "summary": {
@@ -48,9 +60,33 @@ SCHEMAS = {
 }
 
 
+async def _miss_slot(payload: ReportIn):
+    """Holds a "reports" admission slot for the request, unless it is a cache hit"""
+    if payload.schema_id in SCHEMAS:
+        key = report_key(payload.schema_id, SCHEMAS[payload.schema_id], payload.query, payload.model)
+        if report_cache.get(key) is not None:
+            yield None
+            return
+    async with admission.admit("reports", payload.model) as ticket:
+        yield ticket
+
+
+async def _admitted_report(payload: ReportIn) -> dict:
+    # Only a miss that actually calls upstream takes a slot; hits and
+    # requests coalesced onto it do not
+    async with admission.admit("reports", payload.model):
+        return await _generate_report(payload)
+
+
 @router.post("/")
 async def create_report(payload: ReportIn):
-    """Generate structured report using OpenAI JSON schema"""
+    """Generate structured report using OpenAI JSON schema.
+
+    Reports are cached by (schema, normalized query, model); a hit makes
+    no upstream call, writes nothing and takes no admission slot.
+    Markdown is stored under its content hash, so identical reports share
+    one file.
+    """
 
     if payload.schema_id not in SCHEMAS:
         raise HTTPException(
@@ -59,54 +95,12 @@ async def create_report(payload: ReportIn):
         )
 
     try:
-        # OpenAI Structured Output - optimized
-        response = await client.responses.create(
-            model=payload.model,
-            input=payload.query,
-            instructions=f"Generate a {payload.schema_id} report based on the following query: {payload.query}",
-            text={
-                "format": {
-                    "name": "json_schema",
-                    "json_schema": {
-                        "name": f"{payload.schema_id}_report",
-                        "schema": SCHEMAS[payload.schema_id],
-                        "strict": True,
-                    },
-                },
-            },
-            temperature=0.5,
-        )
-
-        # get text JSON from output
-        #SDK return array output -> content -> text
-        out_text = getattr(response, "output_text", "") or ""
-        if not out_text and response.output:
-            for item in response.output:
-                for c in getattr(item, "content", []):
-                    t = getattr(c, "text", None)
-                    if t:
-                        out_text += t    
-        json_data = json.loads(out_text)
-        # Generate markdown
-        markdown_content = _render_markdown(json_data, payload.schema_id)
-
-        # Save file
-        report_id = str(uuid.uuid4())
-        filename = f"report_{report_id}.md"
-        filepath = f"storage/{filename}"
-
-        os.makedirs("storage", exist_ok=True)
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(markdown_content)
-
-        return {
-            "report_id": report_id,
-            "filename": filename,
-            "filepath": filepath,
-            "markdown": markdown_content,
-            "json": json_data,
-            "response_id": response.id,
-        }
+        key = report_key(payload.schema_id, SCHEMAS[payload.schema_id], payload.query, payload.model)
+        report, cached = await report_cache.get_or_create(key, lambda: _admitted_report(payload))
+        return {**report, "cached": cached}
+    except HTTPException:
+        # 429/503 from admission
+        raise
     except json.JSONDecodeError as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to parse JSON response: {str(e)}"
@@ -117,6 +111,228 @@ async def create_report(payload: ReportIn):
         )
 
 
+@router.post("/stream", dependencies=[Depends(_miss_slot)])
+async def stream_report(payload: ReportIn):
+    """Generate a report over SSE, sending each part as soon as it is parsed.
+
+    Every completed top-level field, and every item of a list field, is
+    sent as a ``field`` event followed by the markdown rendered from the
+    report so far. The stored report comes last in a ``report`` event.
+    """
+    if payload.schema_id not in SCHEMAS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid schema_id. Available: {list(SCHEMAS.keys())}",
+        )
+    key = report_key(payload.schema_id, SCHEMAS[payload.schema_id], payload.query, payload.model)
+    return StreamingResponse(_stream_report(payload, key), media_type="text/event-stream", headers=sse_headers())
+
+
+@router.post("/batch")
+async def create_report_batch(payload: ReportBatchIn):
+    """Generate one report per query, streaming each as soon as it is done.
+
+    At most ``concurrency`` reports are in flight, and never more than
+    ``REPORT_BATCH_ROUTE_SHARE`` of the "reports" route limit; each miss
+    takes its own admission slot. Lines arrive in completion order and carry
+    the query's ``index``. A failed item yields an ``error`` line and the
+    batch carries on; the last line is a ``summary`` with throughput.
+    """
+    if payload.schema_id not in SCHEMAS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid schema_id. Available: {list(SCHEMAS.keys())}",
+        )
+    # One batch may hold only part of the route's slots
+    route_limit = ROUTE_LIMITS.get("reports", REPORT_BATCH_CONCURRENCY)
+    concurrency = min(
+        payload.concurrency or REPORT_BATCH_CONCURRENCY,
+        max(1, int(route_limit * REPORT_BATCH_ROUTE_SHARE)),
+        len(payload.queries),
+    )
+    records = _run_batch(payload, concurrency)
+    if payload.format == "sse":
+        frames = (sse_event_bytes(record) async for record in records)
+        return StreamingResponse(frames, media_type="text/event-stream", headers=sse_headers())
+    lines = (json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n" async for record in records)
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+async def _batch_item(payload: ReportBatchIn, index: int) -> dict:
+    query = payload.queries[index]
+    started = time.perf_counter()
+    try:
+        item = ReportIn(schema_id=payload.schema_id, query=query, model=payload.model)
+        key = report_key(item.schema_id, SCHEMAS[item.schema_id], item.query, item.model)
+        report, cached = await report_cache.get_or_create(key, lambda: _admitted_report(item))
+        return {
+            "type": "report",
+            "index": index,
+            "cached": cached,
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+            **report,
+        }
+    except Exception as e:
+        return {
+            "type": "error",
+            "index": index,
+            "query": query,
+            "status": getattr(e, "status_code", 500),
+            "error": getattr(e, "detail", None) or str(e),
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+
+async def _run_batch(payload: ReportBatchIn, concurrency: int) -> AsyncIterator[dict]:
+    """Fixed pool of workers over the queries; records in completion order"""
+    started = time.perf_counter()
+    results: "asyncio.Queue[Optional[dict]]" = asyncio.Queue()
+    next_index = iter(range(len(payload.queries)))
+
+    async def worker() -> None:
+        try:
+            for index in next_index:
+                await results.put(await _batch_item(payload, index))
+        finally:
+            await results.put(None)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    counts = {"succeeded": 0, "failed": 0, "cached": 0}
+    try:
+        running = len(workers)
+        while running:
+            record = await results.get()
+            if record is None:
+                running -= 1
+                continue
+            if record["type"] == "report":
+                counts["succeeded"] += 1
+                counts["cached"] += record["cached"]
+            else:
+                counts["failed"] += 1
+            yield record
+    finally:
+        # Client went away: stop generating reports nobody will read
+        for task in workers:
+            task.cancel()
+
+    elapsed = time.perf_counter() - started
+    yield {
+        "type": "summary",
+        "total": len(payload.queries),
+        **counts,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        # Failed items are not throughput
+        "reports_per_s": round(counts["succeeded"] / elapsed, 3) if elapsed > 0 else None,
+    }
+
+
+@router.get("/cache/stats")
+async def report_cache_stats():
+    return report_cache.stats()
+
+
+def _report_request(payload: ReportIn) -> dict:
+    """Arguments shared by the blocking and the streaming Responses call"""
+    return {
+        "model": payload.model,
+        "input": payload.query,
+        "instructions": f"Generate a {payload.schema_id} report based on the following query: {payload.query}",
+        "text": {
+            "format": {
+                "name": "json_schema",
+                "json_schema": {
+                    "name": f"{payload.schema_id}_report",
+                    "schema": SCHEMAS[payload.schema_id],
+                    "strict": True,
+                },
+            },
+        },
+        "temperature": 0.5,
+    }
+
+
+def _stored_report(json_data: dict, payload: ReportIn, response_id: Optional[str]) -> dict:
+    # Generate markdown
+    markdown_content = _render_markdown(json_data, payload.schema_id)
+
+    # Save file, once per distinct content
+    digest, filepath = report_cache.store(markdown_content)
+    return {
+        "report_id": digest,
+        "filename": os.path.basename(filepath),
+        "filepath": filepath,
+        "markdown": markdown_content,
+        "json": json_data,
+        "response_id": response_id,
+    }
+
+
+async def _generate_report(payload: ReportIn) -> dict:
+    # OpenAI Structured Output - optimized
+    response = await client.responses.create(**_report_request(payload))
+
+    # get text JSON from output
+    #SDK return array output -> content -> text
+    out_text = getattr(response, "output_text", "") or ""
+    if not out_text and response.output:
+        for item in response.output:
+            for c in getattr(item, "content", []):
+                t = getattr(c, "text", None)
+                if t:
+                    out_text += t
+    json_data = json.loads(out_text)
+    return _stored_report(json_data, payload, response.id)
+
+
+async def _stream_report(payload: ReportIn, key: str) -> AsyncIterator[bytes]:
+    cached = report_cache.get(key)
+    if cached is not None:
+        yield sse_event_bytes({"type": "markdown", "markdown": cached["markdown"]})
+        yield sse_event_bytes({"type": "report", **cached, "cached": True})
+        yield sse_event_bytes({"type": "done"})
+        return
+    try:
+        parser = IncrementalJSONParser()
+        async with client.responses.stream(**_report_request(payload), timeout=STREAM_TIMEOUT) as stream:
+            async for event in stream:
+                event_type = getattr(event, "type", None)
+                if event_type == "response.error":
+                    error = getattr(event, "error", None)
+                    raise RuntimeError(getattr(error, "message", None) or "unknown error")
+                if event_type != "response.output_text.delta":
+                    continue
+                sections = [
+                    path for path, _ in parser.feed(getattr(event, "delta", "") or "")
+                    if len(path) in (1, 2)
+                ]
+                for path in sections:
+                    # A top-level field or one item of a list field is complete
+                    field_value = parser.value[path[0]]
+                    yield sse_event_bytes({
+                        "type": "field",
+                        "path": list(path),
+                        "value": field_value[path[1]] if len(path) == 2 else field_value,
+                    })
+                if sections:
+                    yield sse_event_bytes({
+                        "type": "markdown",
+                        "markdown": _render_markdown(parser.value, payload.schema_id),
+                    })
+            parser.close()
+            final = await stream.get_final_response()
+
+        report = _stored_report(parser.value, payload, getattr(final, "id", None))
+        report_cache.put(key, report)
+        yield sse_event_bytes({"type": "report", **report, "cached": False})
+        yield sse_event_bytes({"type": "done"})
+    except ValueError as e:
+        yield sse_event_bytes({"type": "error", "message": f"Failed to parse JSON response: {e}"})
+    except Exception as e:
+        yield sse_event_bytes({"type": "error", "message": f"Error generating report: {e}"})
+
+
 def _render_markdown(json_data: dict, schema_id: str) -> str:
     """Render JSON data to markdown"""
     if schema_id == "summary":
@@ -0,0 +1,23 @@
+# GET /search/messages
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.services.message_search import SEARCH_MAX_OFFSET, SearchIndexMissing, search_messages
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+
+@router.get("/messages")
+async def search(
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=SEARCH_MAX_OFFSET),
+    thread_id: Optional[str] = None,
+    role: Optional[str] = Query(None, pattern="^(user|assistant)$"),
+):
+    """Ranked full-text search over persisted messages, with snippets"""
+    try:
+        return await search_messages(q, limit=limit, offset=offset, thread_id=thread_id, role=role)
+    except SearchIndexMissing as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
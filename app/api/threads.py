@@ -1,111 +1,132 @@
-# GET /threads/:response_id/messages
-from fastapi import HTTPException, APIRouter
-from app.core.openai_client import client
-from app.services.chat_history import build_thread_messages, save_entry
+# GET /threads/:response_id/messages, /threads/cache/stats, /threads/export; POST /threads/import
+import json
+from typing import Optional
+from fastapi import HTTPException, APIRouter, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from app.services.chat_history import (
+    HISTORY_PAGE_MAX_LIMIT,
+    encode_cursor,
+    history_generation,
+    history_stats,
+    thread_page,
+)
+from app.services.payload_cache import THREAD_CACHE_MAX_AGE_S, etag_matches, strong_etag, thread_payloads
+from app.services.thread_hydration import thread_hydrator
+from app.services.thread_transfer import NDJSONError, export_ndjson, import_ndjson
 
 router = APIRouter(prefix="/threads", tags=["threads"])
 
+def _cached_response(request: Request, etag: str, body: bytes) -> Response:
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={THREAD_CACHE_MAX_AGE_S}"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        thread_payloads.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.get("/{response_id}/messages")
-async def get_messages(response_id: str, limit: int = 50):
+async def get_messages(
+    response_id: str,
+    request: Request,
+    limit: int = Query(50, ge=1, le=HISTORY_PAGE_MAX_LIMIT),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+):
+    """Messages of the thread ending at response_id, oldest first.
+
+    Pages hold up to ``limit`` exchanges; pass ``cursors.before`` or
+    ``cursors.after`` from a previous page to move through the thread.
+    Pages served entirely from memory carry an ETag and are kept
+    serialized, so polling with If-None-Match is answered with a 304.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="use either before or after, not both")
+    key = (response_id, limit, before, after)
+    generation = history_generation()
+    cached = thread_payloads.get(key, generation)
+    if cached is not None:
+        return _cached_response(request, *cached)
     try:
-        cached_messages, missing_id = await build_thread_messages(response_id, limit)
-        if cached_messages and not missing_id:
-            return {
+        try:
+            page = await thread_page(response_id, limit, before=before, after=after)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        missing_id = page["missing_id"]
+        if not missing_id:
+            payload = {
                 "response_id": response_id,
-                "messages": cached_messages,
-                "source": "cache",
+                "messages": page["messages"],
+                "source": page["source"],
+                "cursors": page["cursors"],
             }
+            if page["source"] != "cache":
+                return payload
+            # Pages end at response_id, so later turns never change them
+            messages = page["messages"]
+            last = messages[-1] if messages else {}
+            etag = strong_etag(*key, last.get("id"), len(messages), len(last.get("content") or ""))
+            body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            thread_payloads.put(key, generation, etag, body)
+            return _cached_response(request, etag, body)
 
-        messages = list(cached_messages)
-        current_id = missing_id or response_id
-        fetched_any = False
-
-        for _ in range(limit - len(messages)):
-            if not current_id:
-                break
-
-            response = await client.responses.retrieve(current_id)
-            fetched_any = True
-
-            assistant_chunks = []
-            for block in getattr(response, "output", []) or []:
-                for c in getattr(block, "content", []) or []:
-                    if getattr(c, "type", None) == "output_text":
-                        text = getattr(c, "text", None)
-                        if text:
-                            assistant_chunks.append(text)
-            assistant_text = "".join(assistant_chunks) if assistant_chunks else ""
-
-            user_chunks = []
-            try:
-                inputs_list = await client.responses.input_items.list(response.id)
-                for input_item in getattr(inputs_list, "data", []) or []:
-                    for part in getattr(input_item, "content", []) or []:
-                        if getattr(part, "type", None) == "input_text":
-                            text = getattr(part, "text", None)
-                            if text:
-                                user_chunks.append(text)
-            except Exception:
-                pass
-            user_text = "".join(user_chunks) if user_chunks else None
-
-            created_at = getattr(response, "created_at", None)
-            model = getattr(response, "model", None)
-            previous_id = getattr(response, "previous_response_id", None)
-
-            if user_text:
-                messages.append({
-                    "id": f"{response.id}_user",
-                    "role": "user",
-                    "content": user_text,
-                    "created_at": created_at,
-                    "model": None,
-                    "metadata": None,
-                })
-
-            if assistant_text:
-                messages.append({
-                    "id": response.id,
-                    "role": "assistant",
-                    "content": assistant_text,
-                    "created_at": created_at,
-                    "model": model,
-                    "metadata": getattr(response, "metadata", None),
-                })
-
-            # Persist this exchange into cache for future requests
-            await save_entry(
-                response_id=response.id,
-                previous_response_id=previous_id,
-                user_text=user_text,
-                assistant_text=assistant_text,
-                model=model,
-                created_at=created_at,
-            )
-
-            current_id = previous_id
-
-        # Deduplicate by message id while preserving order by created_at
-        messages.sort(key=lambda msg: msg.get("created_at") or 0)
-        deduped = []
-        seen_ids = set()
-        for msg in messages:
-            msg_id = msg.get("id")
-            if msg_id and msg_id in seen_ids:
-                continue
-            if msg_id:
-                seen_ids.add(msg_id)
-            deduped.append(msg)
-
-        source = "cache"
-        if fetched_any:
-            source = "cache+openai" if cached_messages else "openai"
+        # Both calls per hop are overlapped and identical hydrations shared
+        hydrated = await thread_hydrator.hydrate(missing_id, limit - page["exchanges"])
+        messages = hydrated["messages"]
+        current_id = hydrated["missing_from"]
+
+        source = page["source"]
+        cursors = dict(page["cursors"])
+        if hydrated["oldest_id"]:
+            source = f"{source}+openai" if page["messages"] else "openai"
+            cursors["before"] = encode_cursor(hydrated["oldest_id"]) if current_id else None
 
         return {
             "response_id": response_id,
-            "messages": deduped,
+            "messages": messages + page["messages"],
             "source": source,
+            "cursors": cursors,
             "missing_from": current_id,
+            "hydration": hydrated["hydration"],
         }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/cache/stats")
+async def thread_cache_stats():
+    """Size, evictions and hit rate of the in-memory chat history"""
+    return {**history_stats(), "hydration": thread_hydrator.stats(), "payloads": thread_payloads.stats()}
+
+
+@router.get("/export")
+async def export_threads(thread_id: Optional[str] = None):
+    """All persisted threads and messages (or one thread) as NDJSON.
+
+    One ``{"type": "thread", ...}`` line per thread, then one
+    ``{"type": "message", ...}`` line per message, streamed straight
+    from a server-side cursor.
+    """
+    return StreamingResponse(
+        export_ndjson(thread_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="threads.ndjson"'},
+    )
+
+
+@router.post("/import")
+async def import_threads(request: Request):
+    """Bulk-insert an NDJSON export; rows whose id already exists are skipped.
+
+    Counts are of rows read, including any that were skipped. The import
+    is all or nothing: a malformed line is a 422 naming its line number.
+    """
+    try:
+        counts = await import_ndjson(request.stream())
+    except NDJSONError as e:
+        raise HTTPException(status_code=422, detail=f"invalid NDJSON at {e}; nothing was imported")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    return counts
@@ -0,0 +1,289 @@
+# Admission control for upstream OpenAI calls
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") in ("1", "true", "True")
+ADMISSION_GLOBAL_LIMIT = int(os.getenv("ADMISSION_GLOBAL_LIMIT", "64"))
+# Share of global slots that non-interactive traffic may hold at once
+ADMISSION_BATCH_SHARE = float(os.getenv("ADMISSION_BATCH_SHARE", "0.5"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "128"))
+ADMISSION_MODEL_LIMIT = int(os.getenv("ADMISSION_MODEL_LIMIT", "32"))
+
+
+def _parse_map(raw: str, cast=float) -> Dict[str, Any]:
+    """'chat=48,reports=8' -> {'chat': 48, 'reports': 8}"""
+    out = {}
+    for part in raw.split(","):
+        if "=" in part:
+            name, value = part.split("=", 1)
+            out[name.strip()] = cast(value.strip())
+    return out
+
+
+# priority: 0 = interactive, 1 = standard, 2 = batch (lower is served first)
+ROUTE_PRIORITY = {"chat": 0, "threads": 0, "reports": 1, "images": 1, "charts": 2, "export": 2}
+# Env values are merged over these defaults, e.g. ADMISSION_ROUTE_LIMITS="chat=96"
+ROUTE_LIMITS = {"chat": 48, "threads": 16, "reports": 8, "images": 4, "charts": 4, "export": 4}
+ROUTE_LIMITS.update(_parse_map(os.getenv("ADMISSION_ROUTE_LIMITS", ""), int))
+ROUTE_RPS = {"charts": 2.0, "export": 2.0, "images": 1.0}
+ROUTE_RPS.update(_parse_map(os.getenv("ADMISSION_ROUTE_RPS", "")))
+ROUTE_MAX_WAIT = {"chat": 2.0, "threads": 5.0, "reports": 15.0, "images": 15.0, "charts": 30.0, "export": 30.0}
+ROUTE_MAX_WAIT.update(_parse_map(os.getenv("ADMISSION_ROUTE_MAX_WAIT_S", "")))
+MODEL_LIMITS = _parse_map(os.getenv("ADMISSION_MODEL_LIMITS", ""), int)
+
+
+class Overloaded(HTTPException):
+    """429/503 with a Retry-After header"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float) -> None:
+        super().__init__(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.rejected = 0
+
+    def take(self) -> float:
+        """Take a token; returns 0, or seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        self.rejected += 1
+        return (1 - self.tokens) / self.rate
+
+
+class PriorityLimiter:
+    """Counting semaphore whose bounded wait queue is served by priority.
+
+    ``caps`` limits how many slots a priority class may hold, so batch
+    work can never occupy the slots reserved for interactive requests.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int = ADMISSION_MAX_QUEUE, caps: Optional[Dict[int, int]] = None) -> None:
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.caps = caps or {}
+        self.in_use = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.wait_ms_ewma = 0.0
+        self.wait_ms_max = 0.0
+        self.hold_s_ewma = 0.0
+
+    def _cap(self, priority: int) -> int:
+        return min(self.limit, self.caps.get(priority, self.limit))
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    def retry_after(self) -> float:
+        return max(1.0, self.hold_s_ewma * (1 + self.queued / max(1, self.limit)))
+
+    async def acquire(self, priority: int, timeout: float) -> None:
+        started = time.monotonic()
+        if self.in_use < self._cap(priority) and (not self._waiters or self._waiters[0][0] > priority):
+            self.in_use += 1
+        else:
+            if self.queued >= self.max_queue:
+                self.rejected_full += 1
+                raise Overloaded(429, f"{self.name}: queue full", self.retry_after())
+            fut = asyncio.get_running_loop().create_future()
+            entry = (priority, next(self._seq), fut)
+            heapq.heappush(self._waiters, entry)
+            try:
+                await asyncio.wait_for(asyncio.shield(fut), timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if fut.done():
+                    # Slot was handed over just as we gave up
+                    self.release(0.0)
+                else:
+                    fut.cancel()
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                self.rejected_timeout += 1
+                raise Overloaded(503, f"{self.name}: timed out waiting for capacity", self.retry_after())
+        waited = (time.monotonic() - started) * 1000
+        self.admitted += 1
+        self.wait_ms_ewma += 0.1 * (waited - self.wait_ms_ewma)
+        self.wait_ms_max = max(self.wait_ms_max, waited)
+
+    def release(self, held_s: float) -> None:
+        self.in_use -= 1
+        if held_s:
+            self.hold_s_ewma += 0.1 * (held_s - self.hold_s_ewma)
+        while self._waiters:
+            priority, _, fut = self._waiters[0]
+            if fut.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_use >= self._cap(priority):
+                break
+            heapq.heappop(self._waiters)
+            self.in_use += 1
+            fut.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_use": self.in_use,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_full,
+            "rejected_timeout": self.rejected_timeout,
+            "wait_ms_ewma": round(self.wait_ms_ewma, 2),
+            "wait_ms_max": round(self.wait_ms_max, 2),
+            "hold_s_ewma": round(self.hold_s_ewma, 3),
+        }
+
+
+class Ticket:
+    """Held admission slots; release() is idempotent"""
+
+    def __init__(self, limiters: List[PriorityLimiter], priority: int = 1) -> None:
+        self._limiters = limiters
+        self._acquired_at = time.monotonic()
+        self.priority = priority
+        self.released = False
+
+    @property
+    def model_limiter(self) -> Optional[PriorityLimiter]:
+        return next((l for l in self._limiters if l.name.startswith("model:")), None)
+
+    def replace(self, old: Optional[PriorityLimiter], new: PriorityLimiter) -> None:
+        """Hold ``new``, already acquired, in place of ``old``"""
+        if old is not None:
+            self._limiters.remove(old)
+            old.release(time.monotonic() - self._acquired_at)
+        self._limiters.append(new)
+
+    def release(self) -> None:
+        if self.released:
+            return
+        self.released = True
+        held = time.monotonic() - self._acquired_at
+        for limiter in reversed(self._limiters):
+            limiter.release(held)
+
+
+class AdmissionController:
+    """Global, per-route and per-model limits in front of the OpenAI client"""
+
+    def __init__(self) -> None:
+        batch_cap = max(1, int(ADMISSION_GLOBAL_LIMIT * ADMISSION_BATCH_SHARE))
+        self.global_limiter = PriorityLimiter(
+            "global", ADMISSION_GLOBAL_LIMIT, caps={1: batch_cap, 2: batch_cap}
+        )
+        self.routes: Dict[str, PriorityLimiter] = {}
+        self.models: Dict[str, PriorityLimiter] = {}
+        self.buckets = {route: TokenBucket(rate) for route, rate in ROUTE_RPS.items()}
+
+    def _route(self, route: str) -> PriorityLimiter:
+        if route not in self.routes:
+            self.routes[route] = PriorityLimiter(f"route:{route}", ROUTE_LIMITS.get(route, ADMISSION_GLOBAL_LIMIT))
+        return self.routes[route]
+
+    def _model(self, model: str) -> PriorityLimiter:
+        if model not in self.models:
+            self.models[model] = PriorityLimiter(f"model:{model}", MODEL_LIMITS.get(model, ADMISSION_MODEL_LIMIT))
+        return self.models[model]
+
+    async def acquire(self, route: str, model: Optional[str] = None) -> Ticket:
+        if not ADMISSION_ENABLED:
+            return Ticket([])
+        bucket = self.buckets.get(route)
+        if bucket is not None:
+            wait = bucket.take()
+            if wait:
+                raise Overloaded(429, f"route:{route}: rate limit exceeded", wait)
+
+        priority = ROUTE_PRIORITY.get(route, 1)
+        deadline = time.monotonic() + ROUTE_MAX_WAIT.get(route, 10.0)
+        # Fixed order (global -> route -> model) so waiters cannot deadlock
+        chain = [self.global_limiter, self._route(route)] + ([self._model(model)] if model else [])
+        held: List[PriorityLimiter] = []
+        try:
+            for limiter in chain:
+                await limiter.acquire(priority, max(0.0, deadline - time.monotonic()))
+                held.append(limiter)
+        except BaseException:
+            Ticket(held).release()
+            raise
+        return Ticket(held, priority)
+
+    async def switch_model(self, ticket: Ticket, model: str) -> None:
+        """Charge ``ticket``'s model slot to ``model``, e.g. after a failover.
+
+        Does not queue: raises ``Overloaded`` at once if ``model`` is at its
+        limit, and the ticket keeps its current slot.
+        """
+        if not ADMISSION_ENABLED or ticket.released:
+            return
+        limiter = self._model(model)
+        current = ticket.model_limiter
+        if limiter is current:
+            return
+        await limiter.acquire(ticket.priority, 0.0)
+        ticket.replace(current, limiter)
+
+    @asynccontextmanager
+    async def admit(self, route: str, model: Optional[str] = None):
+        ticket = await self.acquire(route, model)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def slot(self, route: str, model: Optional[str] = None):
+        """FastAPI dependency holding a slot for the whole request"""
+
+        async def dependency(request: Request):
+            name = model
+            if name is None and request.method == "POST":
+                try:
+                    body = await request.json()
+                    name = body.get("model") if isinstance(body, dict) else None
+                except Exception:
+                    name = None
+            async with self.admit(route, name) as ticket:
+                yield ticket
+
+        return dependency
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": ADMISSION_ENABLED,
+            "global": self.global_limiter.stats(),
+            "routes": {name: limiter.stats() for name, limiter in self.routes.items()},
+            "models": {name: limiter.stats() for name, limiter in self.models.items()},
+            "rate_limited": {name: bucket.rejected for name, bucket in self.buckets.items()},
+        }
+
+
+admission = AdmissionController()
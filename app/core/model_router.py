@@ -0,0 +1,269 @@
+# Latency-aware model routing with failover before the first delta
+import asyncio
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.openai_client import client
+
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "0") in ("1", "true", "True")
+# Interchangeable models: groups separated by ';', models within a group by ','
+MODEL_EQUIVALENTS = os.getenv("MODEL_EQUIVALENTS", "gpt-4o-mini,gpt-4.1-mini;gpt-4o,gpt-4.1")
+# Give up on a candidate that has not produced its first delta by then
+MODEL_FIRST_DELTA_DEADLINE_MS = float(os.getenv("MODEL_FIRST_DELTA_DEADLINE_MS", "4000"))
+MODEL_EWMA_ALPHA = float(os.getenv("MODEL_EWMA_ALPHA", "0.2"))
+# Score multiplier per unit of error rate: score = ttft * (1 + penalty * errors)
+MODEL_ERROR_PENALTY = float(os.getenv("MODEL_ERROR_PENALTY", "4"))
+# The requested model keeps priority unless its score is this much worse than the best
+MODEL_SWITCH_RATIO = float(os.getenv("MODEL_SWITCH_RATIO", "1.5"))
+# Stats drift back to the prior without traffic, so a demoted model gets retried
+MODEL_STATS_HALF_LIFE_S = float(os.getenv("MODEL_STATS_HALF_LIFE_S", "120"))
+MODEL_TTFT_PRIOR_MS = MODEL_FIRST_DELTA_DEADLINE_MS / 2
+
+_DELTA = "response.output_text.delta"
+
+
+def parse_equivalents(raw: str) -> Dict[str, List[str]]:
+    """'a,b;c,d' -> {'a': ['a', 'b'], 'b': ['a', 'b'], 'c': [...], 'd': [...]}"""
+    groups: Dict[str, List[str]] = {}
+    for part in raw.split(";"):
+        models = [m.strip() for m in part.split(",") if m.strip()]
+        for model in models:
+            groups[model] = models
+    return groups
+
+
+class ModelStats:
+    """EWMA time-to-first-token and error rate for one (endpoint, model)"""
+
+    def __init__(self) -> None:
+        self.ttft_ms = MODEL_TTFT_PRIOR_MS
+        self.errors = 0.0
+        self.updated = time.monotonic()
+        self.requests = 0
+        self.failures = 0
+
+    def _decay(self, now: float) -> None:
+        if MODEL_STATS_HALF_LIFE_S <= 0:
+            return
+        keep = 0.5 ** ((now - self.updated) / MODEL_STATS_HALF_LIFE_S)
+        self.ttft_ms = MODEL_TTFT_PRIOR_MS + (self.ttft_ms - MODEL_TTFT_PRIOR_MS) * keep
+        self.errors *= keep
+        self.updated = now
+
+    def record(self, ttft_ms: Optional[float], failed: bool) -> None:
+        self._decay(time.monotonic())
+        self.requests += 1
+        self.failures += failed
+        if ttft_ms is not None:
+            self.ttft_ms += MODEL_EWMA_ALPHA * (ttft_ms - self.ttft_ms)
+        self.errors += MODEL_EWMA_ALPHA * (float(failed) - self.errors)
+
+    def score(self) -> float:
+        self._decay(time.monotonic())
+        return self.ttft_ms * (1 + MODEL_ERROR_PENALTY * self.errors)
+
+
+class AllCandidatesFailed(RuntimeError):
+    """Every candidate failed or stalled before its first delta"""
+
+    def __init__(self, decision: Dict[str, Any]) -> None:
+        outcomes = ", ".join(f"{a['model']} {a['outcome']}" for a in decision["attempts"]) or "none tried"
+        super().__init__(f"no model produced a response ({outcomes})")
+        self.decision = decision
+
+
+class RoutedStream:
+    """One chat stream opened on whichever candidate produced a delta first.
+
+    Candidates are tried in order, each until the first-delta deadline; a
+    candidate that stalls or fails before then is closed and the next one
+    opened. Events it produced are discarded, so the client only ever sees
+    one response. Once a delta has arrived the stream is committed to that
+    model. When no candidate gets there, ``AllCandidatesFailed`` is raised.
+
+    ``charge`` is awaited with each model before it is opened, so the
+    caller can move its admission slot to the model actually called; if
+    it raises, that candidate is skipped.
+    """
+
+    def __init__(
+        self,
+        router: "ModelRouter",
+        request_data: Dict[str, Any],
+        candidates: Optional[List[str]] = None,
+        charge: Optional[Callable[[str], Awaitable[None]]] = None,
+    ) -> None:
+        self.router = router
+        self.request_data = request_data
+        self.requested = request_data["model"]
+        self.candidates = candidates or router.candidates(self.requested)
+        self.charge = charge
+        self.attempts: List[Dict[str, Any]] = []
+        self.model: Optional[str] = None
+        self._manager = None
+        self._stream = None
+        self._events: Optional[AsyncIterator[Any]] = None
+        self._buffered: List[Any] = []
+
+    @property
+    def decision(self) -> Dict[str, Any]:
+        return {
+            "requested": self.requested,
+            "model": self.model,
+            "candidates": self.candidates,
+            "failed_over": len(self.attempts) > 1,
+            "attempts": self.attempts,
+        }
+
+    async def _close(self) -> None:
+        manager, self._manager, self._stream, self._events = self._manager, None, None, None
+        if manager is not None:
+            await manager.__aexit__(None, None, None)
+
+    async def _open(self, model: str, deadline_s: Optional[float]) -> None:
+        """Open ``model`` and buffer its events up to and including the first delta"""
+        loop = asyncio.get_running_loop()
+        until = loop.time() + deadline_s if deadline_s is not None else None
+
+        def remaining() -> Optional[float]:
+            return max(0.0, until - loop.time()) if until is not None else None
+
+        self._manager = client.responses.stream(**{**self.request_data, "model": model})
+        self._stream = await asyncio.wait_for(self._manager.__aenter__(), remaining())
+        self._events = self._stream.__aiter__()
+        while True:
+            try:
+                event = await asyncio.wait_for(self._events.__anext__(), remaining())
+            except StopAsyncIteration:
+                return
+            self._buffered.append(event)
+            event_type = getattr(event, "type", None)
+            if event_type == "response.error":
+                error = getattr(event, "error", None)
+                raise RuntimeError(getattr(error, "message", None) or "response.error before first delta")
+            if event_type == _DELTA:
+                return
+
+    async def __aenter__(self) -> "RoutedStream":
+        deadline_s = MODEL_FIRST_DELTA_DEADLINE_MS / 1000 if MODEL_FIRST_DELTA_DEADLINE_MS > 0 else None
+        for i, model in enumerate(self.candidates):
+            if i:
+                self.router.failovers += 1
+            if self.charge is not None:
+                try:
+                    await self.charge(model)
+                except Exception as e:
+                    # No capacity for this model; not held against its stats
+                    self.attempts.append({"model": model, "outcome": "no_capacity", "error": str(e)[:200]})
+                    continue
+            stats = self.router.stats_for(model)
+            started = time.perf_counter()
+            try:
+                await self._open(model, deadline_s)
+            except BaseException as e:
+                self._buffered = []
+                await self._close()
+                if not isinstance(e, Exception):
+                    raise
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                stalled = isinstance(e, asyncio.TimeoutError)
+                # A stall counts as at least the deadline against TTFT
+                stats.record(elapsed_ms if stalled else None, failed=True)
+                self.attempts.append({
+                    "model": model,
+                    "outcome": "stalled" if stalled else "error",
+                    "ms": round(elapsed_ms, 1),
+                    **({} if stalled else {"error": str(e)[:200]}),
+                })
+                continue
+            ttft_ms = (time.perf_counter() - started) * 1000
+            stats.record(ttft_ms, failed=False)
+            self.attempts.append({"model": model, "outcome": "ok", "ttft_ms": round(ttft_ms, 1)})
+            self.model = model
+            return self
+        raise AllCandidatesFailed(self.decision)
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self._close()
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[Any]:
+        buffered, self._buffered = self._buffered, []
+        for event in buffered:
+            yield event
+        if self._events is not None:
+            async for event in self._events:
+                yield event
+
+    async def get_final_response(self) -> Any:
+        return await self._stream.get_final_response()
+
+
+class ModelRouter:
+    """Orders interchangeable models by their recent latency and errors.
+
+    Stats are kept per (endpoint, model). The requested model goes first
+    unless its score is ``MODEL_SWITCH_RATIO`` times worse than the best
+    alternative; the rest follow by score and serve as failovers.
+    """
+
+    def __init__(self, equivalents: Dict[str, List[str]]) -> None:
+        self.equivalents = equivalents
+        self.endpoint = str(client.base_url)
+        self._stats: Dict[Tuple[str, str], ModelStats] = {}
+        self.failovers = 0
+
+    def stats_for(self, model: str) -> ModelStats:
+        key = (self.endpoint, model)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = ModelStats()
+        return stats
+
+    def candidates(self, model: str) -> List[str]:
+        group = self.equivalents.get(model) or [model]
+        scores = {m: self.stats_for(m).score() for m in group}
+        ranked = sorted(group, key=lambda m: (scores[m], m != model))
+        if model in scores and scores[model] <= MODEL_SWITCH_RATIO * scores[ranked[0]]:
+            ranked.remove(model)
+            ranked.insert(0, model)
+        return ranked
+
+    def stream(
+        self,
+        request_data: Dict[str, Any],
+        candidates: Optional[List[str]] = None,
+        charge: Optional[Callable[[str], Awaitable[None]]] = None,
+    ) -> RoutedStream:
+        """Drop-in for ``client.responses.stream(**request_data)``.
+
+        ``candidates`` fixes the order, e.g. to match an admission slot
+        already taken for the first one; by default it is ranked now.
+        ``charge`` moves that slot on failover (see ``RoutedStream``).
+        """
+        return RoutedStream(self, request_data, candidates, charge)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": MODEL_ROUTING,
+            "first_delta_deadline_ms": MODEL_FIRST_DELTA_DEADLINE_MS,
+            "failovers": self.failovers,
+            "models": [
+                {
+                    "endpoint": endpoint,
+                    "model": model,
+                    "ttft_ms_ewma": round(s.ttft_ms, 1),
+                    "error_rate_ewma": round(s.errors, 4),
+                    "score": round(s.score(), 1),
+                    "requests": s.requests,
+                    "failures": s.failures,
+                }
+                for (endpoint, model), s in self._stats.items()
+            ],
+        }
+
+
+model_router = ModelRouter(parse_equivalents(MODEL_EQUIVALENTS))
@@ -1,11 +1,164 @@
-# AsyncOpenAI init (singleton)
-from openai import AsyncOpenAI
+# AsyncOpenAI init (singleton) over one shared, pooled HTTP transport
+import asyncio
 import os
+import random
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+import httpx
 from dotenv import load_dotenv
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
 # Load .env file
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "200"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "50"))
+HTTP_KEEPALIVE_EXPIRY_S = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_S", "60"))
+HTTP_CONNECT_TIMEOUT_S = float(os.getenv("HTTP_CONNECT_TIMEOUT_S", "5"))
+HTTP_READ_TIMEOUT_S = float(os.getenv("HTTP_READ_TIMEOUT_S", "120"))
+HTTP_WRITE_TIMEOUT_S = float(os.getenv("HTTP_WRITE_TIMEOUT_S", "30"))
+HTTP_POOL_TIMEOUT_S = float(os.getenv("HTTP_POOL_TIMEOUT_S", "10"))
+# For streams the read timeout is the longest gap allowed between chunks
+HTTP_STREAM_IDLE_TIMEOUT_S = float(os.getenv("HTTP_STREAM_IDLE_TIMEOUT_S", "30"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1") in ("1", "true", "True")
+# The SDK retries 408/409/429/5xx with jittered exponential backoff (0.5s..8s)
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+# Start a second identical non-streaming request if the first is this slow (0 = off)
+OPENAI_HEDGE_AFTER_MS = float(os.getenv("OPENAI_HEDGE_AFTER_MS", "0"))
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+T = TypeVar("T")
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+HTTP2 = HTTP2_ENABLED and _http2_available()
+
+DEFAULT_TIMEOUT = httpx.Timeout(
+    connect=HTTP_CONNECT_TIMEOUT_S,
+    read=HTTP_READ_TIMEOUT_S,
+    write=HTTP_WRITE_TIMEOUT_S,
+    pool=HTTP_POOL_TIMEOUT_S,
+)
+STREAM_TIMEOUT = httpx.Timeout(
+    connect=HTTP_CONNECT_TIMEOUT_S,
+    read=HTTP_STREAM_IDLE_TIMEOUT_S,
+    write=HTTP_WRITE_TIMEOUT_S,
+    pool=HTTP_POOL_TIMEOUT_S,
+)
+
+# Shared by the OpenAI SDK and plain downloads (e.g. generated image URLs)
+http_client = DefaultAsyncHttpxClient(
+    http2=HTTP2,
+    timeout=DEFAULT_TIMEOUT,
+    limits=httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_S,
+    ),
+)
+
+client = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    http_client=http_client,
+    max_retries=OPENAI_MAX_RETRIES,
+    timeout=DEFAULT_TIMEOUT,
+)
+
+_HEDGE_STATS = {"calls": 0, "hedged": 0, "hedge_won": 0}
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+async def get_with_retries(url: str, retries: int = OPENAI_MAX_RETRIES) -> httpx.Response:
+    """GET over the shared pool, retrying transport errors, 429 and 5xx"""
+    for attempt in range(retries + 1):
+        try:
+            response = await http_client.get(url, follow_redirects=True)
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                response.raise_for_status()
+                return response
+            retry_after = response.headers.get("retry-after")
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else backoff_delay(attempt)
+        except httpx.TransportError:
+            if attempt == retries:
+                raise
+            delay = backoff_delay(attempt)
+        await asyncio.sleep(delay)
+    raise RuntimeError("unreachable")
+
+
+async def hedged(call: Callable[[], Awaitable[T]], after_ms: float = OPENAI_HEDGE_AFTER_MS) -> T:
+    """Run an idempotent non-streaming call, racing a second copy if slow.
+
+    The second request starts only after ``after_ms``; whichever finishes
+    first wins and the other is cancelled. Never use for calls that create
+    server-side state or bill per call (e.g. responses.create).
+    """
+    _HEDGE_STATS["calls"] += 1
+    if after_ms <= 0:
+        return await call()
+    first = asyncio.ensure_future(call())
+    done, _ = await asyncio.wait({first}, timeout=after_ms / 1000)
+    if done:
+        return first.result()
+    _HEDGE_STATS["hedged"] += 1
+    second = asyncio.ensure_future(call())
+    pending = {first, second}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        _HEDGE_STATS["hedge_won"] += 1
+                    return task.result()
+        # Both failed: surface the original request's error
+        return first.result()
+    finally:
+        for task in (first, second):
+            if not task.done():
+                task.cancel()
+
+
+def _pool_stats() -> Dict[str, Any]:
+    """Best effort: httpx keeps its connection pool private, so these fields
+    are omitted when a minor httpx/httpcore release moves them"""
+    try:
+        pool = http_client._transport._pool
+        connections = list(pool.connections)
+        active = sum(1 for c in connections if not c.is_idle() and not c.is_closed())
+        return {
+            "connections": len(connections),
+            "idle": sum(1 for c in connections if c.is_idle()),
+            "active": active,
+            "utilization": round(active / HTTP_MAX_CONNECTIONS, 4),
+        }
+    except (AttributeError, TypeError):
+        return {}
+
+
+def transport_stats() -> Dict[str, Any]:
+    """Client settings and hedging counters, plus pool utilization when
+    httpx exposes it (see ``_pool_stats``)"""
+    return {
+        "http2": HTTP2,
+        "max_connections": HTTP_MAX_CONNECTIONS,
+        "max_keepalive": HTTP_MAX_KEEPALIVE,
+        "max_retries": OPENAI_MAX_RETRIES,
+        "hedge_after_ms": OPENAI_HEDGE_AFTER_MS,
+        **_HEDGE_STATS,
+        **_pool_stats(),
+    }
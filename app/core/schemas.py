@@ -3,12 +3,21 @@ from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any, Union
 
 
+class RetrievalOptions(BaseModel):
+    k: int = Field(default=4, ge=1, le=50)
+    filters: Dict[str, Any] = {}
+    min_score: Optional[float] = None
+
+
 class ChatStreamIn(BaseModel):
     message: str
     model: str = "gpt-4o-mini"
     system: Optional[str] = None
     previous_response_id: Optional[str] = None
     metadata: Dict[str, Any] = {}
+    retrieval: Optional[RetrievalOptions] = None
+    # None follows CHAT_COMPACTION; True/False forces it for this request
+    compact: Optional[bool] = None
 
 
 class ReportIn(BaseModel):
@@ -17,6 +26,15 @@ class ReportIn(BaseModel):
     model: str = "gpt-4o-mini"
 
 
+class ReportBatchIn(BaseModel):
+    schema_id: str
+    queries: List[str] = Field(..., min_length=1, max_length=1000)
+    model: str = "gpt-4o-mini"
+    # Reports generated at once; None uses REPORT_BATCH_CONCURRENCY
+    concurrency: Optional[int] = Field(default=None, ge=1, le=64)
+    format: str = Field(default="ndjson", pattern="^(ndjson|sse)$")
+
+
 class ImageIn(BaseModel):
     prompt: str
     size: str = "1024x1024"
@@ -35,4 +53,6 @@ class ChartIn(BaseModel):
     title: Optional[str] = None
     x_label: Optional[str] = None
     y_label: Optional[str] = None
-    output_format: str = Field(default="png", pattern="^(png|jpg|svg|pdf)$")
\ No newline at end of file
+    output_format: str = Field(default="png", pattern="^(png|jpg|svg|pdf)$")
+    # None follows CHART_ENGINE; "remote" renders with Code Interpreter
+    engine: Optional[str] = Field(default=None, pattern="^(local|remote)$")
\ No newline at end of file
@@ -1,11 +1,31 @@
 # SSE helpers( server sent event)
+import asyncio
 import json
-from typing import Dict, Any
+import os
+from json.encoder import encode_basestring
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+# Coalesce output_text deltas into one frame per window (0 = one frame per delta)
+SSE_COALESCE_MS = float(os.getenv("SSE_COALESCE_MS", "0"))
+SSE_COALESCE_BYTES = int(os.getenv("SSE_COALESCE_BYTES", "1024"))
+
+_PREFIX = b"data: "
+_SUFFIX = b"\n\n"
+_DELTA_HEAD = _PREFIX + b'{"type": "delta", "content": '
+_DELTA_TAIL = b"}" + _SUFFIX
 
 def sse_event(data: Dict[str, Any]) -> str:
     """Format data as Server-Sent Event"""
     return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
 
+def sse_event_bytes(data: Dict[str, Any]) -> bytes:
+    """Same frame as sse_event, encoded once with cached prefix/suffix"""
+    return _PREFIX + json.dumps(data, ensure_ascii=False).encode("utf-8") + _SUFFIX
+
+def sse_delta_bytes(content: str) -> bytes:
+    """Delta frame without building a dict or calling json.dumps"""
+    return _DELTA_HEAD + encode_basestring(content).encode("utf-8") + _DELTA_TAIL
+
 def sse_headers() -> dict:
     """Standard SSE headers"""
     return {
@@ -13,4 +33,99 @@ def sse_headers() -> dict:
         "Cache-Control": "no-cache",
         "Connection": "keep-alive",
         "X-Accel-Buffering": "no",
-    }
\ No newline at end of file
+    }
+
+
+class MergedDelta:
+    """Several upstream output_text deltas folded into one"""
+
+    __slots__ = ("delta",)
+    type = "response.output_text.delta"
+
+    def __init__(self, delta: str) -> None:
+        self.delta = delta
+
+
+async def coalesce_deltas(
+    source: AsyncIterator[Any],
+    window_ms: float = SSE_COALESCE_MS,
+    max_bytes: int = SSE_COALESCE_BYTES,
+) -> AsyncIterator[Any]:
+    """Merge consecutive ``response.output_text.delta`` events.
+
+    A reader task drains ``source`` into a buffer; the consumer wakes on
+    the first buffered delta, waits up to ``window_ms`` (less if the buffer
+    reaches ``max_bytes`` or a non-delta event arrives) and then yields
+    everything buffered, with runs of deltas merged into one MergedDelta.
+    The cost is one timer per emitted frame rather than per upstream
+    event. Other events pass through unchanged and in order.
+    """
+    if window_ms <= 0:
+        async for event in source:
+            yield event
+        return
+
+    loop = asyncio.get_running_loop()
+    window = window_ms / 1000
+    items: List[Any] = []
+    parts: List[str] = []
+    size = 0
+    finished = False
+    failure: Optional[BaseException] = None
+    ready = asyncio.Event()
+    flush_now = loop.create_future()
+
+    def wake_flush() -> None:
+        if not flush_now.done():
+            flush_now.set_result(None)
+
+    def close_parts() -> None:
+        nonlocal size
+        if parts:
+            items.append(MergedDelta("".join(parts) if len(parts) > 1 else parts[0]))
+            parts.clear()
+            size = 0
+
+    async def reader() -> None:
+        nonlocal size, finished, failure
+        try:
+            async for event in source:
+                if getattr(event, "type", None) == "response.output_text.delta":
+                    text = getattr(event, "delta", "")
+                    if not text:
+                        continue
+                    parts.append(text)
+                    size += len(text)
+                    if size >= max_bytes:
+                        wake_flush()
+                else:
+                    close_parts()
+                    items.append(event)
+                    wake_flush()
+                ready.set()
+        except BaseException as e:
+            failure = e
+        finally:
+            finished = True
+            ready.set()
+            wake_flush()
+
+    task = asyncio.ensure_future(reader())
+    try:
+        while True:
+            await ready.wait()
+            if not finished and not flush_now.done():
+                await asyncio.wait([flush_now], timeout=window)
+            ready.clear()
+            if flush_now.done():
+                flush_now = loop.create_future()
+            close_parts()
+            batch, items[:] = list(items), []
+            for item in batch:
+                yield item
+            if finished and not items and not parts:
+                if failure is not None:
+                    raise failure
+                return
+    finally:
+        task.cancel()
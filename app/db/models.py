@@ -1,6 +1,6 @@
 # app/db/models.py
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import String, Text, JSON, ForeignKey, DateTime
+from sqlalchemy import String, Text, JSON, ForeignKey, DateTime, Index
 from datetime import datetime
 import uuid
 
@@ -22,6 +22,7 @@ class Thread(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (Index("ix_messages_thread_id_created_at", "thread_id", "created_at"),)
     id: Mapped[str] = mapped_column(String(32), primary_key = True, default = uuid_str)
     thread_id: Mapped[str] = mapped_column(String(32), ForeignKey("threads.id", ondelete = "cascade"), index = True)
     role: Mapped[str] = mapped_column(String(255))
@@ -1,8 +1,16 @@
 # app/main.py
+import asyncio
+import logging
 import os
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from app.api import chat, threads, images, reports, export, charts
+from app.api import chat, threads, images, reports, export, charts, ingest, admission, search
+from app.services import chart_render
+from app.services.compaction import warm_encoding
+from app.services.history_writer import history_writer
+from app.services.ingestion import restore_index, shutdown_pool
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="RAG API", version="1.0.0")
 
@@ -12,12 +20,34 @@ app.include_router(images.router)
 app.include_router(reports.router)
 app.include_router(export.router)
 app.include_router(charts.router)
+app.include_router(ingest.router)
+app.include_router(admission.router)
+app.include_router(search.router)
 # Mount static files
 STORAGE_DIR = "storage"
 os.makedirs(STORAGE_DIR, exist_ok=True)
 app.mount("/static", StaticFiles(directory=STORAGE_DIR, html=False), name="static")
 
 
+@app.on_event("startup")
+async def on_startup():
+    try:
+        await restore_index()
+    except Exception:
+        logger.exception("Failed to restore the retrieval index; it fills again on the next /ingest")
+    if charts.CHART_ENGINE == "local":
+        chart_render.warm_pool()
+    # Off the loop and in the background; the first download can take a while
+    app.state.tokenizer_warmup = asyncio.create_task(warm_encoding())
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await history_writer.drain()
+    shutdown_pool()
+    chart_render.shutdown_pool()
+
+
 @app.get("/")
 async def root():
     return {"message": "RAG API is running", "version": "1.0.0"}
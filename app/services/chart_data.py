@@ -0,0 +1,381 @@
+# app/services/chart_data.py
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+import warnings
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# Bars and pie slices beyond this are summed into one "other" category
+CHART_MAX_CATEGORIES = int(os.getenv("CHART_MAX_CATEGORIES", "40"))
+
+
+class ChartDataError(ValueError):
+    """The data has no shape the local renderer understands"""
+
+
+@dataclass
+class ChartColumns:
+    """Chart data as arrays: an x axis, float64 series and an optional grid.
+
+    ``x`` is float64 for numeric axes and an object array of labels for
+    categorical ones; missing values are NaN.
+    """
+
+    x: Optional[np.ndarray]
+    series: Dict[str, np.ndarray]
+    matrix: Optional[np.ndarray] = None
+    x_labels: Optional[List[str]] = None
+    y_labels: Optional[List[str]] = None
+    # Set by downsample(): rows of x kept per series (line/scatter) and
+    # (counts, edges) per series (histogram)
+    x_index: Optional[Dict[str, np.ndarray]] = None
+    bins: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None
+    stats: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def categorical(self) -> bool:
+        return self.x is not None and self.x.dtype == object
+
+    @property
+    def points(self) -> int:
+        if self.bins is not None:
+            return int(sum(len(counts) for counts, _ in self.bins.values()))
+        if self.matrix is not None:
+            return int(self.matrix.size)
+        return int(sum(len(ys) for ys in self.series.values()))
+
+
+# ---- parsing: every accepted shape -> columns, without per-row objects ----
+
+def _numeric(values: Any) -> Optional[np.ndarray]:
+    """float64 array, or None if any non-missing value is not a number"""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        pass
+    column = pd.Series(values) if not isinstance(values, pd.Series) else values
+    if column.dtype == bool:
+        return None
+    converted = pd.to_numeric(column, errors="coerce")
+    present = column.notna()
+    if not present.any() or converted[present].isna().any():
+        return None
+    return converted.to_numpy(dtype=np.float64)
+
+
+def _from_columns(columns: Dict[str, Any], first_is_x: bool = False) -> ChartColumns:
+    """x is the first non-numeric column; for tabular input (``first_is_x``)
+    an all-numeric first column is used as x when more columns follow.
+    """
+    names = list(columns)
+    x = None
+    if first_is_x and len(names) > 1:
+        first = _numeric(columns[names[0]])
+        if first is not None:
+            x, names = first, names[1:]
+    series: Dict[str, np.ndarray] = {}
+    for name in names:
+        values = _numeric(columns[name])
+        if values is not None:
+            series[str(name)] = values
+        elif x is None:
+            x = np.asarray([str(v) for v in columns[name]], dtype=object)
+    if not series:
+        raise ChartDataError("no numeric column")
+    return _checked(ChartColumns(x=x, series=series))
+
+
+def _checked(columns: ChartColumns) -> ChartColumns:
+    if columns.x is not None and any(len(ys) != len(columns.x) for ys in columns.series.values()):
+        raise ChartDataError("x and series lengths differ")
+    return columns
+
+
+def _from_frame(frame: pd.DataFrame) -> ChartColumns:
+    if frame.empty:
+        raise ChartDataError("empty data")
+    return _from_columns({str(name): frame[name] for name in frame.columns}, first_is_x=True)
+
+
+def _default_names(width: int) -> List[str]:
+    return (["x", "y"] if width > 1 else ["y"]) + [f"y{i}" for i in range(2, width)]
+
+
+def _from_csv(text: str) -> ChartColumns:
+    text = text.strip()
+    if not text:
+        raise ChartDataError("empty data")
+    first = next(csv.reader(io.StringIO(text.split("\n", 1)[0])))
+    has_header = any(_numeric([v]) is None for v in first) and "\n" in text
+    # C parser: columns are built as typed arrays, never as row objects
+    frame = pd.read_csv(io.StringIO(text), header=0 if has_header else None, skipinitialspace=True)
+    if not has_header:
+        frame.columns = _default_names(frame.shape[1])
+    return _from_frame(frame)
+
+
+def _grid(rows: Any) -> Optional[np.ndarray]:
+    if not isinstance(rows, list) or not rows or not isinstance(rows[0], list):
+        return None
+    try:
+        grid = np.asarray(rows, dtype=np.float64)
+    except (TypeError, ValueError):
+        return None
+    return grid if grid.ndim == 2 else None
+
+
+def _from_grid(grid: np.ndarray) -> ChartColumns:
+    names = _default_names(grid.shape[1])
+    columns = {name: grid[:, i] for i, name in enumerate(names)}
+    parsed = _from_columns(columns, first_is_x=True) if grid.shape[1] > 1 else _from_columns(columns)
+    parsed.matrix = grid
+    return parsed
+
+
+def to_columns(data: Any) -> ChartColumns:
+    """Turn the accepted ``ChartIn.data`` shapes into ``ChartColumns``.
+
+    Handles number lists, rows, records, dict-of-columns, ``x``/``y`` and
+    ``labels``/``values`` objects, ``matrix``/``z`` grids and CSV text.
+    Numeric data is converted a column at a time with NumPy or pandas.
+    """
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except json.JSONDecodeError:
+            return _from_csv(data)
+        if isinstance(data, str):
+            return _from_csv(data)
+
+    if isinstance(data, list):
+        if not data:
+            raise ChartDataError("empty data")
+        if not isinstance(data[0], (list, tuple, dict)):
+            values = _numeric(data)
+            if values is None or values.ndim != 1:
+                raise ChartDataError("list items must be numbers, rows or records")
+            return ChartColumns(x=None, series={"value": values})
+        grid = _grid(data)
+        if grid is not None:
+            return _from_grid(grid)
+        if all(isinstance(r, dict) for r in data):
+            return _from_frame(pd.DataFrame.from_records(data))
+        if all(isinstance(r, (list, tuple)) for r in data):
+            frame = pd.DataFrame(data)
+            frame.columns = _default_names(frame.shape[1])
+            return _from_frame(frame)
+        raise ChartDataError("list items must be numbers, rows or records")
+
+    if isinstance(data, dict):
+        for key in ("matrix", "z"):
+            grid = _grid(data.get(key))
+            if grid is not None:
+                parsed = _from_grid(grid)
+                parsed.x_labels = [str(v) for v in data.get("x_labels") or []] or None
+                parsed.y_labels = [str(v) for v in data.get("y_labels") or []] or None
+                return parsed
+        if "x" in data and "y" in data:
+            y = data["y"]
+            parsed = _from_columns(dict(y) if isinstance(y, dict) else {str(data.get("label") or "y"): y})
+            x = _numeric(data["x"])
+            parsed.x = x if x is not None else np.asarray([str(v) for v in data["x"]], dtype=object)
+            return _checked(parsed)
+        for labels_key, values_key in (("labels", "values"), ("labels", "data"), ("categories", "values")):
+            if labels_key in data and values_key in data:
+                values = data[values_key]
+                parsed = _from_columns(dict(values) if isinstance(values, dict) else {"value": values})
+                parsed.x = np.asarray([str(v) for v in data[labels_key]], dtype=object)
+                return _checked(parsed)
+        if data and not any(isinstance(v, (list, dict)) for v in data.values()):
+            values = _numeric(list(data.values()))
+            if values is not None:
+                return ChartColumns(x=np.asarray([str(k) for k in data], dtype=object), series={"value": values})
+        if data and all(isinstance(v, list) for v in data.values()):
+            return _from_columns(data)
+        raise ChartDataError("unrecognized object shape")
+
+    raise ChartDataError(f"unsupported data type {type(data).__name__}")
+
+
+# ---- downsampling to a pixel budget ----
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of ``n_out`` representative points.
+
+    ``x`` must be sorted. The first and last points are always kept; each
+    bucket in between keeps the point forming the largest triangle with
+    the previously kept point and the next bucket's mean.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    sums_x = np.concatenate(([0.0], np.cumsum(x)))
+    sums_y = np.concatenate(([0.0], np.cumsum(y)))
+    counts = ends - starts
+    mean_x = (sums_x[ends] - sums_x[starts]) / counts
+    mean_y = (sums_y[ends] - sums_y[starts]) / counts
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        s, e = starts[i], ends[i]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - next_x[i]) * (y[s:e] - ay) - (ax - x[s:e]) * (next_y[i] - ay))
+        a = s + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def histogram_bins(values: np.ndarray, max_bins: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(counts, edges) with numpy's automatic bin width, capped at ``max_bins``"""
+    values = values[np.isfinite(values)]
+    if not len(values):
+        raise ChartDataError("no finite values")
+    edges = np.histogram_bin_edges(values, bins="auto")
+    if len(edges) - 1 > max_bins:
+        edges = np.histogram_bin_edges(values, bins=max_bins)
+    counts, edges = np.histogram(values, bins=edges)
+    return counts, edges
+
+
+def block_mean(grid: np.ndarray, max_rows: int, max_cols: int) -> Tuple[np.ndarray, int, int]:
+    """Average ``grid`` over blocks so it fits ``max_rows`` x ``max_cols``"""
+    rows, cols = grid.shape
+    fr = max(1, -(-rows // max_rows))
+    fc = max(1, -(-cols // max_cols))
+    if fr == 1 and fc == 1:
+        return grid, 1, 1
+    padded = np.full((-(-rows // fr) * fr, -(-cols // fc) * fc), np.nan)
+    padded[:rows, :cols] = grid
+    blocks = padded.reshape(padded.shape[0] // fr, fr, padded.shape[1] // fc, fc)
+    with warnings.catch_warnings():
+        # Padding and missing cells are NaN; a block of nothing but NaN stays NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        reduced = np.nanmean(blocks, axis=(1, 3))
+    return reduced, fr, fc
+
+
+def _labels(labels: Optional[List[str]], step: int) -> Optional[List[str]]:
+    return labels[::step] if labels and step > 1 else labels
+
+
+def _pie_slices(columns: ChartColumns) -> None:
+    """Keep the rows whose wedge size is known; only the first series is drawn"""
+    ys = next(iter(columns.series.values()))
+    if np.isinf(ys).any():
+        raise ChartDataError("pie values must be finite")
+    keep = np.flatnonzero(~np.isnan(ys))
+    if not len(keep):
+        raise ChartDataError("pie has no values")
+    if (ys[keep] < 0).any() or not ys[keep].sum() > 0:
+        raise ChartDataError("pie values must be non-negative and not all zero")
+    if len(keep) == len(ys):
+        return
+    columns.series = {
+        name: values[keep] if len(values) == len(ys) else values for name, values in columns.series.items()
+    }
+    if columns.x is not None and len(columns.x) >= len(ys):
+        columns.x = columns.x[keep]
+
+
+def fold_categories(columns: ChartColumns, chart_type: str, max_categories: int) -> None:
+    """Keep the largest ``max_categories - 1`` categories in their original
+    order and sum the rest into a trailing "other" category.
+
+    Bars are ranked by their absolute total over all series, pie slices by
+    the first series (the only one drawn). Unlabeled categories get the
+    labels the renderer would have drawn.
+    """
+    max_categories = max(2, max_categories)
+    n = max(len(ys) for ys in columns.series.values())
+    if n <= max_categories:
+        return
+    grid = np.full((len(columns.series), n), np.nan)
+    for i, ys in enumerate(columns.series.values()):
+        grid[i, :len(ys)] = ys
+    if columns.x is not None and len(columns.x) >= n:
+        labels = columns.x[:n] if columns.categorical else np.array([f"{v:g}" for v in columns.x[:n]], dtype=object)
+    else:
+        base = 1 if chart_type == "pie" else 0
+        labels = np.array([str(i + base) for i in range(n)], dtype=object)
+    size = np.abs(grid[0]) if chart_type == "pie" else np.nansum(np.abs(grid), axis=0)
+    ranked = np.argsort(-np.nan_to_num(size, nan=-1.0), kind="stable")
+    keep = np.sort(ranked[:max_categories - 1])
+    rest = np.sort(ranked[max_categories - 1:])
+    other = np.nansum(grid[:, rest], axis=1)
+    columns.series = {
+        name: np.append(grid[i, keep], other[i]) for i, name in enumerate(columns.series)
+    }
+    columns.x = np.concatenate([labels[keep], np.array(["other"], dtype=object)])
+
+
+def downsample(
+    columns: ChartColumns,
+    chart_type: str,
+    width_px: int,
+    height_px: int,
+    max_categories: int = CHART_MAX_CATEGORIES,
+) -> ChartColumns:
+    """Reduce ``columns`` to what ``width_px`` x ``height_px`` can show.
+
+    line/scatter: LTTB to about one point per horizontal pixel per series.
+    histogram: series become (counts, edges) with at most one bin per 4 px.
+    heatmap: the grid is block-averaged to at most one cell per pixel.
+    bar/pie: beyond ``max_categories`` the smallest categories are folded
+    into "other"; pie slices with missing values are dropped first, and
+    bars and slices must otherwise be finite.
+    """
+    before = columns.points
+    if chart_type in ("line", "scatter"):
+        budget = max(3, width_px)
+        x = columns.x
+        columns.x_index = {}
+        for name, ys in columns.series.items():
+            if x is None or columns.categorical:
+                positions = np.arange(len(ys), dtype=np.float64)
+            else:
+                positions = x
+            order = np.flatnonzero(np.isfinite(ys) & np.isfinite(positions))
+            if chart_type == "line" and len(order) and np.any(np.diff(positions[order]) < 0):
+                order = order[np.argsort(positions[order], kind="stable")]
+            keep = order[lttb_indices(positions[order], ys[order], budget)]
+            columns.series[name] = ys[keep]
+            columns.x_index[name] = keep
+    elif chart_type == "histogram":
+        max_bins = max(4, width_px // 4)
+        columns.bins = {name: histogram_bins(ys, max_bins) for name, ys in columns.series.items()}
+    elif chart_type == "heatmap":
+        grid = columns.matrix
+        if grid is None:
+            if len({len(ys) for ys in columns.series.values()}) != 1:
+                raise ChartDataError("heatmap series must have equal lengths")
+            grid = np.vstack(list(columns.series.values()))
+            columns.y_labels = columns.y_labels or list(columns.series)
+            if columns.categorical:
+                columns.x_labels = columns.x_labels or list(columns.x)
+        grid, fr, fc = block_mean(grid, max(1, height_px), max(1, width_px))
+        columns.matrix = grid
+        columns.x_labels = _labels(columns.x_labels, fc)
+        columns.y_labels = _labels(columns.y_labels, fr)
+    elif chart_type == "bar":
+        if any(np.isinf(ys).any() for ys in columns.series.values()):
+            raise ChartDataError("bar values must be finite")
+        fold_categories(columns, chart_type, max_categories)
+    elif chart_type == "pie":
+        _pie_slices(columns)
+        fold_categories(columns, chart_type, max_categories)
+    columns.stats = {"points": before, "plotted": columns.points}
+    return columns
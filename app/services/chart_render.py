@@ -0,0 +1,196 @@
+# app/services/chart_render.py
+from __future__ import annotations
+
+import asyncio
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.services.chart_data import ChartColumns, ChartDataError, downsample, to_columns
+
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+CHART_DPI = int(os.getenv("CHART_DPI", "120"))
+CHART_WIDTH_IN = float(os.getenv("CHART_WIDTH_IN", "8"))
+CHART_HEIGHT_IN = float(os.getenv("CHART_HEIGHT_IN", "5"))
+CHART_MAX_TICKS = int(os.getenv("CHART_MAX_TICKS", "30"))
+
+_POOL: Optional[ProcessPoolExecutor] = None
+
+
+# ---- worker side (runs in the process pool) ----
+
+def _warm_worker() -> None:
+    """Import matplotlib on the Agg backend and build its font cache once"""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(1, 1))
+    ax.plot([0, 1], [0, 1])
+    ax.set_title("warm")
+    fig.savefig(io.BytesIO(), format="png")
+    plt.close(fig)
+
+
+def _ticks(ax, axis: str, positions: Any, labels: List[str]) -> None:
+    """Categorical tick labels, thinned to at most CHART_MAX_TICKS"""
+    step = max(1, -(-len(labels) // CHART_MAX_TICKS))
+    positions, labels = list(positions)[::step], labels[::step]
+    if axis == "x":
+        rotate = len(labels) > 8
+        ax.set_xticks(positions, labels, rotation=45 if rotate else 0, ha="right" if rotate else "center")
+    else:
+        ax.set_yticks(positions, labels)
+
+
+def _prepare(spec: Dict[str, Any]) -> ChartColumns:
+    columns = to_columns(spec["data"])
+    width_px = int(CHART_WIDTH_IN * CHART_DPI)
+    height_px = int(CHART_HEIGHT_IN * CHART_DPI)
+    return downsample(columns, spec["chart_type"], width_px, height_px)
+
+
+def render_chart(spec: Dict[str, Any]) -> Tuple[bytes, Dict[str, int]]:
+    """Render one chart with matplotlib; runs inside a pool worker.
+
+    Returns the image and the point counts before and after downsampling.
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    columns = _prepare(spec)
+    chart_type = spec["chart_type"]
+    series = columns.series
+    x = columns.x
+
+    fig, ax = plt.subplots(figsize=(CHART_WIDTH_IN, CHART_HEIGHT_IN), dpi=CHART_DPI)
+    try:
+        if chart_type in ("line", "scatter"):
+            for name, ys in series.items():
+                rows = columns.x_index[name]
+                xs = x[rows] if x is not None and not columns.categorical else rows
+                if chart_type == "line":
+                    ax.plot(xs, ys, label=name, marker="o" if len(ys) <= 50 else None)
+                else:
+                    ax.scatter(xs, ys, label=name, s=16 if len(ys) <= 500 else 4)
+            if columns.categorical:
+                _ticks(ax, "x", range(len(x)), [str(v) for v in x])
+        elif chart_type == "bar":
+            n = max(len(ys) for ys in series.values())
+            width = 0.8 / len(series)
+            for i, (name, ys) in enumerate(series.items()):
+                offset = (i - (len(series) - 1) / 2) * width
+                ax.bar(np.arange(len(ys)) + offset, ys, width=width, label=name)
+            labels = [str(v) for v in x[:n]] if x is not None and len(x) >= n else [str(i) for i in range(n)]
+            if x is not None and not columns.categorical and len(x) >= n:
+                labels = [f"{v:g}" for v in x[:n]]
+            _ticks(ax, "x", range(n), labels)
+        elif chart_type == "pie":
+            ys = next(iter(series.values()))
+            labels = [str(v) for v in x[:len(ys)]] if x is not None and len(x) >= len(ys) else None
+            ax.pie(ys, labels=labels or [str(i + 1) for i in range(len(ys))], autopct="%1.1f%%", startangle=90)
+            ax.axis("equal")
+        elif chart_type == "histogram":
+            for name, (counts, edges) in columns.bins.items():
+                ax.stairs(counts, edges, fill=True, alpha=0.7 if len(series) > 1 else 1.0, label=name)
+        elif chart_type == "heatmap":
+            image = ax.imshow(columns.matrix, aspect="auto", cmap="viridis", interpolation="nearest")
+            fig.colorbar(image, ax=ax)
+            if columns.x_labels:
+                _ticks(ax, "x", range(len(columns.x_labels)), columns.x_labels)
+            if columns.y_labels:
+                _ticks(ax, "y", range(len(columns.y_labels)), columns.y_labels)
+        else:
+            raise ChartDataError(f"unsupported chart type {chart_type}")
+
+        ax.set_title(spec.get("title") or f"{chart_type.title()} Chart")
+        if chart_type != "pie":
+            ax.set_xlabel(spec.get("x_label") or "X")
+            ax.set_ylabel(spec.get("y_label") or ("Count" if chart_type == "histogram" else "Y"))
+            if len(series) > 1 and chart_type != "heatmap":
+                ax.legend()
+        fig.tight_layout()
+        out = io.BytesIO()
+        fig.savefig(out, format=spec["output_format"])
+        return out.getvalue(), columns.stats
+    finally:
+        plt.close(fig)
+
+
+def dataset_csv(spec: Dict[str, Any]) -> Tuple[str, Dict[str, int]]:
+    """Downsampled data as CSV for the remote renderer; runs inside a pool worker.
+
+    Histograms are sent pre-binned (bin_start, bin_end, count per series)
+    and heatmaps as the reduced grid without a header.
+    """
+    columns = _prepare(spec)
+    out = io.StringIO()
+    if columns.bins is not None:
+        frames = [
+            pd.DataFrame({"series": name, "bin_start": edges[:-1], "bin_end": edges[1:], "count": counts})
+            for name, (counts, edges) in columns.bins.items()
+        ]
+        pd.concat(frames).to_csv(out, index=False)
+    elif spec["chart_type"] == "heatmap":
+        frame = pd.DataFrame(columns.matrix, index=columns.y_labels, columns=columns.x_labels)
+        frame.to_csv(out, header=columns.x_labels is not None, index=columns.y_labels is not None)
+    else:
+        # Series keep different rows after LTTB; align them on the original row
+        index = columns.x_index or {name: np.arange(len(ys)) for name, ys in columns.series.items()}
+        data: Dict[str, Any] = {}
+        if columns.x is not None:
+            rows = np.unique(np.concatenate(list(index.values())))
+            data["x"] = pd.Series(columns.x[rows], index=rows)
+        for name, ys in columns.series.items():
+            data[name] = pd.Series(ys, index=index[name])
+        pd.DataFrame(data).sort_index().to_csv(out, index=False)
+    return out.getvalue(), columns.stats
+
+
+# ---- parent side ----
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        # spawn: never fork a process that owns a running event loop
+        _POOL = ProcessPoolExecutor(
+            max_workers=CHART_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_worker,
+        )
+    return _POOL
+
+
+def warm_pool() -> None:
+    """Start every worker now so the first charts do not pay for imports"""
+    pool = _get_pool()
+    for _ in range(CHART_WORKERS):
+        pool.submit(int)
+
+
+def shutdown_pool() -> None:
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
+
+
+async def render_local(spec: Dict[str, Any]) -> Tuple[bytes, float, Dict[str, int]]:
+    """(image bytes, render ms, point counts) for ``spec`` rendered in the process pool"""
+    started = time.perf_counter()
+    blob, stats = await asyncio.get_running_loop().run_in_executor(_get_pool(), render_chart, spec)
+    return blob, (time.perf_counter() - started) * 1000, stats
+
+
+async def remote_dataset(spec: Dict[str, Any]) -> Tuple[str, Dict[str, int]]:
+    """Downsampled CSV of ``spec``'s data, prepared in the process pool"""
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), dataset_csv, spec)
@@ -1,12 +1,299 @@
 # app/services/chat_history.py
 from __future__ import annotations
 
+import base64
+import binascii
+import os
 import time
-from asyncio import Lock
+from collections import OrderedDict
 from typing import Any, Dict, List, Optional, Tuple
 
-_HISTORY: Dict[str, Dict[str, Any]] = {}
-_LOCK = Lock()
+from app.services import thread_store
+from app.services.history_writer import history_writer
+
+HISTORY_MAX_ENTRIES = int(os.getenv("HISTORY_MAX_ENTRIES", "50000"))
+HISTORY_MAX_BYTES = int(os.getenv("HISTORY_MAX_BYTES", str(128 * 1024 * 1024)))
+HISTORY_TTL_S = float(os.getenv("HISTORY_TTL_S", str(24 * 3600)))
+HISTORY_SHARDS = int(os.getenv("HISTORY_SHARDS", "16"))
+HISTORY_MAX_SUMMARIES = int(os.getenv("HISTORY_MAX_SUMMARIES", "5000"))
+# Largest page of exchanges /threads/{id}/messages will return
+HISTORY_PAGE_MAX_LIMIT = int(os.getenv("HISTORY_PAGE_MAX_LIMIT", "500"))
+
+# Rough per-entry cost of the slots object, its strings and the dict slot
+_ENTRY_OVERHEAD = 240
+
+
+class _Entry:
+    """One exchange; message dicts are only built when a thread is read"""
+
+    __slots__ = (
+        "response_id",
+        "previous_response_id",
+        "thread_id",
+        "seq",
+        "user_text",
+        "assistant_text",
+        "model",
+        "created_at",
+        "metadata",
+        "stored_at",
+        "size",
+    )
+
+    def __init__(
+        self,
+        response_id: str,
+        previous_response_id: Optional[str],
+        user_text: Optional[str],
+        assistant_text: Optional[str],
+        model: Optional[str],
+        created_at: float,
+        metadata: Optional[Dict[str, Any]],
+    ) -> None:
+        self.response_id = response_id
+        self.previous_response_id = previous_response_id
+        self.thread_id = response_id
+        self.seq = 0
+        self.user_text = user_text or None
+        self.assistant_text = assistant_text or None
+        self.model = model
+        self.created_at = created_at
+        self.metadata = metadata
+        self.stored_at = time.monotonic()
+        self.size = (
+            _ENTRY_OVERHEAD
+            + len(response_id)
+            + len(previous_response_id or "")
+            + len(self.user_text or "")
+            + len(self.assistant_text or "")
+            + (len(repr(metadata)) if metadata else 0)
+        )
+
+    def messages(self) -> List[Dict[str, Any]]:
+        out = []
+        user_msg = _build_user_message(self.response_id, self.user_text, self.created_at)
+        if user_msg:
+            out.append(user_msg)
+        assistant_msg = _build_assistant_message(
+            self.response_id, self.assistant_text, self.created_at, self.model, self.metadata
+        )
+        if assistant_msg:
+            out.append(assistant_msg)
+        return out
+
+
+class _Thread:
+    """Linear run of exchanges in chain order, named after its first one.
+
+    An exchange joins its predecessor's thread when it directly follows
+    it; a root, a fork, or an exchange whose predecessor is not in memory
+    heads a new thread linked to the older one through ``parent``.
+    """
+
+    __slots__ = ("ids", "parent", "live")
+
+    def __init__(self, head: str, parent: Optional[str]) -> None:
+        self.ids: List[str] = [head]
+        self.parent = parent
+        self.live = 0
+
+
+class _Shard:
+    __slots__ = ("entries", "bytes", "max_entries", "max_bytes")
+
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self.entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.bytes = 0
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+
+class ChatHistory:
+    """LRU + TTL store of chat exchanges, split into independently bounded shards.
+
+    Every operation is synchronous and never awaits, so on the event loop
+    no other coroutine can observe a half-applied update and no lock is
+    needed; reads walk the chain without blocking writers. Sharding keeps
+    each LRU small, so eviction and TTL sweeps touch one shard at a time.
+    Threads are materialized on write, so reads are list slices.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = HISTORY_MAX_ENTRIES,
+        max_bytes: int = HISTORY_MAX_BYTES,
+        ttl: float = HISTORY_TTL_S,
+        shards: int = HISTORY_SHARDS,
+    ) -> None:
+        shards = max(1, shards)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._shards = [
+            _Shard(max(1, max_entries // shards), max(1, max_bytes // shards)) for _ in range(shards)
+        ]
+        self._threads: Dict[str, _Thread] = {}
+        # Bumped when a stored exchange is overwritten; appends never change
+        # an existing page, so this is all a page cache has to watch
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _shard(self, response_id: str) -> _Shard:
+        return self._shards[hash(response_id) % len(self._shards)]
+
+    def _drop(self, shard: _Shard, response_id: str) -> None:
+        entry = shard.entries.pop(response_id)
+        shard.bytes -= entry.size
+        thread = self._threads[entry.thread_id]
+        thread.live -= 1
+        if not thread.live:
+            del self._threads[entry.thread_id]
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return now - entry.stored_at > self.ttl
+
+    def _place(self, entry: _Entry) -> None:
+        previous = self.peek(entry.previous_response_id) if entry.previous_response_id else None
+        if previous is not None:
+            thread = self._threads[previous.thread_id]
+            slot = previous.seq + 1
+            # Appending, or returning to the slot it held before eviction
+            if slot == len(thread.ids) or thread.ids[slot] == entry.response_id:
+                if slot == len(thread.ids):
+                    thread.ids.append(entry.response_id)
+                entry.thread_id, entry.seq = previous.thread_id, slot
+                thread.live += 1
+                return
+        entry.thread_id, entry.seq = entry.response_id, 0
+        thread = self._threads.get(entry.response_id)
+        if thread is None:
+            thread = self._threads[entry.response_id] = _Thread(entry.response_id, entry.previous_response_id)
+        thread.live += 1
+
+    def put(self, entry: _Entry) -> None:
+        shard = self._shard(entry.response_id)
+        existing = shard.entries.pop(entry.response_id, None)
+        if existing is not None:
+            # Re-saved exchange (e.g. hydrated again) keeps its position
+            shard.bytes -= existing.size
+            entry.thread_id, entry.seq = existing.thread_id, existing.seq
+            self.generation += 1
+        else:
+            self._place(entry)
+        shard.entries[entry.response_id] = entry
+        shard.bytes += entry.size
+        # Expired entries at the cold end go first, then plain LRU eviction
+        now = time.monotonic()
+        while len(shard.entries) > 1:
+            oldest_id, oldest = next(iter(shard.entries.items()))
+            if self._expired(oldest, now):
+                self._drop(shard, oldest_id)
+                self.expirations += 1
+            elif len(shard.entries) > shard.max_entries or shard.bytes > shard.max_bytes:
+                self._drop(shard, oldest_id)
+                self.evictions += 1
+            else:
+                break
+
+    def peek(self, response_id: str) -> Optional[_Entry]:
+        """Entry without touching LRU order or hit statistics"""
+        return self._shard(response_id).entries.get(response_id)
+
+    def get(self, response_id: str) -> Optional[_Entry]:
+        shard = self._shard(response_id)
+        entry = shard.entries.get(response_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        if self._expired(entry, time.monotonic()):
+            self._drop(shard, response_id)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        shard.entries.move_to_end(response_id)
+        self.hits += 1
+        return entry
+
+    def before(self, anchor: _Entry, limit: int) -> Tuple[List[_Entry], Optional[str]]:
+        """Up to ``limit`` exchanges ending at ``anchor``, oldest first.
+
+        Returns (entries, missing_id): the next older exchange that is not
+        in memory, or None once the root is reached. Each thread adds one
+        list slice, so the cost is O(limit) plus one hop per fork.
+        """
+        if limit <= 0:
+            return [], anchor.response_id
+        newest_first: List[_Entry] = []
+        entry: Optional[_Entry] = anchor
+        while True:
+            thread = self._threads[entry.thread_id]
+            lo = max(0, entry.seq + 1 - (limit - len(newest_first)))
+            for response_id in reversed(thread.ids[lo:entry.seq + 1]):
+                found = self.get(response_id)
+                if found is None:
+                    return newest_first[::-1], response_id
+                newest_first.append(found)
+            if len(newest_first) >= limit:
+                return newest_first[::-1], newest_first[-1].previous_response_id
+            entry = self.get(thread.parent) if thread.parent else None
+            if entry is None:
+                return newest_first[::-1], thread.parent
+
+    def after(self, anchor: _Entry, cursor: _Entry, limit: int) -> Optional[List[_Entry]]:
+        """Up to ``limit`` exchanges newer than ``cursor``, up to ``anchor``, oldest first.
+
+        None if ``cursor`` is not an in-memory ancestor of ``anchor``.
+        """
+        if limit <= 0:
+            return []
+        spans: List[Tuple[_Thread, int, int]] = []
+        entry: Optional[_Entry] = anchor
+        while entry is not None:
+            thread = self._threads[entry.thread_id]
+            if entry.thread_id == cursor.thread_id and cursor.seq <= entry.seq:
+                spans.append((thread, cursor.seq + 1, entry.seq + 1))
+                break
+            spans.append((thread, 0, entry.seq + 1))
+            entry = self.peek(thread.parent) if thread.parent else None
+        else:
+            return None
+        out: List[_Entry] = []
+        for thread, lo, hi in reversed(spans):
+            for response_id in thread.ids[lo:hi]:
+                found = self.get(response_id)
+                if found is None or len(out) >= limit:
+                    return out
+                out.append(found)
+        return out
+
+    def __len__(self) -> int:
+        return sum(len(shard.entries) for shard in self._shards)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "bytes": sum(shard.bytes for shard in self._shards),
+            "threads": len(self._threads),
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl,
+            "shards": len(self._shards),
+            "largest_shard_entries": max(len(shard.entries) for shard in self._shards),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+_HISTORY = ChatHistory()
+# Rolling compaction summaries, keyed by the last response they cover
+_SUMMARIES: "OrderedDict[str, str]" = OrderedDict()
 
 
 def _build_user_message(response_id: str, text: Optional[str], created_at: float) -> Optional[Dict[str, Any]]:
@@ -22,7 +309,13 @@ def _build_user_message(response_id: str, text: Optional[str], created_at: float
     }
 
 
-def _build_assistant_message(response_id: str, text: Optional[str], created_at: float, model: Optional[str]) -> Optional[Dict[str, Any]]:
+def _build_assistant_message(
+    response_id: str,
+    text: Optional[str],
+    created_at: float,
+    model: Optional[str],
+    metadata: Optional[Dict[str, Any]] = None,
+) -> Optional[Dict[str, Any]]:
     if not text:
         return None
     return {
@@ -31,10 +324,21 @@ def _build_assistant_message(response_id: str, text: Optional[str], created_at:
         "content": text,
         "created_at": created_at,
         "model": model,
-        "metadata": None,
+        "metadata": metadata,
     }
 
 
+def encode_cursor(response_id: str) -> str:
+    return base64.urlsafe_b64encode(response_id.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        return base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True).decode("utf-8")
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("invalid cursor")
+
+
 async def save_entry(
     *,
     response_id: Optional[str],
@@ -43,43 +347,122 @@ async def save_entry(
     assistant_text: Optional[str],
     model: Optional[str],
     created_at: Optional[float],
+    metadata: Optional[Dict[str, Any]] = None,
+    persist: bool = True,
 ) -> None:
     if not response_id:
         return
 
     timestamp = created_at if created_at is not None else time.time()
-    user_msg = _build_user_message(response_id, user_text, timestamp)
-    assistant_msg = _build_assistant_message(response_id, assistant_text, timestamp, model)
-
-    async with _LOCK:
-        _HISTORY[response_id] = {
-            "previous_response_id": previous_response_id,
-            "user": user_msg,
-            "assistant": assistant_msg,
-        }
+    entry = _Entry(response_id, previous_response_id, user_text, assistant_text, model, timestamp, metadata)
+    _HISTORY.put(entry)
+    if persist:
+        # Never awaits the database; rows are flushed in the background
+        history_writer.enqueue(entry)
+
+
+def save_entries(exchanges: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Cache a batch of hydrated exchanges (oldest first) in one pass; returns their messages"""
+    entries = [
+        _Entry(
+            e["response_id"],
+            e["previous_response_id"],
+            e["user_text"],
+            e["assistant_text"],
+            e["model"],
+            e["created_at"] if e["created_at"] is not None else time.time(),
+            e["metadata"],
+        )
+        for e in exchanges
+    ]
+    for entry in entries:
+        _HISTORY.put(entry)
+    history_writer.enqueue_many(entries)
+    return [message for entry in entries for message in entry.messages()]
+
+
+async def _load_before(response_id: str, limit: int) -> Tuple[List[_Entry], Optional[str]]:
+    """Exchanges ending at ``response_id`` from the database, cached on the way"""
+    rows, missing = await thread_store.load_before(response_id, limit)
+    for row in rows:
+        await save_entry(**row, persist=False)
+    return [_Entry(**row) for row in rows], missing
+
 
+async def thread_page(
+    response_id: str,
+    limit: int = 50,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+) -> Dict[str, Any]:
+    """One page of the thread ending at ``response_id``, oldest first.
+
+    ``before``/``after`` are cursors from a previous page. Memory is read
+    first, then the database; ``missing_id`` is where neither had the
+    chain, for the caller to hydrate from OpenAI.
+    """
+    source = "cache"
+    missing: Optional[str] = None
+    if after:
+        anchor = _HISTORY.get(response_id)
+        cursor = _HISTORY.get(decode_cursor(after))
+        entries = _HISTORY.after(anchor, cursor, limit) if anchor and cursor else None
+        if entries is None:
+            source = "db"
+            rows = await thread_store.load_after(response_id, decode_cursor(after), limit)
+            entries = [_Entry(**row) for row in rows]
+    else:
+        entries = []
+        missing = response_id
+        if before:
+            cursor_id = decode_cursor(before)
+            cursor = _HISTORY.get(cursor_id)
+            missing = cursor.previous_response_id if cursor else await thread_store.previous_of(cursor_id)
+        anchor = _HISTORY.get(missing) if missing else None
+        if anchor is not None:
+            entries, missing = _HISTORY.before(anchor, limit)
+        if missing and len(entries) < limit:
+            older, missing = await _load_before(missing, limit - len(entries))
+            if older:
+                source = "cache+db" if entries else "db"
+                entries = older + entries
+        if len(entries) >= limit:
+            # A full page needs nothing older; the before cursor leads on
+            missing = None
 
-async def build_thread_messages(response_id: str, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[str]]:
     messages: List[Dict[str, Any]] = []
-    current_id: Optional[str] = response_id
+    for entry in entries:
+        messages.extend(entry.messages())
+    at_anchor = not entries or entries[-1].response_id == response_id
+    return {
+        "messages": messages,
+        "exchanges": len(entries),
+        "missing_id": missing,
+        "source": source,
+        "cursors": {
+            "before": encode_cursor(entries[0].response_id) if entries and entries[0].previous_response_id else None,
+            "after": None if at_anchor else encode_cursor(entries[-1].response_id),
+        },
+    }
 
-    async with _LOCK:
-        for _ in range(limit):
-            if not current_id:
-                break
 
-            entry = _HISTORY.get(current_id)
-            if not entry:
-                break
+def get_summary(response_id: str) -> Optional[str]:
+    summary = _SUMMARIES.get(response_id)
+    if summary is not None:
+        _SUMMARIES.move_to_end(response_id)
+    return summary
+
+
+def save_summary(response_id: str, summary: str) -> None:
+    _SUMMARIES[response_id] = summary
+    _SUMMARIES.move_to_end(response_id)
+    while len(_SUMMARIES) > HISTORY_MAX_SUMMARIES:
+        _SUMMARIES.popitem(last=False)
 
-            user_msg = entry.get("user")
-            assistant_msg = entry.get("assistant")
 
-            if user_msg:
-                messages.append(user_msg)
-            if assistant_msg:
-                messages.append(assistant_msg)
+def history_generation() -> int:
+    return _HISTORY.generation
 
-            current_id = entry.get("previous_response_id")
 
-    return list(reversed(messages)), current_id
+def history_stats() -> Dict[str, Any]:
+    return {**_HISTORY.stats(), "summaries": len(_SUMMARIES), "persistence": history_writer.stats()}
@@ -0,0 +1,196 @@
+# app/services/compaction.py
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from app.core.openai_client import client
+from app.services.chat_history import get_summary, save_summary, thread_page
+
+logger = logging.getLogger(__name__)
+
+CHAT_COMPACTION = os.getenv("CHAT_COMPACTION", "0") in ("1", "true", "True")
+# Compact once the chain (plus the new message) is estimated above this
+CHAT_COMPACT_BUDGET_TOKENS = int(os.getenv("CHAT_COMPACT_BUDGET_TOKENS", "6000"))
+# Most recent turns always sent verbatim
+CHAT_COMPACT_KEEP_TURNS = int(os.getenv("CHAT_COMPACT_KEEP_TURNS", "4"))
+CHAT_COMPACT_MAX_TURNS = int(os.getenv("CHAT_COMPACT_MAX_TURNS", "500"))
+CHAT_SUMMARY_MODEL = os.getenv("CHAT_SUMMARY_MODEL", "gpt-4.1-mini")
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "600"))
+
+# Per-message framing the API adds around role/content
+_MESSAGE_OVERHEAD = 4
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation so far for an assistant that will continue it. "
+    "Keep facts, decisions, names, numbers, open questions and the user's preferences. "
+    "Drop pleasantries. Write compact prose, no preamble."
+)
+
+
+_ENCODING: Any = None
+_ENCODING_LOADED = False
+_ENCODING_LOCK = threading.Lock()
+
+
+def _load_encoding() -> Any:
+    """tiktoken's o200k_base, or None; tried once per process, success or not.
+
+    The first call may download the BPE file, so it runs in a thread.
+    """
+    global _ENCODING, _ENCODING_LOADED
+    with _ENCODING_LOCK:
+        if not _ENCODING_LOADED:
+            try:
+                import tiktoken
+
+                _ENCODING = tiktoken.get_encoding("o200k_base")
+            except Exception as e:
+                # Offline or not installed: keep the regex estimate for good
+                logger.warning("tiktoken unavailable, estimating tokens by regex: %s", e)
+            _ENCODING_LOADED = True
+    return _ENCODING
+
+
+async def warm_encoding() -> bool:
+    """Load the tokenizer off the event loop; True if tiktoken is in use"""
+    if not _ENCODING_LOADED:
+        await asyncio.to_thread(_load_encoding)
+    return _ENCODING is not None
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Token count via tiktoken once loaded, else a word/punctuation estimate.
+
+    Never loads the tokenizer itself, so it is safe on the event loop.
+    """
+    if not text:
+        return 0
+    encoding = _ENCODING
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # BPE splits long words; roughly one token per 4 characters of a word
+    return sum(1 + len(piece) // 5 for piece in _TOKEN_RE.findall(text))
+
+
+def _message_tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(estimate_tokens(m["content"]) + _MESSAGE_OVERHEAD for m in messages)
+
+
+def _response_id(message: Dict[str, Any]) -> str:
+    message_id = message["id"]
+    return message_id[:-5] if message["role"] == "user" and message_id.endswith("_user") else message_id
+
+
+def _turns(messages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Group chronological messages into per-response turns"""
+    turns: List[List[Dict[str, Any]]] = []
+    current = None
+    for message in messages:
+        response_id = _response_id(message)
+        if response_id != current:
+            turns.append([])
+            current = response_id
+        turns[-1].append(message)
+    return turns
+
+
+def _transcript(messages: List[Dict[str, Any]]) -> str:
+    return "\n\n".join(f"{m['role'].upper()}: {m['content']}" for m in messages)
+
+
+@dataclass
+class Compaction:
+    input: List[Dict[str, str]]
+    tokens_before: int
+    tokens_after: int
+    summarized_turns: int
+    summary_reused: bool
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "type": "compaction",
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": self.tokens_saved,
+            "summarized_turns": self.summarized_turns,
+            "summary_reused": self.summary_reused,
+        }
+
+
+async def _summarize(previous_summary: Optional[str], messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    if previous_summary:
+        parts.append(f"Summary of the earlier conversation:\n{previous_summary}")
+    parts.append(f"Conversation to fold in:\n{_transcript(messages)}")
+    response = await client.responses.create(
+        model=CHAT_SUMMARY_MODEL,
+        instructions=SUMMARY_INSTRUCTIONS,
+        input="\n\n".join(parts),
+        max_output_tokens=CHAT_SUMMARY_MAX_TOKENS,
+    )
+    return response.output_text
+
+
+async def compact_context(previous_response_id: str, message: str) -> Optional[Compaction]:
+    """Summary + recent turns to send instead of chaining ``previous_response_id``.
+
+    None when the chain fits the budget or is not available locally. The
+    summary is rolling: it is stored against the last turn it covers, and
+    the next compaction folds only the turns after that into it, so only
+    the turns since the last summary have to be in history.
+    """
+    await warm_encoding()
+    page = await thread_page(previous_response_id, CHAT_COMPACT_MAX_TURNS)
+    if not page["messages"]:
+        return None
+    history = page["messages"]
+    tokens_before = _message_tokens(history) + estimate_tokens(message) + _MESSAGE_OVERHEAD
+    if tokens_before <= CHAT_COMPACT_BUDGET_TOKENS:
+        return None
+
+    turns = _turns(history)
+    keep = turns[-CHAT_COMPACT_KEEP_TURNS:] if CHAT_COMPACT_KEEP_TURNS > 0 else []
+    older = turns[:len(turns) - len(keep)]
+    if not older:
+        return None
+
+    # Newest stored summary within the older span, if any
+    summary, start = None, 0
+    for i in range(len(older) - 1, -1, -1):
+        summary = get_summary(_response_id(older[i][0]))
+        if summary is not None:
+            start = i + 1
+            break
+    if summary is None and page["cursors"]["before"]:
+        # Older turns exist beyond this page and are not summarized yet
+        return None
+    reused = start == len(older)
+    if not reused:
+        pending = [m for turn in older[start:] for m in turn]
+        summary = await _summarize(summary, pending)
+        save_summary(_response_id(older[-1][0]), summary)
+
+    recent = [{"role": m["role"], "content": m["content"]} for turn in keep for m in turn]
+    compacted = [
+        {"role": "developer", "content": f"Summary of the earlier conversation:\n{summary}"},
+        *recent,
+        {"role": "user", "content": message},
+    ]
+    return Compaction(
+        input=compacted,
+        tokens_before=tokens_before,
+        tokens_after=_message_tokens(compacted),
+        summarized_turns=len(older),
+        summary_reused=reused,
+    )
@@ -0,0 +1,189 @@
+# app/services/dataset_uploads.py
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHART_UPLOAD_INDEX = os.getenv("CHART_UPLOAD_INDEX", ".chart_uploads.json")
+# Uploaded datasets expire on OpenAI's side after this; entries are dropped with them
+CHART_UPLOAD_TTL_S = int(os.getenv("CHART_UPLOAD_TTL_S", str(7 * 24 * 3600)))
+# Re-check that a cached file_id still exists at most this often
+CHART_UPLOAD_REVALIDATE_S = float(os.getenv("CHART_UPLOAD_REVALIDATE_S", "3600"))
+CHART_UPLOAD_MAX_ENTRIES = int(os.getenv("CHART_UPLOAD_MAX_ENTRIES", "10000"))
+CHART_STORAGE_DIR = os.getenv("CHART_STORAGE_DIR", "storage")
+
+_CONTENT_TYPES = {"csv": "text/csv", "json": "application/json", "txt": "text/plain"}
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    directory = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".upload_", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def store_dataset(data: bytes, directory: str = CHART_STORAGE_DIR, ext: str = "txt") -> Tuple[str, str, bool]:
+    """Keep a local copy of a chart dataset; returns (digest, path, written).
+
+    The copy is named by content hash and keeps the dataset's extension
+    (csv, json or txt), so repeated charts of the same data reuse one file
+    instead of writing a new one per request.
+    """
+    digest = content_hash(data)
+    path = os.path.join(directory, f"data_{digest[:16]}.{ext}")
+    if os.path.exists(path):
+        return digest, path, False
+    os.makedirs(directory, exist_ok=True)
+    _write_atomic(path, data)
+    return digest, path, True
+
+
+class DatasetUploads:
+    """Persistent map from dataset content hash to an uploaded OpenAI file_id.
+
+    Byte-identical datasets are uploaded once. Files are created with a
+    matching ``expires_after``, so an entry is used only while the file
+    can still exist, and every ``revalidate_s`` a cached id is confirmed
+    with ``files.retrieve`` before reuse. ``files`` is anything with the
+    ``create``/``retrieve`` coroutines of ``client.files``; it defaults
+    to the shared client.
+    """
+
+    def __init__(
+        self,
+        files: Any = None,
+        path: str = CHART_UPLOAD_INDEX,
+        ttl_s: int = CHART_UPLOAD_TTL_S,
+        revalidate_s: float = CHART_UPLOAD_REVALIDATE_S,
+        max_entries: int = CHART_UPLOAD_MAX_ENTRIES,
+    ) -> None:
+        self._files = files
+        self.path = path
+        self.ttl_s = ttl_s
+        self.revalidate_s = revalidate_s
+        self.max_entries = max_entries
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.uploads = 0
+        self.revalidations = 0
+        self.invalidations = 0
+
+    @property
+    def files(self) -> Any:
+        if self._files is None:
+            from app.core.openai_client import client
+
+            self._files = client.files
+        return self._files
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as fh:
+                    self._entries = json.load(fh)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self) -> None:
+        entries = self._load()
+        now = time.time()
+        for digest in [d for d, e in entries.items() if now - e["uploaded_at"] >= self.ttl_s]:
+            del entries[digest]
+        if len(entries) > self.max_entries:
+            for digest in sorted(entries, key=lambda d: entries[d]["uploaded_at"])[: len(entries) - self.max_entries]:
+                del entries[digest]
+        _write_atomic(self.path, json.dumps(entries).encode("utf-8"))
+
+    async def _valid(self, digest: str, entry: Dict[str, Any]) -> bool:
+        now = time.time()
+        # Leave a margin so a file is never handed out just before it expires
+        if now - entry["uploaded_at"] >= self.ttl_s - min(self.revalidate_s, self.ttl_s / 2):
+            return False
+        if now - entry["checked_at"] < self.revalidate_s:
+            return True
+        self.revalidations += 1
+        try:
+            await self.files.retrieve(entry["file_id"])
+        except Exception as e:
+            logger.info("dataset %s: cached file %s failed revalidation (%s)", digest[:12], entry["file_id"], e)
+            return False
+        entry["checked_at"] = now
+        self._save()
+        return True
+
+    async def file_id(self, data: bytes, ext: str = "csv") -> Tuple[str, bool]:
+        """(file_id, reused) for ``data``, uploading it only if no live copy exists"""
+        digest = content_hash(data)
+        task = self._inflight.get(digest)
+        if task is not None:
+            file_id, _ = await asyncio.shield(task)
+            return file_id, True
+        # Detached, so a disconnecting leader does not fail its followers
+        task = self._inflight[digest] = asyncio.ensure_future(self._resolve(digest, data, ext))
+        task.add_done_callback(lambda t: self._done(digest, t))
+        return await asyncio.shield(task)
+
+    def _done(self, digest: str, task: asyncio.Task) -> None:
+        self._inflight.pop(digest, None)
+        if not task.cancelled():
+            task.exception()
+
+    async def _resolve(self, digest: str, data: bytes, ext: str) -> Tuple[str, bool]:
+        entries = self._load()
+        entry = entries.get(digest)
+        if entry is not None:
+            if await self._valid(digest, entry):
+                self.hits += 1
+                return entry["file_id"], True
+            self.invalidations += 1
+            entries.pop(digest, None)
+
+        filename = f"data_{digest[:16]}.{ext}"
+        uploaded = await self.files.create(
+            file=(filename, data, _CONTENT_TYPES.get(ext, "text/plain")),
+            purpose="user_data",
+            expires_after={"anchor": "created_at", "seconds": self.ttl_s},
+        )
+        self.uploads += 1
+        now = time.time()
+        entries[digest] = {
+            "file_id": uploaded.id,
+            "filename": filename,
+            "bytes": len(data),
+            "uploaded_at": now,
+            "checked_at": now,
+        }
+        self._save()
+        return uploaded.id, False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._load()),
+            "hits": self.hits,
+            "uploads": self.uploads,
+            "revalidations": self.revalidations,
+            "invalidations": self.invalidations,
+        }
+
+
+dataset_uploads = DatasetUploads()
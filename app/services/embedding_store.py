@@ -0,0 +1,222 @@
+# app/services/embedding_store.py
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import os
+import threading
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-writer only
+    fcntl = None
+
+STORE_DIR = os.getenv("RAG_INDEX_DIR", ".rag_index")
+_MIN_SLOTS = 1024
+_MAX_LOAD = 0.5
+
+
+def text_key(text: str) -> int:
+    """64-bit content key (never 0: 0 marks an empty table slot)"""
+    digest = hashlib.sha1(text.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little", signed=True) | 1
+
+
+class EmbeddingStore:
+    """Append-only on-disk embedding matrix keyed by content hash.
+
+    ``<name>.f32`` holds raw float32 rows and ``<name>.tbl`` an
+    open-addressing hash table of ``(key, row + 1)`` int64 pairs. Both are
+    opened with ``np.memmap`` so a cold start maps the files instead of
+    parsing them, and uvicorn workers on the same host share the pages
+    through the OS page cache. Writers serialize on an ``flock``; readers
+    remap when the files grow or the table is rebuilt.
+    """
+
+    def __init__(self, name: str, dim: int, directory: str = STORE_DIR) -> None:
+        self.dim = dim
+        self.row_bytes = dim * 4
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"{name}-{dim}")
+        self.data_path = f"{base}.f32"
+        self.table_path = f"{base}.tbl"
+        self.lock_path = f"{base}.lock"
+        self._vectors: Optional[np.memmap] = None
+        self._table: Optional[np.memmap] = None
+        self._table_stat: Tuple[int, int] = (0, 0)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # ---- mapping ----
+
+    def _refresh(self) -> None:
+        try:
+            st = os.stat(self.table_path)
+            table_stat = (st.st_ino, st.st_size)
+        except FileNotFoundError:
+            table_stat = (0, 0)
+        if table_stat != self._table_stat:
+            self._table = (
+                np.memmap(self.table_path, dtype=np.int64, mode="r").reshape(-1, 2)
+                if table_stat[1] else None
+            )
+            self._table_stat = table_stat
+
+        try:
+            rows = os.path.getsize(self.data_path) // self.row_bytes
+        except FileNotFoundError:
+            rows = 0
+        if rows and (self._vectors is None or self._vectors.shape[0] != rows):
+            self._vectors = np.memmap(self.data_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return 0 if self._vectors is None else self._vectors.shape[0]
+
+    @staticmethod
+    def _probe(table: np.ndarray, keys: np.ndarray) -> np.ndarray:
+        """Vectorized linear probing; returns row per key or -1"""
+        rows = np.full(keys.shape[0], -1, dtype=np.int64)
+        if table is None or not keys.shape[0]:
+            return rows
+        mask = table.shape[0] - 1
+        slots = keys.view(np.uint64) & np.uint64(mask)
+        active = np.arange(keys.shape[0])
+        for _ in range(table.shape[0]):
+            entries = table[slots[active].astype(np.int64)]
+            found = entries[:, 0] == keys[active]
+            rows[active[found]] = entries[found, 1] - 1
+            active = active[~found & (entries[:, 0] != 0)]
+            if not active.shape[0]:
+                break
+            slots[active] = (slots[active] + np.uint64(1)) & np.uint64(mask)
+        return rows
+
+    # ---- reads ----
+
+    def get(self, texts: Sequence[str]) -> Tuple[np.ndarray, List[int]]:
+        """Stored vectors for ``texts`` (zeros where missing) and missing positions"""
+        keys = np.fromiter((text_key(t) for t in texts), dtype=np.int64, count=len(texts))
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        with self._lock:
+            self._refresh()
+            rows = self._probe(self._table, keys)
+            if self._vectors is not None:
+                rows[rows >= self._vectors.shape[0]] = -1
+            present = rows >= 0
+            if present.any():
+                out[present] = self._vectors[rows[present]]
+            missing = np.flatnonzero(~present).tolist()
+            self.hits += int(present.sum())
+            self.misses += len(missing)
+        return out, missing
+
+    # ---- writes ----
+
+    @contextlib.contextmanager
+    def _writer(self) -> Iterator[None]:
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def put(self, texts: Sequence[str], vectors: np.ndarray) -> int:
+        """Append vectors for texts not stored yet. Returns rows written"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._writer():
+            self._refresh()
+            keys = np.fromiter((text_key(t) for t in texts), dtype=np.int64, count=len(texts))
+            _, first = np.unique(keys, return_index=True)
+            first.sort()
+            fresh = first[self._probe(self._table, keys[first]) < 0]
+            if not fresh.shape[0]:
+                return 0
+
+            # Drop a torn row left by a crashed writer before appending
+            size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+            start_row = size // self.row_bytes
+            with open(self.data_path, "ab") as fh:
+                if size % self.row_bytes:
+                    fh.truncate(start_row * self.row_bytes)
+                fh.write(vectors[fresh].tobytes())
+                fh.flush()
+
+            new_keys = keys[fresh]
+            new_rows = np.arange(start_row, start_row + fresh.shape[0], dtype=np.int64)
+            slots = 0 if self._table is None else self._table.shape[0]
+            if (start_row + fresh.shape[0]) > slots * _MAX_LOAD:
+                self._rebuild_table(new_keys, new_rows)
+            else:
+                self._insert(new_keys, new_rows)
+            self._refresh()
+            return int(fresh.shape[0])
+
+    def _insert(self, keys: np.ndarray, rows: np.ndarray) -> None:
+        mask = self._table.shape[0] - 1
+        with open(self.table_path, "r+b") as fh:
+            for key, row in zip(keys.tolist(), rows.tolist()):
+                slot = (key & 0xFFFFFFFFFFFFFFFF) & mask
+                while self._table[slot, 0] != 0:
+                    slot = (slot + 1) & mask
+                # pwrite goes through the page cache, so mapped readers see it
+                os.pwrite(fh.fileno(), np.array([key, row + 1], dtype=np.int64).tobytes(), slot * 16)
+
+    @staticmethod
+    def _build_table(keys: np.ndarray, rows: np.ndarray, slots: int) -> np.ndarray:
+        """Vectorized linear-probing insert of every key.
+
+        Each round, the first pending key on each free slot takes it and
+        the rest move one slot on; every key still lands on the first free
+        slot after its home, which is all ``_probe`` relies on.
+        """
+        table = np.zeros((slots, 2), dtype=np.int64)
+        mask = np.uint64(slots - 1)
+        position = (np.ascontiguousarray(keys, dtype=np.int64).view(np.uint64) & mask).astype(np.int64)
+        pending = np.arange(keys.shape[0])
+        while pending.shape[0]:
+            slot = position[pending]
+            free = table[slot, 0] == 0
+            _, first = np.unique(slot[free], return_index=True)
+            winners = pending[free][first]
+            table[position[winners], 0] = keys[winners]
+            table[position[winners], 1] = rows[winners] + 1
+            placed = np.zeros(keys.shape[0], dtype=bool)
+            placed[winners] = True
+            # Every slot a loser stands on is now taken
+            pending = pending[~placed[pending]]
+            position[pending] = (position[pending] + 1) & (slots - 1)
+        return table
+
+    def _rebuild_table(self, keys: np.ndarray, rows: np.ndarray) -> None:
+        if self._table is not None:
+            used = self._table[self._table[:, 0] != 0]
+            keys = np.concatenate([used[:, 0], keys])
+            rows = np.concatenate([used[:, 1] - 1, rows])
+        slots = _MIN_SLOTS
+        while keys.shape[0] > slots * _MAX_LOAD:
+            slots *= 2
+        table = self._build_table(keys, rows, slots)
+        tmp = f"{self.table_path}.tmp"
+        table.tofile(tmp)
+        # New inode: other workers notice and remap
+        os.replace(tmp, self.table_path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refresh()
+            return {
+                "rows": 0 if self._vectors is None else self._vectors.shape[0],
+                "table_slots": 0 if self._table is None else self._table.shape[0],
+                "data_bytes": 0 if self._vectors is None else self._vectors.shape[0] * self.row_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
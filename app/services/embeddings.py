@@ -0,0 +1,135 @@
+# app/services/embeddings.py
+from __future__ import annotations
+
+import abc
+import asyncio
+import os
+import re
+import zlib
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+EMBEDDER = os.getenv("RAG_EMBEDDER", "hash")
+EMBED_DIM = int(os.getenv("RAG_EMBED_DIM", "384"))
+OPENAI_EMBED_MODEL = os.getenv("RAG_OPENAI_EMBED_MODEL", "text-embedding-3-small")
+EMBED_STORE = os.getenv("RAG_EMBED_STORE", "1") in ("1", "true", "True")
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize rows in place so dot product == cosine similarity"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+class Embedder(abc.ABC):
+    """Base embedder: returns float32, L2-normalized rows"""
+
+    name: str = "base"
+    dim: int = 0
+
+    @abc.abstractmethod
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        ...
+
+
+class HashingEmbedder(Embedder):
+    """Deterministic feature-hashing embedder (offline, no model download).
+
+    Unigrams and bigrams are hashed with crc32 (stable across processes,
+    unlike ``hash()``) into ``dim`` signed buckets.
+    """
+
+    name = "hash"
+
+    def __init__(self, dim: int = EMBED_DIM) -> None:
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        tokens = _TOKEN_RE.findall(text.lower())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = self._features(text or "")
+            if not features:
+                continue
+            hashes = np.fromiter(
+                (zlib.crc32(f.encode("utf-8")) for f in features),
+                dtype=np.uint32,
+                count=len(features),
+            )
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(out[row], hashes % self.dim, signs)
+        return normalize_rows(out)
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        # Pure-Python hashing per feature; big ingest batches would stall the loop
+        return await asyncio.to_thread(self.encode, texts)
+
+
+class OpenAIEmbedder(Embedder):
+    """Embeddings via the shared AsyncOpenAI client"""
+
+    name = "openai"
+
+    def __init__(self, model: str = OPENAI_EMBED_MODEL, dim: int = EMBED_DIM) -> None:
+        self.model = model
+        self.dim = dim
+        self.name = f"openai-{model}"
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        from app.core.openai_client import client
+
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        response = await client.embeddings.create(
+            model=self.model,
+            input=list(texts),
+            dimensions=self.dim,
+        )
+        rows = [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+        return normalize_rows(np.asarray(rows, dtype=np.float32))
+
+
+class CachedEmbedder(Embedder):
+    """Read-through cache over the on-disk embedding store"""
+
+    def __init__(self, inner: Embedder) -> None:
+        from app.services.embedding_store import EmbeddingStore
+
+        self.inner = inner
+        self.name = inner.name
+        self.dim = inner.dim
+        self.store = EmbeddingStore(f"emb-{inner.name}", inner.dim)
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        # Store IO, flock waits and table rebuilds stay off the event loop
+        vectors, missing = await asyncio.to_thread(self.store.get, texts)
+        if missing:
+            fresh = await self.inner.embed([texts[i] for i in missing])
+            vectors[missing] = fresh
+            await asyncio.to_thread(self.store.put, [texts[i] for i in missing], fresh)
+        return vectors
+
+
+_EMBEDDER: Optional[Embedder] = None
+
+
+def get_embedder() -> Embedder:
+    global _EMBEDDER
+    if _EMBEDDER is None:
+        inner = OpenAIEmbedder() if EMBEDDER == "openai" else HashingEmbedder()
+        _EMBEDDER = CachedEmbedder(inner) if EMBED_STORE else inner
+    return _EMBEDDER
+
+
+def set_embedder(embedder: Embedder) -> None:
+    """Swap the process-wide embedder (e.g. a custom model)"""
+    global _EMBEDDER
+    _EMBEDDER = embedder
@@ -0,0 +1,245 @@
+# app/services/history_writer.py
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+# DATABASE_URL usually comes from .env; read it before deciding on persistence
+load_dotenv()
+
+# Opt-in: defaults to on only when a database was configured explicitly
+HISTORY_PERSIST = os.getenv("HISTORY_PERSIST", "1" if os.getenv("DATABASE_URL") else "0") in ("1", "true", "True")
+HISTORY_FLUSH_INTERVAL_S = float(os.getenv("HISTORY_FLUSH_INTERVAL_S", "1.0"))
+HISTORY_FLUSH_BATCH = int(os.getenv("HISTORY_FLUSH_BATCH", "500"))
+# Oldest pending entries are dropped beyond this (e.g. while the DB is down)
+HISTORY_WRITE_QUEUE_MAX = int(os.getenv("HISTORY_WRITE_QUEUE_MAX", "20000"))
+HISTORY_DRAIN_TIMEOUT_S = float(os.getenv("HISTORY_DRAIN_TIMEOUT_S", "10"))
+_MAX_BACKOFF_S = 30.0
+
+
+def db_id(value: str) -> str:
+    """Response ids are longer than the String(32) keys; map them to md5 hex"""
+    return hashlib.md5(value.encode("utf-8")).hexdigest()
+
+
+def dialect_insert(dialect: str):
+    """insert() with ON CONFLICT support for the engine's dialect"""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"history persistence does not support {dialect}")
+    return insert
+
+
+def _as_datetime(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+
+def _rows(entries: List[Any]) -> tuple:
+    threads: Dict[str, Dict[str, Any]] = {}
+    messages: List[Dict[str, Any]] = []
+    for entry in entries:
+        thread_id = db_id(entry.thread_id)
+        created = _as_datetime(entry.created_at)
+        thread = threads.get(thread_id)
+        if thread is None:
+            title = (entry.user_text or entry.assistant_text or "Untitled")[:255]
+            threads[thread_id] = {
+                "id": thread_id,
+                "title": title,
+                "created_at": created,
+                "updated_at": created,
+                # A thread headed by a fork continues in its parent's thread
+                "meta": {
+                    "head_response_id": entry.thread_id,
+                    "parent_response_id": entry.previous_response_id if entry.seq == 0 else None,
+                },
+            }
+        else:
+            thread["updated_at"] = max(thread["updated_at"], created)
+        meta = {"response_id": entry.response_id, "previous_response_id": entry.previous_response_id}
+        if entry.user_text:
+            messages.append({
+                "id": db_id(f"{entry.response_id}_user"),
+                "thread_id": thread_id,
+                "role": "user",
+                "content": entry.user_text,
+                "created_at": created,
+                "model": None,
+                "meta": meta,
+            })
+        if entry.assistant_text:
+            messages.append({
+                "id": db_id(entry.response_id),
+                "thread_id": thread_id,
+                "role": "assistant",
+                "content": entry.assistant_text,
+                "created_at": created,
+                "model": entry.model,
+                "meta": {**meta, **(entry.metadata or {})},
+            })
+    return list(threads.values()), messages
+
+
+class HistoryWriter:
+    """Write-behind queue from the in-memory history into threads/messages.
+
+    ``enqueue`` is synchronous and never touches the database; a background
+    task flushes every ``interval`` seconds or as soon as ``batch_size``
+    entries are pending, with one multi-row upsert per table per batch.
+    Ids are derived from response ids, so re-saving an exchange (e.g. when
+    a thread is re-hydrated) is a no-op on the database side.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = HISTORY_PERSIST,
+        interval: float = HISTORY_FLUSH_INTERVAL_S,
+        batch_size: int = HISTORY_FLUSH_BATCH,
+        max_pending: int = HISTORY_WRITE_QUEUE_MAX,
+    ) -> None:
+        self.enabled = enabled
+        self.interval = interval
+        self.batch_size = batch_size
+        self._pending: Deque[Any] = deque(maxlen=max_pending)
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._engine = None
+        self._closing = False
+        self.flushed_entries = 0
+        self.flushed_rows = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+        self.last_flush_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    def enqueue(self, entry: Any) -> None:
+        if not self.enabled or self._closing:
+            return
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._pending.append(entry)
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def enqueue_many(self, entries: List[Any]) -> None:
+        for entry in entries:
+            self.enqueue(entry)
+
+    async def _run(self) -> None:
+        backoff = self.interval
+        while self._pending and not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), backoff)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._closing:
+                return
+            try:
+                while self._pending:
+                    await self._flush_batch()
+                backoff = self.interval
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                backoff = min(_MAX_BACKOFF_S, backoff * 2)
+                logger.warning("history flush failed (%d pending, retry in %.1fs): %s", len(self._pending), backoff, e)
+
+    def _get_engine(self):
+        if self._engine is None:
+            # Imported lazily so a missing DB driver only disables persistence
+            from app.db.session import engine
+
+            self._engine = engine
+        return self._engine
+
+    async def _flush_batch(self) -> None:
+        batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+        threads, messages = _rows(batch)
+        started = time.perf_counter()
+        try:
+            engine = self._get_engine()
+            async with engine.begin() as conn:
+                if threads:
+                    await conn.execute(self._upsert_threads(engine.dialect.name), threads)
+                if messages:
+                    await conn.execute(self._insert_messages(engine.dialect.name), messages)
+        except BaseException:
+            # Put the batch back in front, minus whatever no longer fits
+            room = self._pending.maxlen - len(self._pending)
+            self.dropped += max(0, len(batch) - room)
+            self._pending.extendleft(reversed(batch[:room]))
+            raise
+        self.batches += 1
+        self.flushed_entries += len(batch)
+        self.flushed_rows += len(threads) + len(messages)
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+        self.last_error = None
+
+    def _upsert_threads(self, dialect: str):
+        from app.db.models import Thread
+
+        stmt = dialect_insert(dialect)(Thread.__table__)
+        return stmt.on_conflict_do_update(
+            index_elements=["id"], set_={"updated_at": stmt.excluded.updated_at}
+        )
+
+    def _insert_messages(self, dialect: str):
+        from app.db.models import Message
+
+        return dialect_insert(dialect)(Message.__table__).on_conflict_do_nothing(index_elements=["id"])
+
+    async def drain(self, timeout: float = HISTORY_DRAIN_TIMEOUT_S) -> None:
+        """Flush everything pending; called on shutdown"""
+        self._closing = True
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if not self._pending:
+            return
+        try:
+            await asyncio.wait_for(self._drain_all(), timeout)
+        except Exception as e:
+            logger.error("history drain lost %d entries: %s", len(self._pending), e)
+
+    async def _drain_all(self) -> None:
+        while self._pending:
+            await self._flush_batch()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "flush_interval_s": self.interval,
+            "batch_size": self.batch_size,
+            "batches": self.batches,
+            "flushed_entries": self.flushed_entries,
+            "flushed_rows": self.flushed_rows,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "last_error": self.last_error,
+        }
+
+
+history_writer = HistoryWriter()
@@ -0,0 +1,302 @@
+# app/services/ingestion.py
+from __future__ import annotations
+
+import asyncio
+import fnmatch
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.retrieval import add_chunks, chunk_id, get_index
+
+logger = logging.getLogger(__name__)
+
+STORAGE_DIR = "storage"
+INDEX_DIR = os.getenv("RAG_INDEX_DIR", ".rag_index")
+INGEST_GLOBS = os.getenv("RAG_INGEST_GLOBS", "data_*.txt,data_*.csv,data_*.pdf,data_*.json,report_*.md").split(",")
+INGEST_WORKERS = int(os.getenv("RAG_INGEST_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+EMBED_BATCH = int(os.getenv("RAG_EMBED_BATCH", "128"))
+CHUNK_WORDS = int(os.getenv("RAG_CHUNK_WORDS", "200"))
+CHUNK_OVERLAP = int(os.getenv("RAG_CHUNK_OVERLAP", "40"))
+
+MANIFEST_VERSION = 1
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_LOCK = asyncio.Lock()
+_LOADED = False
+
+
+# ---- worker side (runs in the process pool) ----
+
+def _extract_text(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pdf":
+        from pypdf import PdfReader
+
+        reader = PdfReader(path)
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+    with open(path, "r", encoding="utf-8", errors="replace") as fh:
+        raw = fh.read()
+    if ext != ".json":
+        return raw
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError:
+        return raw
+    if isinstance(data, list) and all(isinstance(row, dict) for row in data):
+        # records -> one "key: value" line per row keeps rows together in chunks
+        return "\n".join(", ".join(f"{k}: {v}" for k, v in row.items()) for row in data)
+    return json.dumps(data, ensure_ascii=False, indent=1)
+
+
+def chunk_text(text: str, size: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    words = re.findall(r"\S+", text)
+    if not words:
+        return []
+    step = max(1, size - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + size]))
+        if start + size >= len(words):
+            break
+    return chunks
+
+
+def _process_file(path: str) -> Dict[str, Any]:
+    """Hash, extract and chunk one file"""
+    with open(path, "rb") as fh:
+        digest = hashlib.sha1(fh.read()).hexdigest()
+    try:
+        chunks = chunk_text(_extract_text(path))
+        error = None
+    except Exception as e:
+        chunks, error = [], str(e)
+    return {"path": path, "sha1": digest, "chunks": chunks, "error": error}
+
+
+def _hash_file(path: str) -> str:
+    with open(path, "rb") as fh:
+        return hashlib.sha1(fh.read()).hexdigest()
+
+
+# ---- manifest / chunk store ----
+
+def _manifest_path() -> str:
+    return os.path.join(INDEX_DIR, "manifest.json")
+
+
+def _chunks_path() -> str:
+    return os.path.join(INDEX_DIR, "chunks.jsonl")
+
+
+def _load_manifest() -> Dict[str, Any]:
+    try:
+        with open(_manifest_path(), "r", encoding="utf-8") as fh:
+            manifest = json.load(fh)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    except (OSError, json.JSONDecodeError):
+        pass
+    return {"version": MANIFEST_VERSION, "files": {}}
+
+
+def _write_json_atomic(path: str, data: Any) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _load_chunk_store() -> Dict[str, Dict[str, Any]]:
+    store: Dict[str, Dict[str, Any]] = {}
+    try:
+        with open(_chunks_path(), "r", encoding="utf-8") as fh:
+            for line in fh:
+                if line.strip():
+                    rec = json.loads(line)
+                    store[rec["id"]] = rec
+    except OSError:
+        pass
+    return store
+
+
+def _load_state() -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    return _load_manifest(), _load_chunk_store()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        # spawn: never fork a process that owns a running event loop
+        _POOL = ProcessPoolExecutor(
+            max_workers=INGEST_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _POOL
+
+
+def shutdown_pool() -> None:
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
+
+
+async def _index_chunks(records: List[Dict[str, Any]]) -> int:
+    added = 0
+    for start in range(0, len(records), EMBED_BATCH):
+        batch = records[start:start + EMBED_BATCH]
+        added += await add_chunks(
+            [r["text"] for r in batch],
+            [{"source": r["source"]} for r in batch],
+        )
+    return added
+
+
+async def _restore_index(manifest: Dict[str, Any], store: Dict[str, Dict[str, Any]]) -> None:
+    """Re-populate the in-process index from the chunk store after a restart.
+
+    Re-embedding and indexing run in threads (see ``add_chunks``), so a
+    large store does not stall the loop at startup.
+    """
+    live = {cid for entry in manifest["files"].values() for cid in entry["chunks"]}
+    await _index_chunks([store[cid] for cid in live if cid in store])
+
+
+async def restore_index() -> int:
+    """Load the persisted chunk store into this process's index, once.
+
+    Runs at startup so retrieval works after a restart and in workers
+    that never serve ``/ingest``. Returns the index size.
+    """
+    global _LOADED
+    async with _LOCK:
+        if not _LOADED:
+            manifest, store = await asyncio.to_thread(_load_state)
+            await _restore_index(manifest, store)
+            _LOADED = True
+        return len(get_index())
+
+
+def _scan(directory: str) -> Dict[str, os.stat_result]:
+    found = {}
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.is_file() and any(fnmatch.fnmatch(entry.name, g.strip()) for g in INGEST_GLOBS):
+                found[entry.name] = entry.stat()
+    return found
+
+
+async def ingest_directory(directory: str = STORAGE_DIR, force: bool = False) -> Dict[str, Any]:
+    """Incrementally index ``directory``.
+
+    A file is only re-read when its (mtime, size) changed, and only
+    re-chunked and re-embedded when its content hash changed too, so the
+    cost of a run is proportional to the delta since the last one.
+    """
+    global _LOADED
+    async with _LOCK:
+        started = time.perf_counter()
+        os.makedirs(INDEX_DIR, exist_ok=True)
+        manifest, store = await asyncio.to_thread(_load_state)
+        files: Dict[str, Dict[str, Any]] = manifest["files"]
+        if not _LOADED:
+            await _restore_index(manifest, store)
+            _LOADED = True
+
+        loop = asyncio.get_running_loop()
+        pool = _get_pool()
+        stats = {
+            "files_scanned": 0, "files_unchanged": 0, "files_touched": 0,
+            "files_indexed": 0, "files_removed": 0, "files_failed": 0,
+            "chunks_new": 0, "chunks_deduped": 0, "chunks_removed": 0,
+        }
+
+        found = _scan(directory)
+        stats["files_scanned"] = len(found)
+
+        # mtime/size changed -> hash in the pool to tell touched from edited
+        candidates = [
+            name for name, st in found.items()
+            if force or name not in files
+            or files[name]["mtime_ns"] != st.st_mtime_ns or files[name]["size"] != st.st_size
+        ]
+        stats["files_unchanged"] = len(found) - len(candidates)
+        hashes = await asyncio.gather(*[
+            loop.run_in_executor(pool, _hash_file, os.path.join(directory, name))
+            for name in candidates
+            if name in files and not force
+        ])
+        hashed = dict(zip([n for n in candidates if n in files and not force], hashes))
+
+        to_process = []
+        for name in candidates:
+            if name in hashed and hashed[name] == files[name]["sha1"]:
+                files[name]["mtime_ns"] = found[name].st_mtime_ns
+                stats["files_touched"] += 1
+            else:
+                to_process.append(name)
+
+        results = await asyncio.gather(*[
+            loop.run_in_executor(pool, _process_file, os.path.join(directory, name))
+            for name in to_process
+        ])
+
+        new_records: List[Dict[str, Any]] = []
+        seen = set()
+        for name, result in zip(to_process, results):
+            if result["error"]:
+                stats["files_failed"] += 1
+                logger.warning("ingest: failed to extract %s: %s", name, result["error"])
+                # No manifest entry, so the next run retries it even if unchanged
+                continue
+            ids = []
+            for text in result["chunks"]:
+                cid = chunk_id(text)
+                ids.append(cid)
+                if cid in store or cid in seen:
+                    stats["chunks_deduped"] += 1
+                    continue
+                seen.add(cid)
+                new_records.append({"id": cid, "text": text, "source": name})
+            files[name] = {
+                "mtime_ns": found[name].st_mtime_ns,
+                "size": found[name].st_size,
+                "sha1": result["sha1"],
+                "chunks": ids,
+            }
+            stats["files_indexed"] += 1
+
+        for name in [n for n in files if n not in found]:
+            del files[name]
+            stats["files_removed"] += 1
+
+        if new_records:
+            with open(_chunks_path(), "a", encoding="utf-8") as fh:
+                for rec in new_records:
+                    fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                    store[rec["id"]] = rec
+            stats["chunks_new"] = await _index_chunks(new_records)
+
+        live = {cid for entry in files.values() for cid in entry["chunks"]}
+        dead = [cid for cid in store if cid not in live]
+        if dead:
+            stats["chunks_removed"] = get_index().remove(dead)
+            tmp = f"{_chunks_path()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                for cid, rec in store.items():
+                    if cid in live:
+                        fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            os.replace(tmp, _chunks_path())
+
+        _write_json_atomic(_manifest_path(), manifest)
+        stats["index_size"] = len(get_index())
+        stats["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return stats
@@ -0,0 +1,197 @@
+# app/services/json_stream.py
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, List, Optional, Tuple, Union
+
+Path = Tuple[Union[str, int], ...]
+
+_NUMBER_RE = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_NUMBER_CHARS_RE = re.compile(r"[-+.eE0-9]*")
+_LITERALS = {"true": True, "false": False, "null": None}
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONParser:
+    """Parse one JSON document fed in arbitrary chunks.
+
+    ``feed`` returns ``(path, value)`` for every value completed by the
+    chunk, innermost first, so a finished array item is reported before
+    the array that holds it. ``value`` is the partial document built so
+    far: containers are filled in as their members complete, which makes
+    it safe to render at any point. Each character is scanned once.
+    """
+
+    def __init__(self) -> None:
+        self.value: Any = None
+        self.done = False
+        self._buf = ""
+        self._pos = 0
+        # Offset to resume the closing-quote search of an unfinished string
+        self._resume = 0
+        # Open containers: (container, key of the member being parsed)
+        self._stack: List[List[Any]] = []
+        self._expect = "value"
+
+    def _path(self) -> Path:
+        return tuple(frame[1] for frame in self._stack)
+
+    def _error(self, message: str) -> ValueError:
+        return ValueError(f"{message} at offset {self._pos}")
+
+    def _complete(self, value: Any, events: List[Tuple[Path, Any]]) -> None:
+        if not self._stack:
+            self.value = value
+            self.done = True
+            events.append(((), value))
+            self._expect = "end"
+            return
+        frame = self._stack[-1]
+        container, key = frame
+        if isinstance(container, list):
+            container.append(value)
+        else:
+            container[key] = value
+        events.append((self._path(), value))
+        self._expect = "comma"
+
+    def _open(self, container: Any) -> None:
+        if self._stack:
+            parent, key = self._stack[-1]
+            if isinstance(parent, list):
+                parent.append(container)
+            else:
+                parent[key] = container
+        elif self.value is None:
+            self.value = container
+        self._stack.append([container, None if isinstance(container, dict) else 0])
+        self._expect = "key_or_close" if isinstance(container, dict) else "value_or_close"
+
+    def _close(self, events: List[Tuple[Path, Any]]) -> None:
+        container, _ = self._stack.pop()
+        if not self._stack:
+            self.done = True
+            self._expect = "end"
+            events.append(((), container))
+            return
+        events.append((self._path(), container))
+        self._expect = "comma"
+
+    def _string(self) -> Optional[str]:
+        """Decoded string at ``_pos`` or None if its closing quote is yet to come"""
+        buf = self._buf
+        i = max(self._pos + 1, self._resume)
+        while True:
+            i = buf.find('"', i)
+            if i < 0:
+                self._resume = len(buf)
+                return None
+            backslashes = 0
+            j = i - 1
+            while buf[j] == "\\":
+                backslashes += 1
+                j -= 1
+            if backslashes % 2 == 0:
+                break
+            i += 1
+        text = json.loads(buf[self._pos:i + 1])
+        self._pos = i + 1
+        self._resume = 0
+        return text
+
+    def _scalar(self, final: bool) -> Tuple[bool, Any]:
+        buf, pos = self._buf, self._pos
+        for word, value in _LITERALS.items():
+            if buf.startswith(word, pos):
+                self._pos += len(word)
+                return True, value
+            if word.startswith(buf[pos:pos + len(word)]) and len(buf) - pos < len(word) and not final:
+                return False, None
+        end = _NUMBER_CHARS_RE.match(buf, pos).end()
+        if end == len(buf) and not final:
+            # More of the number may follow in the next chunk
+            return False, None
+        text = buf[pos:end]
+        if not _NUMBER_RE.fullmatch(text):
+            raise self._error("unexpected character")
+        self._pos = end
+        return True, float(text) if any(c in text for c in ".eE") else int(text)
+
+    def feed(self, chunk: str, final: bool = False) -> List[Tuple[Path, Any]]:
+        events: List[Tuple[Path, Any]] = []
+        self._buf += chunk
+        buf = self._buf
+        while self._pos < len(buf):
+            ch = buf[self._pos]
+            if ch in _WHITESPACE:
+                self._pos += 1
+                continue
+            expect = self._expect
+            if expect == "end":
+                raise self._error("trailing data")
+            if expect == "comma":
+                container = self._stack[-1][0]
+                closer = "]" if isinstance(container, list) else "}"
+                if ch == ",":
+                    self._pos += 1
+                    if isinstance(container, list):
+                        self._stack[-1][1] = len(container)
+                        self._expect = "value"
+                    else:
+                        self._expect = "key"
+                elif ch == closer:
+                    self._pos += 1
+                    self._close(events)
+                else:
+                    raise self._error(f"expected ',' or '{closer}'")
+            elif expect in ("key", "key_or_close"):
+                if ch == "}" and expect == "key_or_close":
+                    self._pos += 1
+                    self._close(events)
+                elif ch == '"':
+                    key = self._string()
+                    if key is None:
+                        break
+                    self._stack[-1][1] = key
+                    self._expect = "colon"
+                else:
+                    raise self._error("expected object key")
+            elif expect == "colon":
+                if ch != ":":
+                    raise self._error("expected ':'")
+                self._pos += 1
+                self._expect = "value"
+            else:
+                if ch == "]" and expect == "value_or_close":
+                    self._pos += 1
+                    self._close(events)
+                elif ch == "{":
+                    self._pos += 1
+                    self._open({})
+                elif ch == "[":
+                    self._pos += 1
+                    self._open([])
+                elif ch == '"':
+                    text = self._string()
+                    if text is None:
+                        break
+                    self._complete(text, events)
+                else:
+                    ok, value = self._scalar(final)
+                    if not ok:
+                        break
+                    self._complete(value, events)
+        # Drop what has been consumed so the buffer only holds the open token
+        if self._pos:
+            if self._resume:
+                self._resume -= self._pos
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        if final and not self.done:
+            raise self._error("incomplete JSON document")
+        return events
+
+    def close(self) -> List[Tuple[Path, Any]]:
+        """Flush a trailing top-level number; raises if the document is incomplete"""
+        return self.feed("", final=True)
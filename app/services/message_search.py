@@ -0,0 +1,128 @@
+# app/services/message_search.py
+from __future__ import annotations
+
+import json
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+SEARCH_MAX_OFFSET = 1000
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+_SQLITE_QUERY = """
+SELECT m.id, m.thread_id, m.role, m.created_at, m.meta,
+       snippet(messages_fts, 0, '<b>', '</b>', '…', 16) AS snippet,
+       bm25(messages_fts) AS score
+FROM messages_fts
+JOIN messages m ON m.id = messages_fts.message_id
+WHERE messages_fts MATCH :query {filters}
+ORDER BY score
+LIMIT :limit OFFSET :offset
+"""
+
+# Headlines are computed for the returned page only, not every match
+_POSTGRES_QUERY = """
+SELECT hit.id, hit.thread_id, hit.role, hit.created_at, hit.meta,
+       ts_headline('simple', m.content, q,
+                   'StartSel=<b>, StopSel=</b>, MaxFragments=1, MaxWords=24, MinWords=8') AS snippet,
+       hit.score
+FROM (
+    SELECT id, thread_id, role, created_at, meta, ts_rank_cd(search, q) AS score
+    FROM messages, websearch_to_tsquery('simple', :query) q
+    WHERE search @@ q {filters}
+    ORDER BY score DESC
+    LIMIT :limit OFFSET :offset
+) hit
+JOIN messages m ON m.id = hit.id, websearch_to_tsquery('simple', :query) q
+ORDER BY hit.score DESC
+"""
+
+
+class SearchIndexMissing(RuntimeError):
+    """The database predates the full-text index (migration b4e8f2c91d07)"""
+
+
+def _index_missing(exc: Exception) -> bool:
+    # SQLite: no such table: messages_fts; Postgres: column "search" does not exist
+    message = str(getattr(exc, "orig", exc))
+    return "messages_fts" in message or '"search" does not exist' in message
+
+
+def fts5_query(raw: str) -> str:
+    """User text -> FTS5 query: every word must match, the last one as a prefix"""
+    terms = _TERM_RE.findall(raw)
+    if not terms:
+        return ""
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+async def search_messages(
+    q: str,
+    limit: int = 20,
+    offset: int = 0,
+    thread_id: Optional[str] = None,
+    role: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Ranked, paginated full-text search over persisted messages"""
+    from app.db.session import engine
+
+    dialect = engine.dialect.name
+    params: Dict[str, Any] = {"limit": limit + 1, "offset": offset}
+    filters = []
+    if thread_id:
+        filters.append("AND {p}thread_id = :thread_id")
+        params["thread_id"] = thread_id
+    if role:
+        filters.append("AND {p}role = :role")
+        params["role"] = role
+
+    if dialect == "sqlite":
+        params["query"] = fts5_query(q)
+        sql = _SQLITE_QUERY.format(filters=" ".join(f.format(p="m.") for f in filters))
+    elif dialect == "postgresql":
+        params["query"] = q
+        sql = _POSTGRES_QUERY.format(filters=" ".join(f.format(p="") for f in filters))
+    else:
+        raise RuntimeError(f"message search does not support {dialect}")
+    if not params["query"].strip():
+        return {"query": q, "results": [], "next_offset": None, "took_ms": 0.0}
+
+    started = time.perf_counter()
+    try:
+        async with engine.connect() as conn:
+            rows = (await conn.execute(text(sql), params)).all()
+    except (OperationalError, ProgrammingError) as e:
+        if _index_missing(e):
+            raise SearchIndexMissing(
+                "message search index is missing; run `alembic upgrade head` (revision b4e8f2c91d07)"
+            ) from e
+        raise
+    took_ms = (time.perf_counter() - started) * 1000
+
+    results: List[Dict[str, Any]] = []
+    for row in rows[:limit]:
+        meta = row.meta or {}
+        if isinstance(meta, str):
+            # Raw SQL bypasses the JSON column type
+            meta = json.loads(meta)
+        results.append({
+            "message_id": row.id,
+            "response_id": meta.get("response_id"),
+            "thread_id": row.thread_id,
+            "role": row.role,
+            "created_at": row.created_at,
+            "snippet": row.snippet,
+            # bm25() is lower-is-better; flip it so both backends sort descending
+            "score": round(-row.score if dialect == "sqlite" else row.score, 6),
+        })
+    return {
+        "query": q,
+        "results": results,
+        "next_offset": offset + limit if len(rows) > limit else None,
+        "took_ms": round(took_ms, 2),
+    }
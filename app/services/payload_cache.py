@@ -0,0 +1,86 @@
+# app/services/payload_cache.py
+from __future__ import annotations
+
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+THREAD_PAYLOAD_CACHE_MAX_ENTRIES = int(os.getenv("THREAD_PAYLOAD_CACHE_MAX_ENTRIES", "2048"))
+THREAD_PAYLOAD_CACHE_MAX_BYTES = int(os.getenv("THREAD_PAYLOAD_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Cache-Control max-age for complete thread pages; clients revalidate with the ETag after
+THREAD_CACHE_MAX_AGE_S = int(os.getenv("THREAD_CACHE_MAX_AGE_S", "30"))
+
+
+def strong_etag(*parts: Any) -> str:
+    raw = ":".join(str(p) for p in parts)
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (t.strip() for t in if_none_match.split(","))
+    return etag in (t[2:] if t.startswith("W/") else t for t in tags)
+
+
+class PayloadCache:
+    """LRU of serialized response bodies, tagged with a source generation.
+
+    An entry is only served while the generation it was built at is still
+    current, so invalidation is one integer bump upstream.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[int, str, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, generation: int) -> Optional[Tuple[str, bytes]]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != generation:
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def put(self, key: Hashable, generation: int, etag: str, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (generation, etag, body)
+        self._bytes += len(body)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key: Hashable) -> None:
+        _, _, body = self._entries.pop(key)
+        self._bytes -= len(body)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+        }
+
+
+thread_payloads = PayloadCache(THREAD_PAYLOAD_CACHE_MAX_ENTRIES, THREAD_PAYLOAD_CACHE_MAX_BYTES)
@@ -0,0 +1,155 @@
+# app/services/report_cache.py
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.services.response_cache import ResponseCache, cache_key
+
+REPORT_CACHE_ENABLED = os.getenv("REPORT_CACHE_ENABLED", "1") in ("1", "true", "True")
+REPORT_CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", "3600"))
+REPORT_CACHE_MAX_ENTRIES = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "512"))
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+REPORT_STORAGE_DIR = os.getenv("REPORT_STORAGE_DIR", "storage")
+# Bump when the markdown rendering changes so old entries stop matching
+REPORT_RENDER_VERSION = 1
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Queries that differ only in Unicode form or whitespace share a key"""
+    return _SPACE_RE.sub(" ", unicodedata.normalize("NFKC", query)).strip()
+
+
+def schema_version(schema: Dict[str, Any]) -> str:
+    raw = json.dumps(schema, sort_keys=True, separators=(",", ":"))
+    return f"{REPORT_RENDER_VERSION}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]}"
+
+
+def report_key(schema_id: str, schema: Dict[str, Any], query: str, model: str) -> str:
+    return cache_key(
+        schema_id=schema_id,
+        schema_version=schema_version(schema),
+        query=normalize_query(query),
+        model=model,
+    )
+
+
+def store_markdown(markdown: str, directory: str = REPORT_STORAGE_DIR) -> Tuple[str, str, bool]:
+    """Write markdown under its content hash; returns (digest, path, written).
+
+    Identical reports map to one file, which is only written if missing.
+    Writes go through a temp file and a rename, so readers never see a
+    partial report.
+    """
+    data = markdown.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    path = os.path.join(directory, f"report_{digest[:32]}.md")
+    if os.path.exists(path):
+        return digest, path, False
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".report_", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return digest, path, True
+
+
+@dataclass
+class CachedReport:
+    report: Dict[str, Any]
+    created_at: float = field(default_factory=time.time)
+    size: int = 0
+
+    def __post_init__(self) -> None:
+        if not self.size:
+            self.size = len(json.dumps(self.report, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+class ReportCache:
+    """TTL + LRU report cache with concurrent identical misses coalesced"""
+
+    def __init__(self) -> None:
+        self.entries = ResponseCache(
+            REPORT_CACHE_TTL, REPORT_CACHE_MAX_ENTRIES, REPORT_CACHE_MAX_BYTES, enabled=REPORT_CACHE_ENABLED
+        )
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+        self.files_written = 0
+        self.files_reused = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.entries.enabled:
+            return None
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if not os.path.exists(entry.report["filepath"]):
+            # Removed from disk behind our back; regenerate rather than point at nothing
+            self.entries.discard(key)
+            return None
+        return entry.report
+
+    async def get_or_create(self, key: str, create: Callable[[], Awaitable[Dict[str, Any]]]) -> Tuple[Dict[str, Any], bool]:
+        """(report, cached); ``create`` runs once per key however many ask at once"""
+        report = self.get(key)
+        if report is not None:
+            return report, True
+        task = self._inflight.get(key)
+        coalesced = task is not None
+        if task is None:
+            # Detached, so a disconnecting leader does not fail its followers
+            task = self._inflight[key] = asyncio.ensure_future(self._create(key, create))
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task), coalesced
+
+    async def _create(self, key: str, create: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        report = await create()
+        self.put(key, report)
+        return report
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            # Retrieved here so a failure nobody else awaited is not logged
+            task.exception()
+
+    def put(self, key: str, report: Dict[str, Any]) -> None:
+        if self.entries.enabled:
+            self.entries.put(key, CachedReport(report))
+
+    def store(self, markdown: str) -> Tuple[str, str]:
+        digest, path, written = store_markdown(markdown)
+        if written:
+            self.files_written += 1
+        else:
+            self.files_reused += 1
+        return digest, path
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.entries.stats(),
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+            "files_written": self.files_written,
+            "files_reused": self.files_reused,
+        }
+
+
+report_cache = ReportCache()
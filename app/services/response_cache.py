@@ -0,0 +1,105 @@
+# app/services/response_cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+CHAT_CACHE_ENABLED = os.getenv("CHAT_CACHE_ENABLED", "0") in ("1", "true", "True")
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "300"))
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "256"))
+CHAT_CACHE_MAX_BYTES = int(os.getenv("CHAT_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+# 0 replays at full speed; otherwise sleep this long between deltas
+CHAT_CACHE_REPLAY_DELAY_MS = float(os.getenv("CHAT_CACHE_REPLAY_DELAY_MS", "0"))
+
+
+@dataclass
+class CachedResponse:
+    deltas: List[str]
+    final_text: Optional[str]
+    response_id: Optional[str]
+    model: Optional[str]
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def size(self) -> int:
+        return sum(len(d.encode("utf-8")) for d in self.deltas) + len((self.final_text or "").encode("utf-8"))
+
+
+def cache_key(**fields: Any) -> str:
+    raw = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """TTL + LRU cache bounded by entry count and total bytes"""
+
+    def __init__(self, ttl: float, max_entries: int, max_bytes: int, enabled: bool = CHAT_CACHE_ENABLED) -> None:
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bypasses = 0
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if time.time() - entry.created_at > self.ttl:
+            self._drop(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, entry: CachedResponse) -> None:
+        if entry.size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def discard(self, key: str) -> bool:
+        """Remove ``key`` if present; returns whether it was"""
+        if key not in self._entries:
+            return False
+        self._drop(key)
+        return True
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "bypasses": self.bypasses,
+        }
+
+
+response_cache = ResponseCache(CHAT_CACHE_TTL, CHAT_CACHE_MAX_ENTRIES, CHAT_CACHE_MAX_BYTES)
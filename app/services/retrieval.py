@@ -0,0 +1,80 @@
+# app/services/retrieval.py
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.services.embeddings import get_embedder
+from app.services.vector_index import VectorIndex
+
+CONTEXT_HEADER = "Use the following retrieved context when it is relevant. Cite sources as [n]."
+
+_INDEX: Optional[VectorIndex] = None
+
+
+def get_index() -> VectorIndex:
+    global _INDEX
+    if _INDEX is None:
+        _INDEX = VectorIndex(get_embedder().dim)
+    return _INDEX
+
+
+def chunk_id(text: str) -> str:
+    """Content hash used as the chunk id (identical text is stored once)"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+async def add_chunks(texts: Sequence[str], metadata: Optional[Sequence[Dict[str, Any]]] = None) -> int:
+    """Embed and index chunks. Returns how many were new"""
+    index = get_index()
+    metadata = metadata or [{} for _ in texts]
+    ids = [chunk_id(t) for t in texts]
+    fresh = [i for i, cid in enumerate(ids) if cid not in index]
+    if not fresh:
+        return 0
+    vectors = await get_embedder().embed([texts[i] for i in fresh])
+    # add() may retrain the IVF partitions (k-means); keep that off the loop
+    return await asyncio.to_thread(
+        index.add,
+        [ids[i] for i in fresh],
+        vectors,
+        [texts[i] for i in fresh],
+        [metadata[i] for i in fresh],
+    )
+
+
+async def retrieve(
+    query: str,
+    k: int = 4,
+    filters: Optional[Dict[str, Any]] = None,
+    min_score: Optional[float] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """Top-k chunks for ``query`` plus embed/search timings in ms"""
+    index = get_index()
+    started = time.perf_counter()
+    query_vec = (await get_embedder().embed([query]))[0]
+    embedded = time.perf_counter()
+    # NumPy releases the GIL in matmul; keep large scans off the event loop
+    hits = await asyncio.to_thread(index.search, query_vec, k, filters or None)
+    searched = time.perf_counter()
+    if min_score is not None:
+        hits = [h for h in hits if h["score"] >= min_score]
+    timings = {
+        "embed_ms": round((embedded - started) * 1000, 3),
+        "search_ms": round((searched - embedded) * 1000, 3),
+        "total_ms": round((searched - started) * 1000, 3),
+    }
+    return hits, timings
+
+
+def build_instructions(base: str, hits: List[Dict[str, Any]]) -> str:
+    """Append retrieved chunks to the system instructions"""
+    if not hits:
+        return base
+    blocks = []
+    for n, hit in enumerate(hits, start=1):
+        source = hit["metadata"].get("source") or hit["id"][:8]
+        blocks.append(f"[{n}] ({source})\n{hit['text']}")
+    return f"{base}\n\n{CONTEXT_HEADER}\n\n" + "\n\n".join(blocks)
@@ -0,0 +1,77 @@
+# app/services/singleflight.py
+from __future__ import annotations
+
+import os
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from app.services.stream_registry import StreamBuffer, StreamRegistry, stream_registry
+
+# Opt-in: followers receive the leader's response_id and history chain
+CHAT_SINGLEFLIGHT = os.getenv("CHAT_SINGLEFLIGHT", "0") in ("1", "true", "True")
+# Requests are only coalesced with others carrying the same value of this header
+CHAT_SINGLEFLIGHT_SCOPE_HEADER = os.getenv("CHAT_SINGLEFLIGHT_SCOPE_HEADER", "x-user-id")
+
+
+class SingleFlight:
+    """Coalesce identical concurrent streams onto one upstream producer.
+
+    Producers live in the stream registry, so they are not tied to the
+    connection of whichever request happened to start them. Followers
+    read the same buffer from the first frame; once the ring has dropped
+    that frame a new request starts its own stream instead.
+    """
+
+    def __init__(self, registry: StreamRegistry) -> None:
+        self.registry = registry
+        self._inflight: Dict[str, str] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def attach(self, key: str) -> Optional[StreamBuffer]:
+        """In-flight stream for ``key`` that can still be followed from the start"""
+        stream_id = self._inflight.get(key)
+        buffer = self.registry.get(stream_id) if stream_id else None
+        if buffer is not None and not buffer.closed and buffer.first_seq == 0:
+            self.followers += 1
+            return buffer
+        return None
+
+    def join(
+        self,
+        key: str,
+        factory: Callable[[], AsyncIterator[Any]],
+        on_done: Optional[Callable[[], None]] = None,
+    ) -> Tuple[StreamBuffer, bool]:
+        """Follow or start the stream for ``key``; returns (buffer, started)"""
+        buffer = self.attach(key)
+        if buffer is not None:
+            return buffer, False
+
+        owner: Dict[str, str] = {}
+        buffer = self.registry.start(lambda: self._tracked(key, owner, factory()), on_done)
+        owner["stream_id"] = self._inflight[key] = buffer.stream_id
+        self.leaders += 1
+        return buffer, True
+
+    async def _tracked(self, key: str, owner: Dict[str, str], source: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        try:
+            async for frame in source:
+                yield frame
+        finally:
+            # A newer stream may own the key if this one's ring overflowed
+            if self._inflight.get(key) == owner.get("stream_id"):
+                del self._inflight[key]
+
+    def subscribe(self, key: str, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[bytes]:
+        return self.join(key, factory)[0].follow()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": CHAT_SINGLEFLIGHT,
+            "inflight": len(self._inflight),
+            "upstream_streams": self.leaders,
+            "coalesced_requests": self.followers,
+        }
+
+
+chat_flights = SingleFlight(stream_registry)
@@ -0,0 +1,246 @@
+# app/services/stream_registry.py
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional, Tuple, Union
+
+from app.core.sse import sse_event_bytes
+
+logger = logging.getLogger(__name__)
+
+# Per-stream replay ring and the cap across all streams held by this worker
+STREAM_BUFFER_MAX_BYTES = int(os.getenv("STREAM_BUFFER_MAX_BYTES", str(256 * 1024)))
+STREAM_REGISTRY_MAX_BYTES = int(os.getenv("STREAM_REGISTRY_MAX_BYTES", str(64 * 1024 * 1024)))
+# How long a finished stream stays resumable
+STREAM_RESUME_GRACE_S = float(os.getenv("STREAM_RESUME_GRACE_S", "120"))
+# How long a live stream may have no readers before its producer is cancelled
+STREAM_ABANDON_GRACE_S = float(os.getenv("STREAM_ABANDON_GRACE_S", "3"))
+
+
+def parse_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """'<stream_id>-<seq>' -> (stream_id, seq)"""
+    if not value:
+        return None
+    stream_id, _, seq = value.strip().rpartition("-")
+    if not stream_id or not seq.isdigit():
+        return None
+    return stream_id, int(seq)
+
+
+class StreamBuffer:
+    """Ring buffer of SSE frames for one stream, followed by any number of readers.
+
+    Frames are numbered from 0 and sent with an ``id: <stream_id>-<seq>``
+    line, so a client can reconnect with ``Last-Event-ID`` and continue
+    after the last frame it saw. Oldest frames are dropped once the ring
+    exceeds ``max_bytes``; a reader whose resume point was dropped gets a
+    ``resume_gap`` error frame and continues from the oldest retained one.
+    """
+
+    def __init__(self, stream_id: str, max_bytes: int = STREAM_BUFFER_MAX_BYTES) -> None:
+        self.stream_id = stream_id
+        self.max_bytes = max_bytes
+        self.frames: Deque[bytes] = deque()
+        self.first_seq = 0
+        self.next_seq = 0
+        self.bytes = 0
+        self.closed = False
+        self.finished_at: Optional[float] = None
+        self.subscribers = 0
+        self.started_at = time.monotonic()
+        self.on_idle: Optional[Callable[["StreamBuffer"], None]] = None
+        self._id_prefix = f"id: {stream_id}-".encode("ascii")
+        self._changed = asyncio.Event()
+
+    def publish(self, frame: Union[bytes, str]) -> int:
+        """Append a frame; returns the change in buffered bytes"""
+        if isinstance(frame, str):
+            frame = frame.encode("utf-8")
+        self.frames.append(frame)
+        self.next_seq += 1
+        before = self.bytes
+        self.bytes += len(frame)
+        self.trim(self.max_bytes)
+        self._wake()
+        return self.bytes - before
+
+    def trim(self, max_bytes: int) -> int:
+        """Drop oldest frames (keeping the newest) until under ``max_bytes``"""
+        freed = 0
+        while self.bytes > max_bytes and len(self.frames) > 1:
+            size = len(self.frames.popleft())
+            self.bytes -= size
+            freed += size
+            self.first_seq += 1
+        return freed
+
+    def close(self) -> None:
+        self.closed = True
+        self.finished_at = time.monotonic()
+        self._wake()
+
+    def _wake(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _framed(self, seq: int) -> bytes:
+        return self._id_prefix + str(seq).encode("ascii") + b"\n" + self.frames[seq - self.first_seq]
+
+    async def follow(self, after_seq: int = -1) -> AsyncIterator[bytes]:
+        self.subscribers += 1
+        try:
+            pos = after_seq + 1
+            while True:
+                changed = self._changed
+                while pos < self.next_seq:
+                    if pos < self.first_seq:
+                        yield sse_event_bytes({
+                            "type": "error",
+                            "code": "resume_gap",
+                            "message": f"events {pos}..{self.first_seq - 1} are no longer buffered",
+                        })
+                        pos = self.first_seq
+                    yield self._framed(pos)
+                    pos += 1
+                if self.closed:
+                    return
+                await changed.wait()
+        finally:
+            self.subscribers -= 1
+            if not self.subscribers and not self.closed and self.on_idle is not None:
+                self.on_idle(self)
+
+
+class StreamRegistry:
+    """Live and recently finished streams, addressable by id"""
+
+    def __init__(
+        self,
+        max_bytes: int = STREAM_REGISTRY_MAX_BYTES,
+        grace_s: float = STREAM_RESUME_GRACE_S,
+        abandon_grace_s: float = STREAM_ABANDON_GRACE_S,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.grace_s = grace_s
+        self.abandon_grace_s = abandon_grace_s
+        self._streams: Dict[str, StreamBuffer] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._bytes = 0
+        self.started = 0
+        self.resumes = 0
+        self.evicted = 0
+        self.abandoned = 0
+        self.abandoned_frames = 0
+        self.abandoned_upstream_s = 0.0
+
+    def start(
+        self,
+        factory: Callable[[], AsyncIterator[Any]],
+        on_done: Optional[Callable[[], None]] = None,
+    ) -> StreamBuffer:
+        """Run ``factory()`` in its own task, publishing into a new buffer.
+
+        ``on_done`` runs when the task ends for any reason, including a
+        cancellation that lands before the producer was first iterated.
+        """
+        buffer = StreamBuffer(uuid.uuid4().hex[:16])
+        buffer.on_idle = self._on_idle
+        self._streams[buffer.stream_id] = buffer
+        task = asyncio.create_task(self._pump(buffer, factory()))
+        if on_done is not None:
+            task.add_done_callback(lambda _: on_done())
+        self._tasks[buffer.stream_id] = task
+        self.started += 1
+        return buffer
+
+    def get(self, stream_id: str) -> Optional[StreamBuffer]:
+        return self._streams.get(stream_id)
+
+    def resume(self, last_event_id: Optional[str]) -> Optional[AsyncIterator[bytes]]:
+        """Follower continuing after ``Last-Event-ID``, or None if unknown/expired"""
+        parsed = parse_event_id(last_event_id)
+        if not parsed:
+            return None
+        buffer = self._streams.get(parsed[0])
+        if buffer is None:
+            return None
+        self.resumes += 1
+        return buffer.follow(parsed[1])
+
+    def _on_idle(self, buffer: StreamBuffer) -> None:
+        asyncio.get_running_loop().call_later(self.abandon_grace_s, self._cancel_if_abandoned, buffer.stream_id)
+
+    def _cancel_if_abandoned(self, stream_id: str) -> None:
+        buffer = self._streams.get(stream_id)
+        task = self._tasks.get(stream_id)
+        if buffer is None or task is None or buffer.closed or buffer.subscribers:
+            return
+        self.abandoned += 1
+        self.abandoned_frames += buffer.next_seq
+        self.abandoned_upstream_s += time.monotonic() - buffer.started_at
+        task.cancel()
+
+    async def _pump(self, buffer: StreamBuffer, source: AsyncIterator[Any]) -> None:
+        try:
+            async for frame in source:
+                self._bytes += buffer.publish(frame)
+                if self._bytes > self.max_bytes:
+                    self._enforce_cap()
+        except asyncio.CancelledError:
+            self._bytes += buffer.publish(sse_event_bytes({
+                "type": "error",
+                "code": "cancelled",
+                "message": "generation stopped after all clients disconnected",
+            }))
+        except Exception as e:
+            logger.exception("stream %s producer failed", buffer.stream_id)
+            self._bytes += buffer.publish(sse_event_bytes({"type": "error", "message": str(e)}))
+        finally:
+            buffer.close()
+            self._tasks.pop(buffer.stream_id, None)
+            asyncio.get_running_loop().call_later(self.grace_s, self._expire, buffer.stream_id)
+
+    def _expire(self, stream_id: str) -> None:
+        buffer = self._streams.pop(stream_id, None)
+        if buffer is not None:
+            self._bytes -= buffer.bytes
+
+    def _enforce_cap(self) -> None:
+        # Finished streams go first, oldest first; then trim live rings
+        finished = sorted(
+            (b for b in self._streams.values() if b.closed),
+            key=lambda b: b.finished_at or 0,
+        )
+        for buffer in finished:
+            if self._bytes <= self.max_bytes:
+                return
+            self._expire(buffer.stream_id)
+            self.evicted += 1
+        live = sorted(self._streams.values(), key=lambda b: b.bytes, reverse=True)
+        for buffer in live:
+            if self._bytes <= self.max_bytes:
+                return
+            self._bytes -= buffer.trim(max(0, buffer.bytes - (self._bytes - self.max_bytes)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "streams": len(self._streams),
+            "live": len(self._tasks),
+            "buffered_bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "started": self.started,
+            "resumes": self.resumes,
+            "evicted": self.evicted,
+            "abandoned": self.abandoned,
+            "abandoned_frames": self.abandoned_frames,
+            "abandoned_upstream_s": round(self.abandoned_upstream_s, 3),
+            "abandon_grace_s": self.abandon_grace_s,
+        }
+
+
+stream_registry = StreamRegistry()
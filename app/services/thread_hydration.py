@@ -0,0 +1,149 @@
+# app/services/thread_hydration.py
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.admission import admission
+from app.core.openai_client import client, hedged
+from app.services.chat_history import save_entries
+
+
+def _output_text(response: Any) -> str:
+    chunks = []
+    for block in getattr(response, "output", []) or []:
+        for c in getattr(block, "content", []) or []:
+            if getattr(c, "type", None) == "output_text":
+                text = getattr(c, "text", None)
+                if text:
+                    chunks.append(text)
+    return "".join(chunks) if chunks else ""
+
+
+async def _input_text(response_id: str) -> Optional[str]:
+    chunks = []
+    try:
+        inputs_list = await hedged(lambda: client.responses.input_items.list(response_id))
+        for input_item in getattr(inputs_list, "data", []) or []:
+            for part in getattr(input_item, "content", []) or []:
+                if getattr(part, "type", None) == "input_text":
+                    text = getattr(part, "text", None)
+                    if text:
+                        chunks.append(text)
+    except Exception:
+        pass
+    return "".join(chunks) if chunks else None
+
+
+class ThreadHydrator:
+    """Fetch a missing chain from OpenAI with the two calls per hop overlapped.
+
+    ``retrieve`` is inherently serial (each hop yields the next id), but
+    ``input_items.list`` for a hop only needs that hop's id, so it runs
+    alongside the retrieve of the next one: N hops cost about N round
+    trips of latency instead of 2N. Concurrent requests for the same
+    chain share one hydration, and the results are cached in one batch.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Tuple[str, int], asyncio.Task] = {}
+        self.hydrations = 0
+        self.coalesced = 0
+        self.hops = 0
+        self.round_trips = 0
+        self.ms_total = 0.0
+
+    async def hydrate(self, start_id: str, max_hops: int) -> Dict[str, Any]:
+        key = (start_id, max_hops)
+        task = self._inflight.get(key)
+        coalesced = task is not None
+        if task is None:
+            # Detached, so a disconnecting leader does not fail its followers
+            task = self._inflight[key] = asyncio.ensure_future(self._hydrate(start_id, max_hops))
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.coalesced += 1
+        result = await asyncio.shield(task)
+        if coalesced:
+            result = {**result, "hydration": {**result["hydration"], "coalesced": True}}
+        return result
+
+    def _done(self, key: Tuple[str, int], task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()
+
+    async def _hydrate(self, start_id: str, max_hops: int) -> Dict[str, Any]:
+        started = time.perf_counter()
+        exchanges: List[Dict[str, Any]] = []
+        inputs: List[asyncio.Task] = []
+        current_id: Optional[str] = start_id
+        round_trips = 0
+        retrieving: Optional[asyncio.Future] = None
+
+        async with admission.admit("threads"):
+            try:
+                if max_hops > 0:
+                    retrieving = asyncio.ensure_future(hedged(lambda: client.responses.retrieve(start_id)))
+                while retrieving is not None:
+                    response = await retrieving
+                    round_trips += 1
+                    previous_id = getattr(response, "previous_response_id", None)
+                    retrieving = None
+                    if previous_id and len(exchanges) + 1 < max_hops:
+                        retrieving = asyncio.ensure_future(
+                            hedged(lambda rid=previous_id: client.responses.retrieve(rid))
+                        )
+                    inputs.append(asyncio.ensure_future(_input_text(response.id)))
+                    exchanges.append({
+                        "response_id": response.id,
+                        "previous_response_id": previous_id,
+                        "user_text": None,
+                        "assistant_text": _output_text(response),
+                        "model": getattr(response, "model", None),
+                        "created_at": getattr(response, "created_at", None),
+                        "metadata": getattr(response, "metadata", None) or None,
+                    })
+                    current_id = previous_id
+                for exchange, user_text in zip(exchanges, await asyncio.gather(*inputs)):
+                    exchange["user_text"] = user_text
+                round_trips += len(inputs)
+            except BaseException:
+                for task in inputs + ([retrieving] if retrieving is not None else []):
+                    task.cancel()
+                raise
+
+        # Fetched newest first; cache oldest first so each one extends its thread
+        exchanges.reverse()
+        messages = save_entries(exchanges)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.hydrations += 1
+        self.hops += len(exchanges)
+        self.round_trips += round_trips
+        self.ms_total += elapsed_ms
+        return {
+            "messages": messages,
+            "oldest_id": exchanges[0]["response_id"] if exchanges else None,
+            "missing_from": current_id,
+            "hydration": {
+                "ms": round(elapsed_ms, 2),
+                "hops": len(exchanges),
+                "round_trips": round_trips,
+                "coalesced": False,
+            },
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hydrations": self.hydrations,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+            "hops": self.hops,
+            "round_trips": self.round_trips,
+            "ms_avg": round(self.ms_total / self.hydrations, 2) if self.hydrations else 0.0,
+        }
+
+
+thread_hydrator = ThreadHydrator()
@@ -0,0 +1,148 @@
+# app/services/thread_store.py
+from __future__ import annotations
+
+import logging
+from datetime import timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.history_writer import HISTORY_PERSIST, db_id, history_writer
+
+logger = logging.getLogger(__name__)
+
+# Threads to follow through fork links before giving up on one page
+_MAX_HOPS = 32
+
+
+def _exchanges(rows: List[Any]) -> Dict[str, Dict[str, Any]]:
+    """Message rows -> save_entry kwargs keyed by response id"""
+    out: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        meta = dict(row.meta or {})
+        response_id = meta.pop("response_id", None)
+        if not response_id:
+            continue
+        exchange = out.setdefault(response_id, {
+            "response_id": response_id,
+            "previous_response_id": meta.pop("previous_response_id", None),
+            "user_text": None,
+            "assistant_text": None,
+            "model": None,
+            # SQLite hands back naive datetimes; they were written as UTC
+            "created_at": row.created_at.replace(tzinfo=row.created_at.tzinfo or timezone.utc).timestamp(),
+            "metadata": None,
+        })
+        meta.pop("previous_response_id", None)
+        if row.role == "user":
+            exchange["user_text"] = row.content
+        else:
+            exchange["assistant_text"] = row.content
+            exchange["model"] = row.model
+            exchange["metadata"] = meta or None
+    return out
+
+
+async def _anchor(conn, response_id: str) -> Optional[Any]:
+    from sqlalchemy import select
+
+    from app.db.models import Message
+
+    ids = [db_id(response_id), db_id(f"{response_id}_user")]
+    result = await conn.execute(
+        select(Message.thread_id, Message.created_at, Message.meta).where(Message.id.in_(ids)).limit(1)
+    )
+    return result.first()
+
+
+async def _run(query, *args) -> Any:
+    if not HISTORY_PERSIST:
+        return None
+    try:
+        engine = history_writer._get_engine()
+        async with engine.connect() as conn:
+            return await query(conn, *args)
+    except Exception as e:
+        # Reads degrade to memory + OpenAI hydration
+        logger.warning("thread store unavailable: %s", e)
+        return None
+
+
+async def _before(conn, response_id: str, limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    from sqlalchemy import select
+
+    from app.db.models import Message
+
+    newest_first: List[Dict[str, Any]] = []
+    current: Optional[str] = response_id
+    for _ in range(_MAX_HOPS):
+        anchor = await _anchor(conn, current)
+        if anchor is None:
+            break
+        # Newest-first slice of one thread via (thread_id, created_at)
+        result = await conn.execute(
+            select(Message.__table__)
+            .where(Message.thread_id == anchor.thread_id, Message.created_at <= anchor.created_at)
+            .order_by(Message.created_at.desc())
+            .limit(2 * (limit - len(newest_first)) + 2)
+        )
+        exchanges = _exchanges(result.all())
+        # Walk the chain inside the slice; rows with equal timestamps may
+        # belong to siblings, so order comes from the links, not the clock
+        while current in exchanges and len(newest_first) < limit:
+            exchange = exchanges.pop(current)
+            newest_first.append(exchange)
+            current = exchange["previous_response_id"]
+        if not current or len(newest_first) >= limit:
+            break
+    return newest_first[::-1], current
+
+
+async def load_before(response_id: str, limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Up to ``limit`` exchanges ending at ``response_id``, oldest first, and the next missing id"""
+    result = await _run(_before, response_id, limit)
+    return result if result is not None else ([], response_id)
+
+
+async def _after(conn, response_id: str, cursor_id: str, limit: int) -> List[Dict[str, Any]]:
+    from sqlalchemy import select
+
+    from app.db.models import Message
+
+    anchor = await _anchor(conn, response_id)
+    cursor = await _anchor(conn, cursor_id)
+    if anchor is None or cursor is None or anchor.thread_id != cursor.thread_id:
+        return []
+    result = await conn.execute(
+        select(Message.__table__)
+        .where(
+            Message.thread_id == anchor.thread_id,
+            Message.created_at >= cursor.created_at,
+            Message.created_at <= anchor.created_at,
+        )
+        .order_by(Message.created_at)
+        .limit(2 * limit + 4)
+    )
+    exchanges = _exchanges(result.all())
+    following = {e["previous_response_id"]: e for e in exchanges.values()}
+    out: List[Dict[str, Any]] = []
+    current = cursor_id
+    while current in following and len(out) < limit:
+        exchange = following[current]
+        out.append(exchange)
+        if exchange["response_id"] == response_id:
+            break
+        current = exchange["response_id"]
+    return out
+
+
+async def load_after(response_id: str, cursor_id: str, limit: int) -> List[Dict[str, Any]]:
+    """Exchanges newer than ``cursor_id`` up to ``response_id`` (same thread only)"""
+    return await _run(_after, response_id, cursor_id, limit) or []
+
+
+async def _previous(conn, response_id: str) -> Optional[str]:
+    anchor = await _anchor(conn, response_id)
+    return (anchor.meta or {}).get("previous_response_id") if anchor is not None else None
+
+
+async def previous_of(response_id: str) -> Optional[str]:
+    return await _run(_previous, response_id)
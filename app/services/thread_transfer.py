@@ -0,0 +1,176 @@
+# app/services/thread_transfer.py
+from __future__ import annotations
+
+import json
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.services.history_writer import dialect_insert
+
+EXPORT_YIELD_PER = int(os.getenv("EXPORT_YIELD_PER", "1000"))
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "1000"))
+IMPORT_MAX_LINE_BYTES = int(os.getenv("IMPORT_MAX_LINE_BYTES", str(8 * 1024 * 1024)))
+
+THREAD_FIELDS = ("id", "title", "created_at", "updated_at", "meta")
+MESSAGE_FIELDS = ("id", "thread_id", "role", "content", "created_at", "model", "meta")
+_DATETIME_FIELDS = ("created_at", "updated_at")
+
+
+def _line(kind: str, row: Any, fields: tuple) -> bytes:
+    record: Dict[str, Any] = {"type": kind}
+    for name in fields:
+        value = getattr(row, name)
+        record[name] = value.isoformat() if isinstance(value, datetime) else value
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+async def export_ndjson(thread_id: Optional[str] = None) -> AsyncIterator[bytes]:
+    """Threads, then their messages, as NDJSON over server-side cursors.
+
+    Rows are fetched ``EXPORT_YIELD_PER`` at a time and written out as
+    they arrive, so memory does not depend on how many are exported.
+    Threads come first so an import never sees a message before its
+    thread.
+    """
+    from sqlalchemy import select
+
+    from app.db.models import Message, Thread
+    from app.db.session import engine
+
+    threads = select(*(Thread.__table__.c[f] for f in THREAD_FIELDS)).order_by(Thread.id)
+    messages = select(*(Message.__table__.c[f] for f in MESSAGE_FIELDS)).order_by(
+        Message.thread_id, Message.created_at
+    )
+    if thread_id:
+        threads = threads.where(Thread.id == thread_id)
+        messages = messages.where(Message.thread_id == thread_id)
+
+    async with engine.connect() as conn:
+        for kind, query, fields in (("thread", threads, THREAD_FIELDS), ("message", messages, MESSAGE_FIELDS)):
+            result = await conn.stream(query.execution_options(yield_per=EXPORT_YIELD_PER))
+            async for partition in result.partitions():
+                yield b"".join(_line(kind, row, fields) for row in partition)
+
+
+class NDJSONError(ValueError):
+    """A malformed import line; ``line`` is 1-based"""
+
+    def __init__(self, line: int, message: str) -> None:
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+def _parse(record: Dict[str, Any], fields: tuple) -> Dict[str, Any]:
+    row = {name: record.get(name) for name in fields}
+    for name in _DATETIME_FIELDS:
+        if isinstance(row.get(name), str):
+            row[name] = datetime.fromisoformat(row[name])
+    return row
+
+
+class NDJSONImporter:
+    """Bulk upsert of exported NDJSON in ``IMPORT_CHUNK_ROWS`` chunks.
+
+    Chunks are written on one connection inside the caller's transaction,
+    so a bad line rolls back everything before it. Pending threads are
+    always flushed before pending messages, so the foreign key holds even
+    when a chunk boundary splits a thread from its messages. Existing ids
+    are skipped, which makes re-running an import safe.
+    """
+
+    def __init__(self, conn, chunk_rows: int = IMPORT_CHUNK_ROWS) -> None:
+        self.conn = conn
+        self.chunk_rows = chunk_rows
+        self._threads: List[Dict[str, Any]] = []
+        self._messages: List[Dict[str, Any]] = []
+        self.counts = {"threads": 0, "messages": 0, "chunks": 0, "errors": 0}
+
+    async def add(self, record: Dict[str, Any]) -> None:
+        kind = record.get("type")
+        if kind == "thread":
+            self._threads.append(_parse(record, THREAD_FIELDS))
+            if len(self._threads) >= self.chunk_rows:
+                await self._flush_threads()
+        elif kind == "message":
+            self._messages.append(_parse(record, MESSAGE_FIELDS))
+            if len(self._messages) >= self.chunk_rows:
+                await self._flush_threads()
+                await self._flush_messages()
+        else:
+            self.counts["errors"] += 1
+
+    async def _flush(self, table, rows: List[Dict[str, Any]]) -> None:
+        stmt = dialect_insert(self.conn.dialect.name)(table).on_conflict_do_nothing(index_elements=["id"])
+        await self.conn.execute(stmt, rows)
+        self.counts["chunks"] += 1
+
+    async def _flush_threads(self) -> None:
+        from app.db.models import Thread
+
+        if self._threads:
+            await self._flush(Thread.__table__, self._threads)
+            self.counts["threads"] += len(self._threads)
+            self._threads = []
+
+    async def _flush_messages(self) -> None:
+        from app.db.models import Message
+
+        if self._messages:
+            await self._flush(Message.__table__, self._messages)
+            self.counts["messages"] += len(self._messages)
+            self._messages = []
+
+    async def close(self) -> Dict[str, int]:
+        await self._flush_threads()
+        await self._flush_messages()
+        return self.counts
+
+
+def _record(number: int, line: bytes) -> Dict[str, Any]:
+    if len(line) > IMPORT_MAX_LINE_BYTES:
+        raise NDJSONError(number, f"longer than {IMPORT_MAX_LINE_BYTES} bytes")
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        raise NDJSONError(number, f"invalid JSON ({e})") from e
+    if not isinstance(record, dict):
+        raise NDJSONError(number, f"expected a JSON object, got {type(record).__name__}")
+    return record
+
+
+async def import_ndjson(body: AsyncIterator[bytes]) -> Dict[str, int]:
+    """Read NDJSON from a byte stream line by line and bulk-insert it.
+
+    The whole import is one transaction: on the first malformed line an
+    ``NDJSONError`` naming it is raised and nothing is kept.
+    """
+    from app.db.session import engine
+
+    async with engine.begin() as conn:
+        importer = NDJSONImporter(conn)
+        pending = b""
+        number = 0
+        async for chunk in body:
+            pending += chunk
+            if b"\n" not in chunk:
+                if len(pending) > IMPORT_MAX_LINE_BYTES:
+                    raise NDJSONError(number + 1, f"longer than {IMPORT_MAX_LINE_BYTES} bytes")
+                continue
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                number += 1
+                if line.strip():
+                    await _add(importer, number, line)
+        if pending.strip():
+            await _add(importer, number + 1, pending)
+        return await importer.close()
+
+
+async def _add(importer: NDJSONImporter, number: int, line: bytes) -> None:
+    record = _record(number, line)
+    try:
+        await importer.add(record)
+    except (TypeError, ValueError) as e:
+        # e.g. a timestamp that is not ISO 8601
+        raise NDJSONError(number, str(e)) from e
@@ -0,0 +1,316 @@
+# app/services/vector_index.py
+from __future__ import annotations
+
+import math
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+import numpy as np
+
+# Below this many vectors a brute-force matmul is faster than probing partitions
+IVF_THRESHOLD = int(os.getenv("RAG_IVF_THRESHOLD", "50000"))
+IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "16"))
+# Rows are compacted away once this fraction of the matrix is tombstoned
+COMPACT_RATIO = float(os.getenv("RAG_COMPACT_RATIO", "0.25"))
+_KMEANS_ITERS = 10
+_KMEANS_SAMPLE = 64
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first"""
+    if k >= scores.shape[0]:
+        return np.argsort(-scores)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part])]
+
+
+def _matches(meta: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    for key, expected in filters.items():
+        value = meta.get(key)
+        if isinstance(expected, (list, tuple, set)):
+            if value not in expected:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+class _IVFPartitions:
+    """Inverted file: k-means centroids + row ids per partition"""
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray) -> None:
+        self.centroids = centroids
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(centroids.shape[0] + 1))
+        self.lists: List[List[np.ndarray]] = [
+            [order[bounds[i]:bounds[i + 1]].astype(np.int64)] for i in range(centroids.shape[0])
+        ]
+        self.trained_size = int(assignments.shape[0])
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, seed: int = 0) -> "_IVFPartitions":
+        n = vectors.shape[0]
+        nlist = max(16, min(4096, int(math.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        sample_size = min(n, nlist * _KMEANS_SAMPLE)
+        sample = vectors[rng.choice(n, sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(_KMEANS_ITERS):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            nonempty = counts > 0
+            centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids /= norms
+        return cls(centroids, cls.assign(centroids, vectors))
+
+    @staticmethod
+    def assign(centroids: np.ndarray, vectors: np.ndarray, batch: int = 8192) -> np.ndarray:
+        out = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], batch):
+            out[start:start + batch] = np.argmax(vectors[start:start + batch] @ centroids.T, axis=1)
+        return out
+
+    def append(self, first_row: int, vectors: np.ndarray) -> None:
+        assignments = self.assign(self.centroids, vectors)
+        for part in np.unique(assignments):
+            self.lists[part].append(np.flatnonzero(assignments == part) + first_row)
+
+    def remap(self, new_rows: np.ndarray) -> None:
+        """Renumber rows after compaction; ``new_rows[old]`` is -1 for dropped rows"""
+        for i, chunks in enumerate(self.lists):
+            merged = new_rows[np.concatenate(chunks)] if chunks else np.zeros(0, dtype=np.int64)
+            self.lists[i] = [merged[merged >= 0]]
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        probes = _top_k(self.centroids @ query, min(nprobe, self.centroids.shape[0]))
+        chunks = [chunk for p in probes for chunk in self.lists[p]]
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+
+
+class VectorIndex:
+    """In-process embedding matrix with exact and IVF top-k search.
+
+    Rows are L2-normalized, so the inner product is cosine similarity. The
+    index is exact until it holds ``ivf_threshold`` vectors, then trains an
+    IVF partitioning and probes ``nprobe`` partitions per query. Partitions
+    are retrained once the corpus doubles past the last training size;
+    k-means runs outside the lock, so searches continue meanwhile. Removed
+    rows are tombstoned and compacted away past ``compact_ratio``.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        ivf_threshold: int = IVF_THRESHOLD,
+        nprobe: int = IVF_NPROBE,
+        compact_ratio: float = COMPACT_RATIO,
+    ) -> None:
+        self.dim = dim
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.compact_ratio = compact_ratio
+        self._matrix = np.zeros((1024, dim), dtype=np.float32)
+        self._size = 0
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._meta: List[Dict[str, Any]] = []
+        self._rows: Dict[str, int] = {}
+        self._dead: Set[int] = set()
+        self._ivf: Optional[_IVFPartitions] = None
+        self._training = False
+        self.compactions = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._size - len(self._dead)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        row = self._rows.get(chunk_id)
+        return row is not None and row not in self._dead
+
+    @property
+    def mode(self) -> str:
+        return "ivf" if self._ivf is not None else "exact"
+
+    def _reserve(self, extra: int) -> None:
+        needed = self._size + extra
+        if needed <= self._matrix.shape[0]:
+            return
+        capacity = self._matrix.shape[0]
+        while capacity < needed:
+            capacity *= 2
+        grown = np.zeros((capacity, self.dim), dtype=np.float32)
+        grown[:self._size] = self._matrix[:self._size]
+        self._matrix = grown
+
+    def add(
+        self,
+        ids: Sequence[str],
+        vectors: np.ndarray,
+        texts: Sequence[str],
+        metadata: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> int:
+        """Append vectors; ids already present are skipped. Returns rows added"""
+        if vectors.shape[0] != len(ids) or vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of shape ({len(ids)}, {self.dim}), got {vectors.shape}")
+        metadata = metadata or [{} for _ in ids]
+
+        with self._lock:
+            keep, pending, revived = [], set(), 0
+            for i, chunk_id in enumerate(ids):
+                row = self._rows.get(chunk_id)
+                if row is None and chunk_id not in pending:
+                    pending.add(chunk_id)
+                    keep.append(i)
+                elif row is not None and row in self._dead:
+                    # ids are content hashes: the stored vector is still valid
+                    self._dead.discard(row)
+                    revived += 1
+            if not keep:
+                return revived
+            first = self._size
+            self._reserve(len(keep))
+            self._matrix[first:first + len(keep)] = vectors[keep]
+            for offset, i in enumerate(keep):
+                self._rows[ids[i]] = first + offset
+                self._ids.append(ids[i])
+                self._texts.append(texts[i])
+                self._meta.append(dict(metadata[i]))
+            self._size += len(keep)
+
+            added = len(keep) + revived
+            if self._ivf is not None and self._size < 2 * self._ivf.trained_size:
+                self._ivf.append(first, self._matrix[first:self._size])
+                return added
+            if self._training or self._size < self.ivf_threshold:
+                if self._ivf is not None:
+                    # A retrain is running; keep these rows probeable until it lands
+                    self._ivf.append(first, self._matrix[first:self._size])
+                return added
+            self._training = True
+            # Rows are append-only and compaction builds a new matrix, so
+            # this view stays valid while we train
+            snapshot = self._matrix[:self._size]
+            generation = self.compactions
+
+        trained = None
+        try:
+            trained = _IVFPartitions.train(snapshot)
+        finally:
+            with self._lock:
+                self._training = False
+                # After a compaction the row numbers changed; the next add retrains
+                if trained is not None and self.compactions == generation:
+                    if self._size > trained.trained_size:
+                        trained.append(trained.trained_size, self._matrix[trained.trained_size:self._size])
+                    self._ivf = trained
+        return added
+
+    def remove(self, ids: Sequence[str]) -> int:
+        """Tombstone rows; they are skipped by search and revived by add
+        until a compaction drops them"""
+        with self._lock:
+            removed = 0
+            for chunk_id in ids:
+                row = self._rows.get(chunk_id)
+                if row is not None and row not in self._dead:
+                    self._dead.add(row)
+                    removed += 1
+            if self._dead and len(self._dead) > self.compact_ratio * self._size:
+                self._compact()
+            return removed
+
+    def _compact(self) -> None:
+        """Drop tombstoned rows so searches stop scanning and over-fetching them"""
+        alive = np.ones(self._size, dtype=bool)
+        alive[list(self._dead)] = False
+        new_rows = np.full(self._size, -1, dtype=np.int64)
+        new_rows[alive] = np.arange(int(alive.sum()))
+        kept = np.flatnonzero(alive)
+        capacity = 1024
+        while capacity < kept.shape[0] * 2:
+            capacity *= 2
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:kept.shape[0]] = self._matrix[kept]
+        self._matrix = matrix
+        self._ids = [self._ids[row] for row in kept]
+        self._texts = [self._texts[row] for row in kept]
+        self._meta = [self._meta[row] for row in kept]
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+        self._size = kept.shape[0]
+        self._dead = set()
+        if self._ivf is not None:
+            if self._size < self.ivf_threshold:
+                self._ivf = None
+            else:
+                self._ivf.remap(new_rows)
+        self.compactions += 1
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 4,
+        filters: Optional[Dict[str, Any]] = None,
+        exact: bool = False,
+    ) -> List[Dict[str, Any]]:
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        with self._lock:
+            if self._size == 0 or k <= 0:
+                return []
+            if self._ivf is not None and not exact:
+                rows = self._ivf.candidates(query, self.nprobe)
+                scores = self._matrix[rows] @ query
+            else:
+                rows = None
+                scores = self._matrix[:self._size] @ query
+
+            # Over-fetch so filtered queries rarely need a full sort
+            fetch = k + len(self._dead) if not filters else (k + len(self._dead)) * 8
+            order = _top_k(scores, fetch)
+            hits = self._collect(order, rows, scores, k, filters)
+            if (filters or self._dead) and len(hits) < k and order.shape[0] < scores.shape[0]:
+                hits = self._collect(np.argsort(-scores), rows, scores, k, filters)
+            return hits
+
+    def _collect(
+        self,
+        order: np.ndarray,
+        rows: Optional[np.ndarray],
+        scores: np.ndarray,
+        k: int,
+        filters: Optional[Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        hits: List[Dict[str, Any]] = []
+        for pos in order:
+            row = int(rows[pos]) if rows is not None else int(pos)
+            meta = self._meta[row]
+            if row in self._dead or (filters and not _matches(meta, filters)):
+                continue
+            hits.append({
+                "id": self._ids[row],
+                "score": float(scores[pos]),
+                "text": self._texts[row],
+                "metadata": meta,
+            })
+            if len(hits) >= k:
+                break
+        return hits
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": self._size - len(self._dead),
+                "tombstones": len(self._dead),
+                "compactions": self.compactions,
+                "dim": self.dim,
+                "mode": self.mode,
+                "partitions": self._ivf.centroids.shape[0] if self._ivf is not None else 0,
+                "nprobe": self.nprobe,
+                "matrix_bytes": int(self._matrix.nbytes),
+            }
+
@@ -0,0 +1,137 @@
+"""Benchmark GET /search/messages on SQLite FTS5 over a large messages table.
+
+Seeds a throwaway database with ``--messages`` synthetic messages (schema
+from the models plus the b4e8f2c91d07 migration, so rows are indexed by
+the same triggers the app uses), then times ``search_messages`` for common,
+rare, prefix, filtered and deep-offset queries. Seeding 1M rows takes a
+minute or two; pass ``--db`` to keep the file and reuse it on later runs.
+
+    python scripts/bench_search.py --messages 1000000 --repeat 50
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+MIGRATION = os.path.join(ROOT, "alembic", "versions", "b4e8f2c91d07_messages_full_text_search.py")
+
+# Zipf-distributed vocabulary (weight 1/rank), as in natural text: stop words
+# first, then the topical words the queries use, then a long tail
+COMMON = "the a to and of is in it for that you with on this be are as can".split()
+TOPICAL = (
+    "database credentials rotate staging deploy snapshot postgres cluster index query latency "
+    "chart report upload invoice customer refund migration backup restore token session cache"
+).split()
+VOCAB = COMMON + [f"word{i}" for i in range(100)] + TOPICAL + [f"term{i}" for i in range(50000)]
+CUM_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(VOCAB) + 1)))
+
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choices(VOCAB, cum_weights=CUM_WEIGHTS, k=rng.randint(8, 60)))
+
+
+def _upgrade(sync_conn):
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+
+    spec = importlib.util.spec_from_file_location("fts_migration", MIGRATION)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    with Operations.context(MigrationContext.configure(sync_conn)):
+        module.upgrade()
+
+
+def seed(path: str, messages: int, threads: int, batch: int = 20000) -> None:
+    from sqlalchemy import create_engine, insert
+
+    from app.db.models import Base, Message, Thread
+
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        _upgrade(conn)
+        conn.execute(insert(Thread.__table__), [
+            {"id": f"t{i:08d}", "title": f"thread {i}", "created_at": start, "updated_at": start}
+            for i in range(threads)
+        ])
+    started = time.perf_counter()
+    for offset in range(0, messages, batch):
+        rows = [
+            {
+                "id": f"m{i:010d}",
+                "thread_id": f"t{i % threads:08d}",
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": _sentence(rng),
+                "created_at": start + timedelta(seconds=i),
+                "meta": {"response_id": f"resp_{i}"},
+            }
+            for i in range(offset, min(messages, offset + batch))
+        ]
+        with engine.begin() as conn:
+            conn.execute(insert(Message.__table__), rows)
+    engine.dispose()
+    print(f"seeded {messages} messages in {time.perf_counter() - started:.1f}s")
+
+
+CASES = [
+    ("common", {"q": "database"}),
+    ("two terms", {"q": "rotate credentials"}),
+    ("prefix", {"q": "snap"}),
+    ("rare", {"q": "term31337"}),
+    ("thread", {"q": "the", "thread_id": "t00000007"}),
+    ("role", {"q": "deploy staging", "role": "assistant"}),
+    ("offset 1000", {"q": "database", "offset": 1000}),
+]
+
+
+async def run(args):
+    from app.db.session import engine
+    from app.services.message_search import search_messages
+
+    print(f"{'query':<14}{'hits':>6}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    for name, params in CASES:
+        await search_messages(limit=args.limit, **params)  # warm the page cache
+        timings, hits = [], 0
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            page = await search_messages(limit=args.limit, **params)
+            timings.append((time.perf_counter() - started) * 1000)
+            hits = len(page["results"])
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{name:<14}{hits:>6}{statistics.median(timings):>9.2f}{p95:>9.2f}{timings[-1]:>9.2f}")
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--threads", type=int, default=20_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--db", help="SQLite file to seed (if missing) and reuse")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(prefix="bench-search-"), "search.db")
+    if not os.path.exists(path):
+        seed(path, args.messages, args.threads)
+    # app.db.session builds its engine from DATABASE_URL on import
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
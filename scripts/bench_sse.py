@@ -0,0 +1,90 @@
+"""Benchmark SSE framing for /chat/stream: per-delta json frames vs bytes
+encoder vs time/byte coalescing, across many concurrent streams.
+
+Each simulated upstream emits bursts of small deltas; every frame is sent
+through a StreamingResponse into an ASGI ``send`` that counts body messages
+and writes each one to /dev/null, so every frame costs a real syscall the
+way uvicorn's transport write would.
+
+    python scripts/bench_sse.py --streams 300 --tokens 400
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fastapi.responses import StreamingResponse  # noqa: E402
+
+from app.core.sse import coalesce_deltas, sse_delta_bytes, sse_event  # noqa: E402
+
+
+async def upstream(tokens: int, burst: int, interval: float):
+    for i in range(tokens):
+        if i % burst == 0:
+            await asyncio.sleep(interval)
+        yield SimpleNamespace(type="response.output_text.delta", delta=f"tok{i % 97} ")
+
+
+async def frames(mode: str, args):
+    source = upstream(args.tokens, args.burst, args.interval)
+    if mode == "json":
+        async for event in source:
+            yield sse_event({"type": "delta", "content": event.delta})
+        return
+    if mode == "bytes":
+        async for event in source:
+            yield sse_delta_bytes(event.delta)
+        return
+    window = float(mode.split(":")[1])
+    async for event in coalesce_deltas(source, window_ms=window, max_bytes=args.max_bytes):
+        yield sse_delta_bytes(event.delta)
+
+
+async def run(mode: str, args):
+    writes = 0
+    sink = os.open(os.devnull, os.O_WRONLY)
+
+    async def send(message):
+        nonlocal writes
+        if message["type"] == "http.response.body" and message.get("body"):
+            os.write(sink, message["body"])
+            writes += 1
+
+    async def receive():
+        await asyncio.sleep(3600)
+        return {"type": "http.disconnect"}
+
+    async def one():
+        response = StreamingResponse(frames(mode, args), media_type="text/event-stream")
+        await response({"type": "http"}, receive, send)
+
+    cpu, wall = time.process_time(), time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(args.streams)])
+    os.close(sink)
+    return time.process_time() - cpu, time.perf_counter() - wall, writes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=300)
+    parser.add_argument("--tokens", type=int, default=400)
+    parser.add_argument("--burst", type=int, default=4, help="deltas delivered per upstream read")
+    parser.add_argument("--interval", type=float, default=0.005, help="seconds between upstream reads")
+    parser.add_argument("--max-bytes", type=int, default=1024)
+    parser.add_argument("--modes", default="json,bytes,coalesce:20,coalesce:50")
+    args = parser.parse_args()
+
+    print(f"{args.streams} streams x {args.tokens} deltas")
+    print(f"{'mode':<14}{'cpu s':>8}{'cpu ms/stream':>15}{'wall s':>8}{'writes':>9}{'writes/stream':>15}")
+    for mode in args.modes.split(","):
+        cpu, wall, writes = asyncio.run(run(mode, args))
+        print(f"{mode:<14}{cpu:>8.2f}{cpu * 1000 / args.streams:>15.2f}{wall:>8.2f}{writes:>9}{writes / args.streams:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
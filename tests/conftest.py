@@ -0,0 +1,16 @@
+# Test defaults; set before any app module reads its configuration
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+_TMP = tempfile.mkdtemp(prefix="app-tests-")
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("HISTORY_PERSIST", "0")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(_TMP, 'app.db')}")
+os.environ.setdefault("RAG_INDEX_DIR", os.path.join(_TMP, "rag_index"))
+os.environ.setdefault("CHART_UPLOAD_INDEX", os.path.join(_TMP, "chart_uploads.json"))
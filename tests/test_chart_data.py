@@ -0,0 +1,231 @@
+import base64
+import io
+import math
+from xml.etree import ElementTree
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import charts
+from app.main import app
+from app.services.chart_data import (
+    ChartDataError,
+    block_mean,
+    downsample,
+    histogram_bins,
+    lttb_indices,
+    to_columns,
+)
+from app.services import chart_data
+from app.services.chart_render import CHART_DPI, CHART_HEIGHT_IN, CHART_WIDTH_IN, render_chart
+
+NAN = float("nan")
+
+
+@pytest.mark.parametrize("data, x, series", [
+    ([3, 1, 2], None, {"value": [3, 1, 2]}),
+    ([[1, 10], [2, 20]], [1, 2], {"y": [10, 20]}),
+    ([{"month": "Jan", "sales": 5}, {"month": "Feb", "sales": None}], ["Jan", "Feb"], {"sales": [5, NAN]}),
+    ({"x": ["a", "b"], "y": {"s1": [1, 2], "s2": [3, 4]}}, ["a", "b"], {"s1": [1, 2], "s2": [3, 4]}),
+    ({"labels": ["a", "b"], "values": [0.25, 0.75]}, ["a", "b"], {"value": [0.25, 0.75]}),
+    ({"a": 1, "b": 2}, ["a", "b"], {"value": [1, 2]}),
+    ("x,y\n1,2\n3,4", [1, 3], {"y": [2, 4]}),
+    ("[1, 2]", None, {"value": [1, 2]}),
+])
+def test_to_columns_accepts_every_documented_shape(data, x, series):
+    columns = to_columns(data)
+    if x is None:
+        assert columns.x is None
+    else:
+        assert list(columns.x) == x
+    assert list(columns.series) == list(series)
+    for name, expected in series.items():
+        np.testing.assert_array_equal(columns.series[name], np.asarray(expected, dtype=np.float64))
+
+
+@pytest.mark.parametrize("data", [[], "", {"x": [1, 2], "y": [1]}, [{"a": "x"}], {"nested": {"a": 1}}, 3])
+def test_to_columns_rejects_unchartable_data(data):
+    with pytest.raises(ChartDataError):
+        to_columns(data)
+
+
+def test_lttb_keeps_endpoints_and_spikes_within_the_budget():
+    x = np.arange(10_000, dtype=np.float64)
+    y = np.sin(x / 500)
+    y[4321] = 50.0
+    keep = lttb_indices(x, y, 200)
+    assert len(keep) == 200 and keep[0] == 0 and keep[-1] == len(x) - 1
+    assert np.all(np.diff(keep) > 0)
+    assert 4321 in keep
+    np.testing.assert_array_equal(lttb_indices(x[:5], y[:5], 200), np.arange(5))
+
+
+def test_histogram_bins_are_capped_and_ignore_non_finite_values():
+    values = np.concatenate([np.random.default_rng(1).normal(size=100_000), [NAN, np.inf]])
+    counts, edges = histogram_bins(values, 16)
+    assert len(counts) <= 16 and len(edges) == len(counts) + 1
+    assert counts.sum() == 100_000
+    with pytest.raises(ChartDataError):
+        histogram_bins(np.array([NAN]), 16)
+
+
+def test_block_mean_averages_blocks_and_skips_missing_cells():
+    grid = np.arange(16, dtype=np.float64).reshape(4, 4)
+    grid[0, 0] = NAN
+    reduced, fr, fc = block_mean(grid, 2, 2)
+    assert (fr, fc) == (2, 2)
+    np.testing.assert_allclose(reduced, [[(1 + 4 + 5) / 3, 4.5], [10.5, 12.5]])
+    same, fr, fc = block_mean(grid, 10, 10)
+    assert same is grid and (fr, fc) == (1, 1)
+
+
+def test_downsample_line_sorts_drops_missing_and_reports_points():
+    x = np.arange(5000, dtype=np.float64)[::-1].copy()
+    ys = np.cos(x)
+    ys[10] = NAN
+    columns = downsample(to_columns({"x": list(x), "y": list(ys)}), "line", 100, 50)
+    rows = columns.x_index["y"]
+    assert len(rows) == 100 and 10 not in rows
+    assert np.all(np.diff(columns.x[rows]) > 0)
+    assert columns.stats == {"points": 5000, "plotted": 100}
+
+
+def test_downsample_histogram_and_heatmap_fit_the_pixel_budget():
+    hist = downsample(to_columns(list(range(10_000))), "histogram", 40, 10)
+    assert len(hist.bins["value"][0]) <= 10
+    heat = downsample(to_columns({"matrix": np.ones((300, 200)).tolist()}), "heatmap", 50, 30)
+    assert heat.matrix.shape == (30, 50)
+
+
+def test_pie_drops_missing_slices_with_their_labels():
+    columns = downsample(to_columns({"labels": ["a", "b", "c", "d"], "values": [1, None, NAN, 3]}), "pie", 800, 600)
+    assert list(columns.x) == ["a", "d"]
+    np.testing.assert_array_equal(columns.series["value"], [1.0, 3.0])
+    blob, stats = render_chart({"chart_type": "pie", "data": [2, None, 5], "output_format": "png"})
+    assert blob.startswith(b"\x89PNG") and stats["plotted"] == 2
+
+
+@pytest.mark.parametrize("values", [[None, None], [1, math.inf], [1, -2], [0, 0]])
+def test_pie_rejects_values_it_cannot_draw(values):
+    with pytest.raises(ChartDataError):
+        downsample(to_columns(values), "pie", 800, 600)
+
+
+def test_bar_keeps_missing_values_but_rejects_infinite_ones():
+    columns = downsample(to_columns([1, None, 3]), "bar", 800, 600)
+    assert np.isnan(columns.series["value"][1])
+    with pytest.raises(ChartDataError):
+        downsample(to_columns([1, math.inf]), "bar", 800, 600)
+
+
+def test_unchartable_local_pie_is_a_422(monkeypatch):
+    async def render_in_process(spec):
+        blob, stats = render_chart(spec)
+        return blob, 0.0, stats
+
+    monkeypatch.setattr(charts, "render_local", render_in_process)
+    response = TestClient(app).post("/charts/", json={"chart_type": "pie", "data": [None, None], "engine": "local"})
+    assert response.status_code == 422
+    assert "pie has no values" in response.json()["detail"]
+
+
+def test_bar_categories_beyond_the_cap_fold_into_other():
+    n = 100
+    data = {"x": [f"c{i}" for i in range(n)], "y": {"a": [float(i % 50) for i in range(n)], "b": [1.0] * n}}
+    columns = downsample(to_columns(data), "bar", 800, 600, max_categories=10)
+    labels = list(columns.x)
+    assert len(labels) == 10 and labels[-1] == "other"
+    # Nine largest totals, the tie at 46 going to the earlier c45, in their original order
+    assert labels[:-1] == ["c45", "c46", "c47", "c48", "c49", "c96", "c97", "c98", "c99"]
+    for name, ys in columns.series.items():
+        assert ys.sum() == pytest.approx(sum(data["y"][name]))
+    assert columns.stats == {"points": 2 * n, "plotted": 20}
+
+
+def test_unlabeled_pie_folds_small_slices_and_keeps_renderer_labels():
+    columns = downsample(to_columns([1, 50, 2, 40, 3, None]), "pie", 800, 600, max_categories=3)
+    assert list(columns.x) == ["2", "4", "other"]
+    np.testing.assert_array_equal(columns.series["value"], [50.0, 40.0, 6.0])
+
+
+def test_large_bar_chart_renders_capped():
+    n = 20_000
+    blob, stats = render_chart({"chart_type": "bar", "data": list(range(n)), "output_format": "png"})
+    assert blob.startswith(b"\x89PNG")
+    assert stats == {"points": n, "plotted": chart_data.CHART_MAX_CATEGORIES}
+
+
+@pytest.mark.parametrize("output_format", ["png", "jpg", "svg", "pdf"])
+def test_render_round_trips_every_output_format(output_format):
+    blob, _ = render_chart({
+        "chart_type": "line", "data": [3, 1, 4, 1, 5], "title": "Round trip", "output_format": output_format,
+    })
+    if output_format in ("png", "jpg"):
+        from PIL import Image
+
+        image = Image.open(io.BytesIO(blob))
+        assert image.format == {"png": "PNG", "jpg": "JPEG"}[output_format]
+        assert image.size == (int(CHART_WIDTH_IN * CHART_DPI), int(CHART_HEIGHT_IN * CHART_DPI))
+    elif output_format == "svg":
+        root = ElementTree.fromstring(blob)
+        assert root.tag.endswith("svg")
+        assert root.get("width") == f"{CHART_WIDTH_IN * 72:g}pt"
+    else:
+        from pypdf import PdfReader
+
+        page = PdfReader(io.BytesIO(blob)).pages[0]
+        assert float(page.mediabox.width) == pytest.approx(CHART_WIDTH_IN * 72)
+
+
+def test_base64_payload_from_the_remote_renderer_round_trips():
+    blob, _ = render_chart({"chart_type": "bar", "data": [1, 2], "output_format": "png"})
+    encoded = base64.b64encode(blob).decode()
+    fenced = f'```json\n{{"filename": "chart_x.png", "base64": "{encoded}"}}\n```'
+    parsed = charts._parse_base64_payload(fenced)
+    assert parsed["filename"] == "chart_x.png"
+    assert base64.b64decode(parsed["base64"]) == blob
+    assert charts._parse_base64_payload("no chart here") is None
+
+
+def _fallback_client(monkeypatch, local_error, fallback):
+    remote = []
+
+    async def render_local(spec):
+        raise local_error
+
+    async def render_remote(payload, chart_id):
+        remote.append(chart_id)
+        return {"chart_id": chart_id, "engine": "remote"}
+
+    class Ticket:
+        def release(self):
+            pass
+
+    async def acquire(route, model=None):
+        return Ticket()
+
+    monkeypatch.setattr(charts, "render_local", render_local)
+    monkeypatch.setattr(charts, "_render_remote", render_remote)
+    monkeypatch.setattr(charts.admission, "acquire", acquire)
+    monkeypatch.setattr(charts, "CHART_ENGINE", "local")
+    monkeypatch.setattr(charts, "CHART_REMOTE_FALLBACK", fallback)
+    return TestClient(app), remote
+
+
+@pytest.mark.parametrize("local_error", [ChartDataError("odd shape"), RuntimeError("worker died")])
+def test_failed_default_local_render_falls_back_to_remote_when_enabled(monkeypatch, local_error):
+    client, remote = _fallback_client(monkeypatch, local_error, fallback=True)
+    response = client.post("/charts/", json={"chart_type": "bar", "data": [1, 2]})
+    assert response.status_code == 200 and response.json()["engine"] == "remote"
+    # An explicit local request never falls back
+    explicit = client.post("/charts/", json={"chart_type": "bar", "data": [1, 2], "engine": "local"})
+    assert explicit.status_code == (422 if isinstance(local_error, ChartDataError) else 500)
+    assert len(remote) == 1
+
+
+@pytest.mark.parametrize("local_error, status", [(ChartDataError("odd shape"), 422), (RuntimeError("worker died"), 500)])
+def test_disabled_fallback_reports_the_local_failure(monkeypatch, local_error, status):
+    client, remote = _fallback_client(monkeypatch, local_error, fallback=False)
+    response = client.post("/charts/", json={"chart_type": "bar", "data": [1, 2]})
+    assert response.status_code == status and remote == []
@@ -0,0 +1,103 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import chat
+from app.core.admission import Overloaded
+from app.services.response_cache import CachedResponse, ResponseCache
+
+PAYLOAD = {"message": "hi", "model": "gpt-4o-mini"}
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.include_router(chat.router)
+    return TestClient(app)
+
+
+def test_cache_hit_is_served_without_an_admission_slot(monkeypatch):
+    cache = ResponseCache(ttl=60, max_entries=8, max_bytes=1024, enabled=True)
+    monkeypatch.setattr(chat, "response_cache", cache)
+    monkeypatch.setattr(chat, "CHAT_CACHE_ENABLED", True)
+
+    async def overloaded(route, model=None):
+        raise Overloaded(503, "chat: timed out waiting for capacity", 1)
+
+    monkeypatch.setattr(chat.admission, "acquire", overloaded)
+    payload = chat.ChatStreamIn(**PAYLOAD)
+    cache.put(chat._cache_key(payload), CachedResponse(["cached"], "cached", "resp_1", "gpt-4o-mini"))
+
+    with _client() as client:
+        hit = client.post("/chat/stream", json=PAYLOAD)
+        miss = client.post("/chat/stream", json={**PAYLOAD, "message": "other"})
+
+    assert hit.status_code == 200
+    assert '"cached": true' in hit.text and "resp_1" in hit.text
+    assert miss.status_code == 503
+
+
+def test_slot_is_taken_for_the_routed_model(monkeypatch):
+    acquired, pinned = [], []
+
+    class Ticket:
+        def release(self):
+            pass
+
+    async def acquire(route, model=None):
+        acquired.append((route, model))
+        return Ticket()
+
+    async def generator(payload, use_cache=False, candidates=None, ticket=None):
+        pinned.append(candidates)
+        yield b"data: {}\n\n"
+
+    monkeypatch.setattr(chat, "MODEL_ROUTING", True)
+    monkeypatch.setattr(chat.model_router, "candidates", lambda model: ["gpt-4.1-mini", model])
+    monkeypatch.setattr(chat.admission, "acquire", acquire)
+    monkeypatch.setattr(chat, "event_generator_responses", generator)
+
+    with _client() as client:
+        response = client.post("/chat/stream", json={**PAYLOAD, "message": "routed"})
+
+    assert response.status_code == 200
+    assert acquired == [("chat", "gpt-4.1-mini")]
+    assert pinned == [["gpt-4.1-mini", "gpt-4o-mini"]]
+
+
+def test_singleflight_is_scoped_per_caller_and_skips_continuations(monkeypatch):
+    from app.services.singleflight import SingleFlight
+    from app.services.stream_registry import StreamRegistry
+
+    class Ticket:
+        def release(self):
+            pass
+
+    async def acquire(route, model=None):
+        return Ticket()
+
+    async def generator(payload, use_cache=False, candidates=None, ticket=None):
+        yield b"data: {}\n\n"
+
+    flights = SingleFlight(StreamRegistry(grace_s=60, abandon_grace_s=60))
+    attached = []
+    attach = flights.attach
+    monkeypatch.setattr(flights, "attach", lambda key: attached.append(key) or attach(key))
+    monkeypatch.setattr(chat, "chat_flights", flights)
+    monkeypatch.setattr(chat, "CHAT_SINGLEFLIGHT", True)
+    monkeypatch.setattr(chat, "MODEL_ROUTING", False)
+    monkeypatch.setattr(chat.admission, "acquire", acquire)
+    monkeypatch.setattr(chat, "event_generator_responses", generator)
+
+    body = {**PAYLOAD, "message": "same question"}
+    with _client() as client:
+        for user in ("alice", "bob", "alice"):
+            assert client.post("/chat/stream", json=body, headers={"X-User-Id": user}).status_code == 200
+        before_continuation = len(attached)
+        continued = client.post(
+            "/chat/stream", json={**body, "previous_response_id": "resp_1"}, headers={"X-User-Id": "alice"}
+        )
+
+    assert continued.status_code == 200
+    assert len(attached) == before_continuation
+    alice = {key for key in attached if key.startswith("alice")}
+    bob = {key for key in attached if key.startswith("bob")}
+    assert len(alice) == 1 and len(bob) == 1 and alice != bob
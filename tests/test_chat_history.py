@@ -0,0 +1,60 @@
+from app.services.chat_history import ChatHistory, _Entry
+
+
+def _entry(response_id, previous=None, text="hi"):
+    return _Entry(response_id, previous, text, f"re: {text}", "m", 0.0, None)
+
+
+def _chain(history, n, prefix="r"):
+    previous = None
+    for i in range(n):
+        history.put(_entry(f"{prefix}{i}", previous))
+        previous = f"{prefix}{i}"
+
+
+def test_put_get_and_hit_rate():
+    history = ChatHistory(max_entries=100, max_bytes=1 << 20, ttl=60, shards=4)
+    history.put(_entry("a"))
+    assert history.get("a").user_text == "hi"
+    assert history.get("missing") is None
+    stats = history.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_expired_entries_are_dropped():
+    history = ChatHistory(max_entries=100, max_bytes=1 << 20, ttl=60, shards=1)
+    history.put(_entry("a"))
+    history.peek("a").stored_at -= 120
+    assert history.get("a") is None
+    assert history.stats()["expirations"] == 1 and len(history) == 0
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    history = ChatHistory(max_entries=3, max_bytes=1 << 20, ttl=60, shards=1)
+    for rid in "abc":
+        history.put(_entry(rid))
+    history.get("a")
+    history.put(_entry("d"))
+    assert history.peek("b") is None and history.peek("a") is not None
+
+    small = ChatHistory(max_entries=100, max_bytes=600, ttl=60, shards=1)
+    for rid in "abcd":
+        small.put(_entry(rid, text="x" * 50))
+    assert small.stats()["bytes"] <= 600 and small.stats()["evictions"] > 0
+
+
+def test_resaved_exchange_keeps_its_place_and_bumps_generation():
+    history = ChatHistory(max_entries=100, max_bytes=1 << 20, ttl=60, shards=2)
+    _chain(history, 3)
+    generation = history.generation
+    history.put(_entry("r1", "r0", text="edited"))
+    assert history.generation == generation + 1
+    assert history.peek("r1").seq == 1 and history.peek("r1").user_text == "edited"
+
+
+def test_threads_are_dropped_with_their_last_entry():
+    history = ChatHistory(max_entries=2, max_bytes=1 << 20, ttl=60, shards=1)
+    history.put(_entry("a"))
+    history.put(_entry("b"))
+    history.put(_entry("c"))
+    assert history.stats()["threads"] == 2
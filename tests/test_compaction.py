@@ -0,0 +1,41 @@
+import asyncio
+import sys
+import types
+
+from app.services import compaction
+
+
+def _reset(monkeypatch, get_encoding):
+    calls = []
+
+    def wrapped(name):
+        calls.append(name)
+        return get_encoding(name)
+
+    monkeypatch.setitem(sys.modules, "tiktoken", types.SimpleNamespace(get_encoding=wrapped))
+    monkeypatch.setattr(compaction, "_ENCODING", None)
+    monkeypatch.setattr(compaction, "_ENCODING_LOADED", False)
+    return calls
+
+
+def test_failed_tokenizer_load_falls_back_once(monkeypatch):
+    def offline(name):
+        raise OSError("no network")
+
+    calls = _reset(monkeypatch, offline)
+    assert asyncio.run(compaction.warm_encoding()) is False
+    assert asyncio.run(compaction.warm_encoding()) is False
+    assert calls == ["o200k_base"]
+    assert compaction.estimate_tokens("hello, world") == 5
+
+
+def test_loaded_tokenizer_is_used(monkeypatch):
+    class Encoding:
+        def encode(self, text, disallowed_special=()):
+            return list(text)
+
+    _reset(monkeypatch, lambda name: Encoding())
+    assert compaction.estimate_tokens("hello") == 2
+    assert asyncio.run(compaction.warm_encoding()) is True
+    assert compaction.estimate_tokens("hello") == 5
+    assert compaction.estimate_tokens(None) == 0
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import os
+import tempfile
+from types import SimpleNamespace
+
+from app.services.dataset_uploads import DatasetUploads, store_dataset
+
+
+class FakeFiles:
+    """client.files stand-in: ids stay live until ``delete`` is called"""
+
+    def __init__(self):
+        self.created = []
+        self.retrieved = []
+        self.live = set()
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def create(self, file, purpose, expires_after):
+        await self.gate.wait()
+        file_id = f"file-{len(self.created)}"
+        self.created.append({"file": file, "purpose": purpose, "expires_after": expires_after})
+        self.live.add(file_id)
+        return SimpleNamespace(id=file_id)
+
+    async def retrieve(self, file_id):
+        self.retrieved.append(file_id)
+        if file_id not in self.live:
+            raise LookupError(f"No such File object: {file_id}")
+        return SimpleNamespace(id=file_id)
+
+    def delete(self, file_id):
+        self.live.discard(file_id)
+
+
+def _uploads(directory, **kwargs):
+    files = FakeFiles()
+    uploads = DatasetUploads(files, path=os.path.join(directory, "uploads.json"), **kwargs)
+    return files, uploads
+
+
+def _age(uploads, seconds, field="checked_at"):
+    for entry in uploads._load().values():
+        entry[field] -= seconds
+
+
+def test_identical_content_is_uploaded_once_and_survives_a_restart():
+    async def run(directory):
+        files, uploads = _uploads(directory, ttl_s=3600, revalidate_s=600)
+        first = await uploads.file_id(b"x,y\n1,2\n", "csv")
+        second = await uploads.file_id(b"x,y\n1,2\n", "csv")
+        # A new process reads the persisted index instead of uploading again
+        restarted = DatasetUploads(files, path=uploads.path, ttl_s=3600, revalidate_s=600)
+        third = await restarted.file_id(b"x,y\n1,2\n", "csv")
+        return files, first, second, third, uploads.stats()
+
+    with tempfile.TemporaryDirectory() as directory:
+        files, first, second, third, stats = asyncio.run(run(directory))
+    assert first == ("file-0", False) and second == ("file-0", True) and third == ("file-0", True)
+    assert len(files.created) == 1 and files.retrieved == []
+    created = files.created[0]
+    assert created["file"][0].endswith(".csv") and created["file"][2] == "text/csv"
+    assert created["expires_after"] == {"anchor": "created_at", "seconds": 3600}
+    assert stats["hits"] == 1 and stats["uploads"] == 1
+
+
+def test_revalidation_reuploads_a_file_that_is_gone():
+    async def run(directory):
+        files, uploads = _uploads(directory, ttl_s=86400, revalidate_s=60)
+        data = b"[1, 2, 3]"
+        await uploads.file_id(data, "json")
+        _age(uploads, 120)
+        still_there = await uploads.file_id(data, "json")
+        files.delete("file-0")
+        _age(uploads, 120)
+        replaced = await uploads.file_id(data, "json")
+        return files, still_there, replaced, uploads.stats()
+
+    with tempfile.TemporaryDirectory() as directory:
+        files, still_there, replaced, stats = asyncio.run(run(directory))
+    assert still_there == ("file-0", True)
+    assert replaced == ("file-1", False)
+    assert files.retrieved == ["file-0", "file-0"]
+    assert stats["revalidations"] == 2 and stats["invalidations"] == 1 and stats["uploads"] == 2
+
+
+def test_entries_expire_with_their_files():
+    async def run(directory):
+        files, uploads = _uploads(directory, ttl_s=1000, revalidate_s=100)
+        await uploads.file_id(b"a", "txt")
+        # Inside the safety margin before expiry: never handed out, not even checked
+        _age(uploads, 950, "uploaded_at")
+        renewed = await uploads.file_id(b"a", "txt")
+        await uploads.file_id(b"b", "txt")
+        for entry in uploads._load().values():
+            entry["uploaded_at"] -= 2000
+        await uploads.file_id(b"c", "txt")
+        with open(uploads.path, encoding="utf-8") as fh:
+            persisted = json.load(fh)
+        return files, renewed, persisted
+
+    with tempfile.TemporaryDirectory() as directory:
+        files, renewed, persisted = asyncio.run(run(directory))
+    assert renewed == ("file-1", False) and files.retrieved == []
+    # Expired entries are pruned from the index when it is next saved
+    assert [entry["file_id"] for entry in persisted.values()] == ["file-3"]
+
+
+def test_concurrent_identical_uploads_share_one_create():
+    async def run(directory):
+        files, uploads = _uploads(directory)
+        files.gate.clear()
+        leader = asyncio.ensure_future(uploads.file_id(b"same", "csv"))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(uploads.file_id(b"same", "csv")) for _ in range(4)]
+        await asyncio.sleep(0)
+        # A caller that goes away does not take the upload down with it
+        leader.cancel()
+        files.gate.set()
+        results = await asyncio.gather(*followers)
+        return files, leader, results, uploads.stats()
+
+    with tempfile.TemporaryDirectory() as directory:
+        files, leader, results, stats = asyncio.run(run(directory))
+    assert leader.cancelled()
+    assert results == [("file-0", True)] * 4
+    assert len(files.created) == 1 and stats["entries"] == 1
+
+
+def test_local_copy_keeps_the_dataset_extension():
+    with tempfile.TemporaryDirectory() as directory:
+        digest, path, written = store_dataset(b"x,y\n1,2\n", directory, "csv")
+        again = store_dataset(b"x,y\n1,2\n", directory, "csv")
+        as_json = store_dataset(b"[1]", directory, "json")
+    assert path.endswith(f"data_{digest[:16]}.csv") and written
+    assert again == (digest, path, False)
+    assert as_json[1].endswith(".json")
@@ -0,0 +1,99 @@
+import asyncio
+import os
+import tempfile
+
+import numpy as np
+
+from app.services.embedding_store import EmbeddingStore
+from app.services.embeddings import CachedEmbedder, HashingEmbedder
+
+
+def _vectors(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def test_put_get_round_trip_and_missing_positions():
+    with tempfile.TemporaryDirectory() as directory:
+        store = EmbeddingStore("t", 8, directory)
+        vectors = _vectors(2, 8)
+        assert store.put(["a", "b"], vectors) == 2
+
+        out, missing = store.get(["b", "x", "a"])
+        assert missing == [1]
+        np.testing.assert_array_equal(out[0], vectors[1])
+        np.testing.assert_array_equal(out[2], vectors[0])
+        assert not out[1].any()
+
+
+def test_put_skips_stored_and_repeated_texts():
+    with tempfile.TemporaryDirectory() as directory:
+        store = EmbeddingStore("t", 4, directory)
+        store.put(["a"], _vectors(1, 4))
+        assert store.put(["a", "b", "b"], _vectors(3, 4, seed=1)) == 1
+        assert len(store) == 2
+
+
+def test_new_instance_maps_existing_files():
+    with tempfile.TemporaryDirectory() as directory:
+        vectors = _vectors(1500, 4)
+        texts = [f"text {i}" for i in range(1500)]
+        # Enough rows to force at least one table rebuild
+        EmbeddingStore("t", 4, directory).put(texts, vectors)
+
+        reopened = EmbeddingStore("t", 4, directory)
+        out, missing = reopened.get(texts)
+        assert missing == []
+        np.testing.assert_array_equal(out, vectors)
+        assert reopened.stats()["table_slots"] >= 1500 * 2
+
+
+def test_torn_row_is_dropped_before_append():
+    with tempfile.TemporaryDirectory() as directory:
+        store = EmbeddingStore("t", 4, directory)
+        store.put(["a"], _vectors(1, 4))
+        with open(store.data_path, "ab") as fh:
+            fh.write(b"\x00" * 6)
+
+        b = _vectors(1, 4, seed=2)
+        store.put(["b"], b)
+        assert os.path.getsize(store.data_path) == 2 * store.row_bytes
+        np.testing.assert_array_equal(store.get(["b"])[0][0], b[0])
+
+
+class _CountingEmbedder(HashingEmbedder):
+    def __init__(self) -> None:
+        super().__init__(dim=16)
+        self.calls = []
+
+    async def embed(self, texts):
+        self.calls.append(list(texts))
+        return await super().embed(texts)
+
+
+def test_cached_embedder_only_embeds_misses():
+    with tempfile.TemporaryDirectory() as directory:
+        inner = _CountingEmbedder()
+        cached = CachedEmbedder(inner)
+        cached.store = EmbeddingStore("emb-test", 16, directory)
+
+        first = asyncio.run(cached.embed(["alpha", "beta"]))
+        second = asyncio.run(cached.embed(["beta", "gamma", "alpha"]))
+
+        assert inner.calls == [["alpha", "beta"], ["gamma"]]
+        np.testing.assert_array_equal(second[0], first[1])
+        np.testing.assert_array_equal(second[2], first[0])
+
+
+def test_vectorized_table_build_places_colliding_keys_for_probing():
+    slots = 1024
+    rng = np.random.default_rng(3)
+    # Force long collision chains: many keys share a handful of home slots
+    homes = rng.integers(0, 8, 500)
+    keys = (rng.integers(1, 2**40, 500) * slots + homes) | 1
+    keys = np.unique(keys)
+    rows = np.arange(keys.shape[0], dtype=np.int64)
+    table = EmbeddingStore._build_table(keys, rows, slots)
+    assert (table[:, 0] != 0).sum() == keys.shape[0]
+    np.testing.assert_array_equal(EmbeddingStore._probe(table, keys), rows)
+    absent = np.array([slots * 7 + 3, 5], dtype=np.int64)
+    assert (EmbeddingStore._probe(table, absent) == -1).all()
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import tempfile
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.models import Base, Message, Thread
+from app.services.chat_history import _Entry
+from app.services.history_writer import HistoryWriter, db_id
+
+
+def _entries(n, prefix="r"):
+    out, previous = [], None
+    for i in range(n):
+        entry = _Entry(f"{prefix}{i}", previous, f"q{i}", f"a{i}", "m", 1_700_000_000 + i, None)
+        entry.thread_id, entry.seq = f"{prefix}0", i
+        out.append(entry)
+        previous = entry.response_id
+    return out
+
+
+async def _engine(directory, create=True):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory, 'history.db')}")
+    if create:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    return engine
+
+
+async def _count(engine, model):
+    async with engine.connect() as conn:
+        return (await conn.execute(select(func.count()).select_from(model))).scalar_one()
+
+
+def test_entries_are_flushed_in_batches_and_resaves_are_noops():
+    async def run(directory):
+        engine = await _engine(directory)
+        writer = HistoryWriter(enabled=True, interval=0.01, batch_size=2)
+        writer._engine = engine
+        entries = _entries(3)
+        writer.enqueue_many(entries)
+        writer.enqueue(entries[0])
+        await asyncio.sleep(0.1)
+        counts = await _count(engine, Thread), await _count(engine, Message)
+        async with engine.connect() as conn:
+            thread = (await conn.execute(select(Thread).where(Thread.id == db_id("r0")))).one()
+        await engine.dispose()
+        return counts, thread, writer.stats()
+
+    with tempfile.TemporaryDirectory() as directory:
+        (threads, messages), thread, stats = asyncio.run(run(directory))
+    assert (threads, messages) == (1, 6)
+    assert thread.meta["head_response_id"] == "r0"
+    assert stats["pending"] == 0 and stats["batches"] == 2 and stats["flushed_entries"] == 4
+
+
+def test_failed_flush_keeps_entries_until_drain():
+    async def run(directory):
+        broken = await _engine(directory, create=False)
+        writer = HistoryWriter(enabled=True, interval=0.01, batch_size=10)
+        writer._engine = broken
+        writer.enqueue_many(_entries(2))
+        await asyncio.sleep(0.05)
+        failed = writer.stats()
+
+        writer._engine = await _engine(directory)
+        await writer.drain()
+        messages = await _count(writer._engine, Message)
+        await writer._engine.dispose()
+        await broken.dispose()
+        return failed, writer.stats(), messages
+
+    with tempfile.TemporaryDirectory() as directory:
+        failed, drained, messages = asyncio.run(run(directory))
+    assert failed["failures"] >= 1 and failed["pending"] == 2 and failed["last_error"]
+    assert drained["pending"] == 0 and messages == 4
+
+
+def test_queue_drops_oldest_beyond_its_bound():
+    async def run():
+        writer = HistoryWriter(enabled=True, interval=60, batch_size=100, max_pending=2)
+        writer.enqueue_many(_entries(3))
+        stats = writer.stats()
+        writer._task.cancel()
+        return stats, [e.response_id for e in writer._pending]
+
+    stats, pending = asyncio.run(run())
+    assert stats["dropped"] == 1 and pending == ["r1", "r2"]
+
+
+def test_disabled_writer_ignores_entries():
+    writer = HistoryWriter(enabled=False)
+    writer.enqueue_many(_entries(2))
+    assert writer.stats()["pending"] == 0
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import tempfile
+
+from app.services import ingestion, retrieval
+from app.services.embeddings import HashingEmbedder, set_embedder
+
+
+def _restart() -> None:
+    """Forget the in-process index as a fresh worker would"""
+    retrieval._INDEX = None
+    ingestion._LOADED = False
+
+
+def test_chunk_text_overlaps_windows():
+    words = " ".join(str(i) for i in range(10))
+    chunks = ingestion.chunk_text(words, size=4, overlap=1)
+    assert chunks == ["0 1 2 3", "3 4 5 6", "6 7 8 9"]
+    assert ingestion.chunk_text("   ") == []
+
+
+def test_restore_index_after_restart_without_ingest():
+    set_embedder(HashingEmbedder(dim=64))
+    _restart()
+    with tempfile.TemporaryDirectory() as storage:
+        with open(os.path.join(storage, "data_a.txt"), "w", encoding="utf-8") as fh:
+            fh.write("the nightly backup runs at two in the morning")
+        with open(os.path.join(storage, "data_b.json"), "w", encoding="utf-8") as fh:
+            fh.write('[{"city": "Oslo", "sales": 10}]')
+
+        try:
+            stats = asyncio.run(ingestion.ingest_directory(storage))
+            again = asyncio.run(ingestion.ingest_directory(storage))
+        finally:
+            ingestion.shutdown_pool()
+    assert stats["files_indexed"] == 2 and stats["index_size"] == 2
+    assert again["files_unchanged"] == 2 and again["chunks_new"] == 0
+
+    _restart()
+    assert len(retrieval.get_index()) == 0
+    assert asyncio.run(ingestion.restore_index()) == 2
+
+    hits, _ = asyncio.run(retrieval.retrieve("when does the backup run", k=1))
+    assert hits[0]["metadata"]["source"] == "data_a.txt"
+
+
+def test_failed_files_are_retried_on_the_next_run():
+    set_embedder(HashingEmbedder(dim=64))
+    _restart()
+    with tempfile.TemporaryDirectory() as storage:
+        with open(os.path.join(storage, "data_ok.txt"), "w", encoding="utf-8") as fh:
+            fh.write("quarterly targets were met")
+        with open(os.path.join(storage, "data_bad.pdf"), "wb") as fh:
+            fh.write(b"not a pdf at all")
+
+        try:
+            first = asyncio.run(ingestion.ingest_directory(storage))
+            second = asyncio.run(ingestion.ingest_directory(storage))
+        finally:
+            ingestion.shutdown_pool()
+        manifest = ingestion._load_manifest()
+    assert first["files_failed"] == 1 and first["files_indexed"] == 1
+    assert second["files_failed"] == 1 and second["files_unchanged"] == 1
+    assert set(manifest["files"]) == {"data_ok.txt"}
@@ -0,0 +1,101 @@
+import json
+import random
+
+import pytest
+
+from app.services.json_stream import IncrementalJSONParser
+
+DOCUMENT = {
+    "title": "Q3 \"revenue\" \\ report é中",
+    "escaped": "line\nbreak \\\" tab\t 😀",
+    "rows": [{"region": "EU", "value": 12.5}, {"region": "US", "value": -3e2}, {"region": "", "value": 0}],
+    "flags": [True, False, None],
+    "nested": {"empty_list": [], "empty_object": {}, "deep": [[1, [2, {"x": [3]}]]]},
+    "count": 1234567890,
+}
+
+
+def _parse(text, chunk_sizes):
+    parser = IncrementalJSONParser()
+    events, pos = [], 0
+    for size in chunk_sizes:
+        events += parser.feed(text[pos:pos + size])
+        pos += size
+    events += parser.feed(text[pos:])
+    events += parser.close()
+    return parser, events
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_every_split_of_the_document_parses_the_same(indent):
+    text = json.dumps(DOCUMENT, ensure_ascii=False, indent=indent)
+    rng = random.Random(7)
+    splits = [[1] * len(text), [2] * (len(text) // 2)]
+    splits += [[rng.randint(1, 12) for _ in range(len(text))] for _ in range(20)]
+    for sizes in splits:
+        parser, events = _parse(text, sizes)
+        assert parser.done and parser.value == DOCUMENT
+        assert events[-1] == ((), DOCUMENT)
+
+
+def test_numbers_literals_and_escapes_split_at_every_offset():
+    text = '[-12.5e+3, 0, true, null, false, "a\\\\\\"b\\u00e9", 7]'
+    expected = json.loads(text)
+    for cut in range(1, len(text)):
+        parser, _ = _parse(text, [cut])
+        assert parser.value == expected, cut
+
+
+def test_events_report_members_innermost_first_with_their_paths():
+    parser = IncrementalJSONParser()
+    events = parser.feed('{"a": [1, {"b": "x"}], "c": null}')
+    assert events == [
+        (("a", 0), 1),
+        (("a", 1, "b"), "x"),
+        (("a", 1), {"b": "x"}),
+        (("a",), [1, {"b": "x"}]),
+        (("c",), None),
+        ((), {"a": [1, {"b": "x"}], "c": None}),
+    ]
+
+
+def test_partial_value_fills_in_as_members_complete():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"rows": [{"v": 1}, {"v": ') == [(("rows", 0, "v"), 1), (("rows", 0), {"v": 1})]
+    assert parser.value == {"rows": [{"v": 1}, {}]} and not parser.done
+    parser.feed('2}], "title": "Sal')
+    # Strings only appear once their closing quote has arrived
+    assert parser.value == {"rows": [{"v": 1}, {"v": 2}]}
+    parser.feed('es"}')
+    assert parser.done and parser.value["title"] == "Sales"
+
+
+def test_top_level_number_is_flushed_by_close():
+    parser = IncrementalJSONParser()
+    assert parser.feed("4") == [] and parser.feed("2") == []
+    assert parser.close() == [((), 42)]
+    assert parser.done and parser.value == 42
+
+
+@pytest.mark.parametrize("text, message", [
+    ('{"a" 1}', "expected ':'"),
+    ("[1 2]", "expected ',' or ']'"),
+    ("{1: 2}", "expected object key"),
+    ("[01]", "unexpected character"),
+    ("[tru]", "unexpected character"),
+    ("[-]", "unexpected character"),
+    ("{} []", "trailing data"),
+])
+def test_malformed_documents_raise_with_the_offset(text, message):
+    parser = IncrementalJSONParser()
+    with pytest.raises(ValueError, match=message):
+        parser.feed(text)
+        parser.close()
+
+
+@pytest.mark.parametrize("text", ['{"a": [1, 2', '"unterminated', ""])
+def test_close_rejects_incomplete_documents(text):
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    with pytest.raises(ValueError, match="incomplete JSON document"):
+        parser.close()
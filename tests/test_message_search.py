@@ -0,0 +1,134 @@
+import asyncio
+import importlib.util
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, insert, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import app.db.session as db_session
+from app.db.models import Base, Message, Thread
+from app.main import app
+from app.services.message_search import fts5_query, search_messages
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIGRATION = os.path.join(ROOT, "alembic", "versions", "b4e8f2c91d07_messages_full_text_search.py")
+
+
+def _upgrade(sync_conn):
+    spec = importlib.util.spec_from_file_location("fts_migration", MIGRATION)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    with Operations.context(MigrationContext.configure(sync_conn)):
+        module.upgrade()
+
+
+def _rows():
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    threads = [{"id": t, "title": t, "created_at": start, "updated_at": start} for t in ("t1", "t2")]
+    messages = [
+        ("m1", "t1", "user", "How do I rotate the database credentials?"),
+        ("m2", "t1", "assistant", "Rotate the credentials from the admin console, then restart."),
+        ("m3", "t2", "user", "Which database engine do we run in staging?"),
+        ("m4", "t2", "assistant", "Staging runs Postgres 16 with a nightly database snapshot."),
+        ("m5", "t2", "user", "Thanks, that's all."),
+    ]
+    return threads, [
+        {"id": m, "thread_id": t, "role": role, "content": content,
+         "created_at": start + timedelta(minutes=i), "meta": {"response_id": f"resp_{m}"}}
+        for i, (m, t, role, content) in enumerate(messages)
+    ]
+
+
+def _search(monkeypatch, scenario):
+    async def run(directory):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory, 'search.db')}")
+        threads, messages = _rows()
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(Thread.__table__), threads)
+            await conn.run_sync(_upgrade)
+            # Rows written after the migration reach the index through the triggers
+            await conn.execute(insert(Message.__table__), messages)
+        monkeypatch.setattr(db_session, "engine", engine)
+        try:
+            return await scenario(engine)
+        finally:
+            await engine.dispose()
+
+    with tempfile.TemporaryDirectory() as directory:
+        return asyncio.run(run(directory))
+
+
+def _ids(page):
+    return [hit["message_id"] for hit in page["results"]]
+
+
+def test_fts5_query_quotes_every_term_and_prefixes_the_last():
+    assert fts5_query("rotate creds") == '"rotate" "creds"*'
+    # Operators, quotes and column filters are plain words, never FTS syntax
+    assert fts5_query('foo" OR content:bar NEAR(x*') == '"foo" "OR" "content" "bar" "NEAR" "x"*'
+    assert fts5_query("  ?!* ") == ""
+
+
+def test_search_ranks_matches_with_snippets_and_prefix_on_last_term(monkeypatch):
+    async def scenario(engine):
+        return await search_messages("datab"), await search_messages("?!"), await search_messages('"database" OR')
+
+    page, empty, quoted = _search(monkeypatch, scenario)
+    assert sorted(_ids(page)) == ["m1", "m3", "m4"]
+    scores = [hit["score"] for hit in page["results"]]
+    assert scores == sorted(scores, reverse=True)
+    assert page["next_offset"] is None
+    hit = next(hit for hit in page["results"] if hit["message_id"] == "m4")
+    assert hit["response_id"] == "resp_m4" and hit["thread_id"] == "t2" and hit["role"] == "assistant"
+    assert "<b>database</b>" in hit["snippet"]
+    assert empty["results"] == [] and empty["took_ms"] == 0.0
+    assert quoted["results"] == []  # "OR" is a required word, not an operator
+
+
+def test_search_paginates_and_filters_by_thread_and_role(monkeypatch):
+    async def scenario(engine):
+        first = await search_messages("database", limit=2)
+        second = await search_messages("database", limit=2, offset=first["next_offset"])
+        by_thread = await search_messages("database", thread_id="t2")
+        by_role = await search_messages("database", role="user")
+        both = await search_messages("database", thread_id="t2", role="assistant")
+        return first, second, by_thread, by_role, both
+
+    first, second, by_thread, by_role, both = _search(monkeypatch, scenario)
+    assert len(first["results"]) == 2 and first["next_offset"] == 2
+    assert len(second["results"]) == 1 and second["next_offset"] is None
+    assert set(_ids(first)) | set(_ids(second)) == {"m1", "m3", "m4"}
+    assert sorted(_ids(by_thread)) == ["m3", "m4"]
+    assert sorted(_ids(by_role)) == ["m1", "m3"]
+    assert _ids(both) == ["m4"]
+
+
+def test_triggers_keep_the_index_in_sync_on_update_and_delete(monkeypatch):
+    async def scenario(engine):
+        async with engine.begin() as conn:
+            await conn.execute(update(Message.__table__).where(Message.id == "m5").values(content="Snapshot restore worked"))
+            await conn.execute(delete(Message.__table__).where(Message.id == "m4"))
+        return await search_messages("snapshot"), await search_messages("thanks")
+
+    snapshot, old = _search(monkeypatch, scenario)
+    assert _ids(snapshot) == ["m5"]
+    assert old["results"] == []
+
+
+def test_missing_index_is_a_503(monkeypatch):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "old.db")
+        # A database still at the previous revision: messages, but no messages_fts
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE TABLE messages (id TEXT PRIMARY KEY, thread_id TEXT, role TEXT, content TEXT)")
+        monkeypatch.setattr(db_session, "engine", create_async_engine(f"sqlite+aiosqlite:///{path}"))
+        response = TestClient(app).get("/search/messages", params={"q": "database"})
+    assert response.status_code == 503
+    assert "alembic upgrade head" in response.json()["detail"]
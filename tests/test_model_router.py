@@ -0,0 +1,178 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.api import chat
+from app.core import admission as admission_module
+from app.core import model_router as router_module
+from app.core.admission import AdmissionController, Overloaded
+from app.core.model_router import AllCandidatesFailed, ModelRouter, ModelStats
+
+
+class FakeStream:
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+
+    def __aiter__(self):
+        return self._events()
+
+    async def _events(self):
+        if self.behaviour == "stall":
+            await asyncio.sleep(10)
+        if self.behaviour == "error":
+            yield SimpleNamespace(type="response.error", error=SimpleNamespace(message="boom"))
+            return
+        yield SimpleNamespace(type="response.output_text.delta", delta=self.model)
+        yield SimpleNamespace(type="response.completed")
+
+    async def get_final_response(self):
+        return SimpleNamespace(id=f"resp_{self.model}", output_text=self.model, model=self.model)
+
+
+class FakeManager:
+    def __init__(self, responses, model):
+        self.responses = responses
+        self.model = model
+
+    async def __aenter__(self):
+        stream = FakeStream(self.responses.behaviour[self.model])
+        stream.model = self.model
+        return stream
+
+    async def __aexit__(self, *exc):
+        self.responses.closed.append(self.model)
+
+
+class FakeResponses:
+    def __init__(self, **behaviour):
+        self.behaviour = behaviour
+        self.opened, self.closed = [], []
+
+    def stream(self, **request):
+        self.opened.append(request["model"])
+        return FakeManager(self, request["model"])
+
+
+@pytest.fixture
+def responses(monkeypatch):
+    fake = FakeResponses()
+    monkeypatch.setattr(router_module, "client", SimpleNamespace(responses=fake, base_url="http://fake/"))
+    monkeypatch.setattr(router_module, "MODEL_FIRST_DELTA_DEADLINE_MS", 50)
+    monkeypatch.setattr(router_module, "MODEL_STATS_HALF_LIFE_S", 0)
+    return fake
+
+
+def _route(router, candidates, charge=None):
+    async def run():
+        async with router.stream({"model": candidates[0]}, candidates, charge) as stream:
+            return stream.decision, [e.delta async for e in stream if e.type == "response.output_text.delta"]
+
+    return asyncio.run(run())
+
+
+def test_fails_over_before_the_first_delta(responses):
+    responses.behaviour.update(a="stall", b="error", c="ok")
+    router = ModelRouter({})
+    decision, deltas = _route(router, ["a", "b", "c"])
+
+    assert deltas == ["c"]
+    assert decision["model"] == "c" and decision["failed_over"]
+    assert [a["outcome"] for a in decision["attempts"]] == ["stalled", "error", "ok"]
+    assert responses.closed == ["a", "b", "c"]
+    assert router.failovers == 2
+    assert router.stats_for("a").failures == 1 and router.stats_for("c").failures == 0
+
+
+def test_last_candidate_gets_the_deadline_too(responses):
+    responses.behaviour.update(a="error", b="stall")
+    router = ModelRouter({})
+
+    async def run():
+        try:
+            async with router.stream({"model": "a"}, ["a", "b"]):
+                pass
+        except AllCandidatesFailed as e:
+            return e
+        raise AssertionError("expected AllCandidatesFailed")
+
+    error = asyncio.run(asyncio.wait_for(run(), 2))
+    assert [a["outcome"] for a in error.decision["attempts"]] == ["error", "stalled"]
+    assert "a error" in str(error) and "b stalled" in str(error)
+
+
+def test_charge_follows_the_model_and_skips_models_without_capacity(responses):
+    responses.behaviour.update(a="error", b="ok", c="ok")
+    charged = []
+
+    async def charge(model):
+        charged.append(model)
+        if model == "b":
+            raise Overloaded(503, "model:b: timed out waiting for capacity", 1)
+
+    decision, deltas = _route(ModelRouter({}), ["a", "b", "c"], charge)
+    assert charged == ["a", "b", "c"]
+    assert responses.opened == ["a", "c"]
+    assert [a["outcome"] for a in decision["attempts"]] == ["error", "no_capacity", "ok"]
+    assert deltas == ["c"]
+
+
+def test_ewma_moves_toward_samples_and_errors(monkeypatch):
+    monkeypatch.setattr(router_module, "MODEL_STATS_HALF_LIFE_S", 0)
+    stats = ModelStats()
+    prior = stats.ttft_ms
+    stats.record(100.0, failed=False)
+    assert stats.ttft_ms == pytest.approx(prior + router_module.MODEL_EWMA_ALPHA * (100.0 - prior))
+    assert stats.errors == 0
+    stats.record(None, failed=True)
+    assert stats.errors == pytest.approx(router_module.MODEL_EWMA_ALPHA)
+    assert stats.score() == pytest.approx(stats.ttft_ms * (1 + router_module.MODEL_ERROR_PENALTY * stats.errors))
+
+
+def test_candidates_keep_the_requested_model_unless_much_worse(responses):
+    router = ModelRouter({m: ["a", "b", "c"] for m in "abc"})
+    router.stats_for("a").ttft_ms = 1000
+    router.stats_for("b").ttft_ms = 800
+    router.stats_for("c").ttft_ms = 3000
+    assert router.candidates("a") == ["a", "b", "c"]
+    assert router.candidates("c") == ["b", "a", "c"]
+    # Errors push the requested model behind the best alternative
+    router.stats_for("a").errors = 0.5
+    assert router.candidates("a") == ["b", "a", "c"]
+    assert router.candidates("unknown") == ["unknown"]
+
+
+def test_switch_model_moves_the_slot(monkeypatch):
+    monkeypatch.setattr(admission_module, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(admission_module, "MODEL_LIMITS", {"full": 1})
+    controller = AdmissionController()
+
+    async def run():
+        ticket = await controller.acquire("chat", "a")
+        await controller.switch_model(ticket, "b")
+        moved = (controller.models["a"].in_use, controller.models["b"].in_use)
+        blocker = await controller.acquire("chat", "full")
+        with pytest.raises(Overloaded):
+            await controller.switch_model(ticket, "full")
+        kept = controller.models["b"].in_use
+        ticket.release()
+        blocker.release()
+        return moved, kept, controller.models["b"].in_use, controller.routes["chat"].in_use
+
+    assert asyncio.run(run()) == ((0, 1), 1, 0, 0)
+
+
+def test_chat_emits_an_error_event_when_every_candidate_fails(responses, monkeypatch):
+    responses.behaviour.update(a="stall", b="error")
+    monkeypatch.setattr(chat, "MODEL_ROUTING", True)
+    monkeypatch.setattr(chat, "model_router", ModelRouter({}))
+    payload = chat.ChatStreamIn(message="hi", model="a")
+
+    async def run():
+        return [frame async for frame in chat.event_generator_responses(payload, candidates=["a", "b"])]
+
+    frames = asyncio.run(run())
+    events = [json.loads(line[len(b"data: "):]) for f in frames for line in f.splitlines() if line.startswith(b"data: ")]
+    assert len(events) == 1 and events[0]["type"] == "error"
+    assert [a["outcome"] for a in events[0]["routing"]["attempts"]] == ["stalled", "error"]
@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.core import openai_client
+from app.core.openai_client import get_with_retries, hedged, transport_stats
+
+
+def test_fast_call_is_not_hedged():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return "ok"
+
+    assert asyncio.run(hedged(call, after_ms=50)) == "ok"
+    assert calls == [1]
+
+
+def test_slow_call_is_hedged_after_the_delay_and_the_loser_cancelled():
+    events = []
+
+    async def call():
+        attempt = len(events)
+        events.append(("start", attempt, time.perf_counter()))
+        try:
+            await asyncio.sleep(5 if attempt == 0 else 0.01)
+        except asyncio.CancelledError:
+            events.append(("cancelled", attempt, time.perf_counter()))
+            raise
+        return f"attempt {attempt}"
+
+    async def run():
+        started = time.perf_counter()
+        result = await hedged(call, after_ms=50)
+        await asyncio.sleep(0)
+        return started, result
+
+    before = dict(openai_client._HEDGE_STATS)
+    started, result = asyncio.run(run())
+    assert result == "attempt 1"
+    starts = [at for kind, _, at in events if kind == "start"]
+    assert len(starts) == 2 and 0.04 <= starts[1] - started < 1
+    assert [(kind, attempt) for kind, attempt, _ in events if kind == "cancelled"] == [("cancelled", 0)]
+    assert openai_client._HEDGE_STATS["hedged"] == before["hedged"] + 1
+    assert openai_client._HEDGE_STATS["hedge_won"] == before["hedge_won"] + 1
+
+
+def test_hedge_surfaces_the_original_error_when_both_fail():
+    attempts = []
+
+    async def call():
+        attempt = len(attempts)
+        attempts.append(attempt)
+        await asyncio.sleep(0.1 if attempt == 0 else 0)
+        raise ValueError(f"failed {attempt}")
+
+    with pytest.raises(ValueError, match="failed 0"):
+        asyncio.run(hedged(call, after_ms=20))
+
+
+class FakeHTTP:
+    def __init__(self, statuses, headers=None):
+        self.statuses = list(statuses)
+        self.headers = headers or {}
+        self.calls = 0
+
+    async def get(self, url, follow_redirects=False):
+        self.calls += 1
+        status = self.statuses.pop(0)
+        return httpx.Response(status, headers=self.headers, request=httpx.Request("GET", url))
+
+
+def _patch(monkeypatch, fake):
+    delays = []
+
+    async def no_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(openai_client, "http_client", fake)
+    monkeypatch.setattr(openai_client.asyncio, "sleep", no_sleep)
+    monkeypatch.setattr(openai_client, "backoff_delay", lambda attempt: 0.5 * 2 ** attempt)
+    return delays
+
+
+def test_retries_back_off_on_5xx_and_succeed(monkeypatch):
+    fake = FakeHTTP([503, 502, 200])
+    delays = _patch(monkeypatch, fake)
+    response = asyncio.run(get_with_retries("https://files.example/img.png", retries=3))
+    assert response.status_code == 200 and fake.calls == 3
+    assert delays == [0.5, 1.0]
+
+
+def test_retry_after_header_is_honoured(monkeypatch):
+    fake = FakeHTTP([429, 200], headers={"retry-after": "3"})
+    delays = _patch(monkeypatch, fake)
+    asyncio.run(get_with_retries("https://files.example/img.png"))
+    assert delays == [3.0]
+
+
+def test_retries_stop_on_4xx(monkeypatch):
+    fake = FakeHTTP([404, 200])
+    delays = _patch(monkeypatch, fake)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(get_with_retries("https://files.example/img.png"))
+    assert fake.calls == 1 and delays == []
+
+
+def test_retries_give_up_with_the_last_error(monkeypatch):
+    fake = FakeHTTP([500, 500, 500])
+    delays = _patch(monkeypatch, fake)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(get_with_retries("https://files.example/img.png", retries=2))
+    assert fake.calls == 3 and len(delays) == 2
+
+
+def test_transport_stats_tolerate_missing_pool_internals(monkeypatch):
+    assert {"http2", "max_connections", "calls"} <= set(transport_stats())
+    monkeypatch.setattr(openai_client, "http_client", object())
+    stats = transport_stats()
+    assert "connections" not in stats and stats["max_connections"] == openai_client.HTTP_MAX_CONNECTIONS
@@ -0,0 +1,73 @@
+import asyncio
+import tempfile
+
+from app.services.report_cache import ReportCache, store_markdown
+
+
+def _creator(directory, calls, gate):
+    async def create():
+        calls.append(1)
+        await gate.wait()
+        _, path, _ = store_markdown("# Report", directory)
+        return {"filepath": path}
+
+    return create
+
+
+def test_identical_misses_share_one_create_and_fill_the_cache():
+    async def run(directory):
+        cache, calls, gate = ReportCache(), [], asyncio.Event()
+        create = _creator(directory, calls, gate)
+        waiters = [asyncio.ensure_future(cache.get_or_create("k", create)) for _ in range(3)]
+        await asyncio.sleep(0)
+        gate.set()
+        results = await asyncio.gather(*waiters)
+        again = await cache.get_or_create("k", create)
+        return results, again, calls, cache.stats()
+
+    with tempfile.TemporaryDirectory() as directory:
+        results, again, calls, stats = asyncio.run(run(directory))
+    assert len(calls) == 1
+    assert [cached for _, cached in results] == [False, True, True]
+    assert again[1] is True
+    assert stats["coalesced"] == 2 and stats["inflight"] == 0
+
+
+def test_cancelled_leader_does_not_fail_its_followers():
+    async def run(directory):
+        cache, calls, gate = ReportCache(), [], asyncio.Event()
+        create = _creator(directory, calls, gate)
+        leader = asyncio.ensure_future(cache.get_or_create("k", create))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(cache.get_or_create("k", create))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        gate.set()
+        report, cached = await follower
+        return leader, report, cached, calls, cache.get("k")
+
+    with tempfile.TemporaryDirectory() as directory:
+        leader, report, cached, calls, stored = asyncio.run(run(directory))
+    assert leader.cancelled()
+    assert report["filepath"].endswith(".md") and cached is True
+    assert len(calls) == 1
+    assert stored == report
+
+
+def test_failures_reach_every_waiter_and_are_not_cached():
+    async def run():
+        cache = ReportCache()
+
+        async def create():
+            await asyncio.sleep(0)
+            raise RuntimeError("model unavailable")
+
+        results = await asyncio.gather(
+            cache.get_or_create("k", create), cache.get_or_create("k", create), return_exceptions=True
+        )
+        return results, cache.get("k"), cache.stats()["inflight"]
+
+    results, stored, inflight = asyncio.run(run())
+    assert [str(r) for r in results] == ["model unavailable"] * 2
+    assert stored is None and inflight == 0
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import tempfile
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import reports
+from app.core.admission import Overloaded
+from app.services.report_cache import ReportCache, report_key, store_markdown
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.include_router(reports.router)
+    return TestClient(app)
+
+
+def _cache_report(cache, directory, query, model="gpt-4o-mini"):
+    digest, path, _ = store_markdown(f"# {query}", directory)
+    report = {"report_id": digest, "filepath": path, "markdown": f"# {query}", "json": {}, "response_id": None}
+    cache.put(report_key("summary", reports.SCHEMAS["summary"], query, model), report)
+    return report
+
+
+def _overloaded(monkeypatch):
+    async def acquire(route, model=None):
+        raise Overloaded(503, "reports: timed out waiting for capacity", 1)
+
+    monkeypatch.setattr(reports.admission, "acquire", acquire)
+
+
+def test_cache_hits_take_no_admission_slot(monkeypatch):
+    cache = ReportCache()
+    monkeypatch.setattr(reports, "report_cache", cache)
+    _overloaded(monkeypatch)
+    with tempfile.TemporaryDirectory() as directory:
+        _cache_report(cache, directory, "cached")
+        with _client() as client:
+            hit = client.post("/reports/", json={"schema_id": "summary", "query": "cached"})
+            streamed = client.post("/reports/stream", json={"schema_id": "summary", "query": "cached"})
+            miss = client.post("/reports/", json={"schema_id": "summary", "query": "new"})
+            stream_miss = client.post("/reports/stream", json={"schema_id": "summary", "query": "new"})
+
+    assert hit.status_code == 200 and hit.json()["cached"] is True
+    assert streamed.status_code == 200 and '"cached": true' in streamed.text
+    assert miss.status_code == 503 and "Retry-After" in miss.headers
+    assert stream_miss.status_code == 503
+
+
+def test_report_file_removed_from_disk_is_discarded():
+    cache = ReportCache()
+    with tempfile.TemporaryDirectory() as directory:
+        report = _cache_report(cache, directory, "gone")
+    assert cache.get(report_key("summary", reports.SCHEMAS["summary"], "gone", "gpt-4o-mini")) is None
+    assert cache.stats()["entries"] == 0
+    assert not cache.entries.discard("missing")
+    assert report["filepath"].endswith(".md")
+
+
+def _batch(monkeypatch, queries, delays, fail=(), **body):
+    active = {"now": 0, "max": 0}
+
+    class Ticket:
+        def release(self):
+            pass
+
+    async def acquire(route, model=None):
+        return Ticket()
+
+    async def generate(item):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        try:
+            await asyncio.sleep(delays[item.query])
+            if item.query in fail:
+                raise RuntimeError(f"upstream failed for {item.query}")
+            return {"report_id": item.query, "filepath": "", "markdown": "", "json": {}, "response_id": None}
+        finally:
+            active["now"] -= 1
+
+    monkeypatch.setattr(reports, "report_cache", ReportCache())
+    monkeypatch.setattr(reports.admission, "acquire", acquire)
+    monkeypatch.setattr(reports, "_generate_report", generate)
+    with _client() as client:
+        response = client.post("/reports/batch", json={"schema_id": "summary", "queries": queries, **body})
+    return response, active["max"]
+
+
+def test_batch_streams_ndjson_in_completion_order(monkeypatch):
+    queries = ["slow", "medium", "fast"]
+    response, _ = _batch(monkeypatch, queries, {"slow": 0.15, "medium": 0.08, "fast": 0.01}, concurrency=3)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.text.endswith("\n")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [(r["type"], r.get("index")) for r in records[:-1]] == [("report", 2), ("report", 1), ("report", 0)]
+    assert [r["report_id"] for r in records[:-1]] == ["fast", "medium", "slow"]
+    assert records[-1]["type"] == "summary" and records[-1]["succeeded"] == 3
+
+
+def test_batch_item_errors_are_isolated_and_not_counted_as_throughput(monkeypatch):
+    queries = ["a", "bad", "c"]
+    response, _ = _batch(monkeypatch, queries, dict.fromkeys(queries, 0.01), fail={"bad"})
+
+    records = [json.loads(line) for line in response.text.splitlines()]
+    by_index = {r["index"]: r for r in records if r["type"] != "summary"}
+    assert by_index[1]["type"] == "error" and by_index[1]["query"] == "bad"
+    assert "upstream failed for bad" in by_index[1]["error"]
+    assert by_index[0]["type"] == by_index[2]["type"] == "report"
+    summary = records[-1]
+    assert (summary["succeeded"], summary["failed"]) == (2, 1)
+    assert summary["reports_per_s"] == pytest.approx(2 / summary["elapsed_s"], rel=0.1)
+
+
+def test_batch_takes_at_most_half_the_route_slots(monkeypatch):
+    monkeypatch.setitem(reports.ROUTE_LIMITS, "reports", 8)
+    queries = [f"q{i}" for i in range(12)]
+    response, peak = _batch(monkeypatch, queries, dict.fromkeys(queries, 0.02), concurrency=64)
+
+    summary = json.loads(response.text.splitlines()[-1])
+    assert summary["concurrency"] == 4 and peak == 4
+    assert summary["succeeded"] == 12
@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+from app.api.chat import replay_cached
+from app.services.response_cache import CachedResponse, ResponseCache, cache_key
+
+
+def _entry(text: str, **kwargs) -> CachedResponse:
+    return CachedResponse(deltas=[text], final_text=None, response_id="resp_1", model="m", **kwargs)
+
+
+def test_cache_key_ignores_field_order():
+    assert cache_key(a=1, b="x") == cache_key(b="x", a=1)
+    assert cache_key(a=1) != cache_key(a=2)
+
+
+def test_get_put_counts_hits_and_misses():
+    cache = ResponseCache(ttl=60, max_entries=4, max_bytes=1024, enabled=True)
+    assert cache.get("k") is None
+    cache.put("k", _entry("hello"))
+    assert cache.get("k").deltas == ["hello"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["bytes"]) == (1, 1, 1, 5)
+
+
+def test_expired_entries_are_dropped():
+    cache = ResponseCache(ttl=10, max_entries=4, max_bytes=1024, enabled=True)
+    cache.put("k", _entry("old", created_at=0.0))
+    assert cache.get("k") is None
+    assert cache.stats()["expirations"] == 1 and cache.stats()["bytes"] == 0
+
+
+def test_lru_eviction_by_count_and_bytes():
+    cache = ResponseCache(ttl=60, max_entries=2, max_bytes=10, enabled=True)
+    cache.put("a", _entry("aaa"))
+    cache.put("b", _entry("bbb"))
+    cache.get("a")
+    cache.put("c", _entry("ccc"))
+    assert cache.get("b") is None and cache.get("a") is not None
+
+    cache.put("d", _entry("dddddddd"))
+    assert cache.stats()["bytes"] <= 10
+    assert cache.get("d") is not None
+
+    # Larger than the whole budget: never stored
+    cache.put("e", _entry("e" * 11))
+    assert cache.get("e") is None
+
+
+def test_replay_yields_the_live_event_sequence():
+    entry = CachedResponse(deltas=["Hel", "lo"], final_text="Hello", response_id="resp_9", model="m")
+
+    async def collect():
+        return [frame async for frame in replay_cached(entry, delay_ms=0)]
+
+    frames = [json.loads(f[len(b"data: "):]) for f in asyncio.run(collect())]
+    assert frames == [
+        {"type": "delta", "content": "Hel"},
+        {"type": "delta", "content": "lo"},
+        {"type": "final", "content": "Hello"},
+        {"type": "response", "response_id": "resp_9", "cached": True},
+        {"type": "done"},
+    ]
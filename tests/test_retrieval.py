@@ -0,0 +1,181 @@
+import asyncio
+
+import numpy as np
+
+from app.services import retrieval
+from app.services.embeddings import HashingEmbedder, set_embedder
+from app.services.vector_index import VectorIndex
+
+DOCS = [
+    ("Invoices are due thirty days after the billing date.", {"source": "billing.md", "team": "finance"}),
+    ("The on-call engineer restarts the ingestion worker.", {"source": "runbook.md", "team": "ops"}),
+    ("Quarterly revenue grew in the northern region.", {"source": "report.md", "team": "finance"}),
+]
+
+
+def _fresh_index() -> None:
+    set_embedder(HashingEmbedder(dim=64))
+    retrieval._INDEX = None
+
+
+def test_retrieve_ranks_matching_chunk_first():
+    _fresh_index()
+
+    async def run():
+        added = await retrieval.add_chunks([t for t, _ in DOCS], [m for _, m in DOCS])
+        hits, timings = await retrieval.retrieve("who restarts the ingestion worker", k=2)
+        return added, hits, timings
+
+    added, hits, timings = asyncio.run(run())
+    assert added == 3
+    assert hits[0]["metadata"]["source"] == "runbook.md"
+    assert len(hits) == 2
+    assert set(timings) == {"embed_ms", "search_ms", "total_ms"}
+
+
+def test_add_chunks_skips_identical_text():
+    _fresh_index()
+
+    async def run():
+        first = await retrieval.add_chunks([DOCS[0][0]])
+        second = await retrieval.add_chunks([DOCS[0][0]])
+        return first, second
+
+    assert asyncio.run(run()) == (1, 0)
+    assert len(retrieval.get_index()) == 1
+
+
+def test_retrieve_filters_and_min_score():
+    _fresh_index()
+
+    async def run():
+        await retrieval.add_chunks([t for t, _ in DOCS], [m for _, m in DOCS])
+        filtered, _ = await retrieval.retrieve("engineer", k=3, filters={"team": "finance"})
+        strict, _ = await retrieval.retrieve("engineer", k=3, min_score=1.01)
+        return filtered, strict
+
+    filtered, strict = asyncio.run(run())
+    assert {h["metadata"]["team"] for h in filtered} == {"finance"}
+    assert strict == []
+
+
+def test_build_instructions_cites_sources():
+    hits = [{"id": "abc12345", "text": "chunk text", "metadata": {"source": "a.md"}}]
+    text = retrieval.build_instructions("Base.", hits)
+    assert text.startswith("Base.\n\n" + retrieval.CONTEXT_HEADER)
+    assert "[1] (a.md)\nchunk text" in text
+    assert retrieval.build_instructions("Base.", []) == "Base."
+
+
+def _unit_rows(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    rows = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def test_index_remove_tombstones_and_add_revives():
+    index = VectorIndex(8)
+    vectors = _unit_rows(3, 8)
+    index.add(["a", "b", "c"], vectors, ["A", "B", "C"])
+
+    assert index.remove(["a"]) == 1
+    assert "a" not in index and len(index) == 2
+    assert [h["id"] for h in index.search(vectors[0], k=3)] == [
+        h["id"] for h in index.search(vectors[0], k=3, exact=True)
+    ]
+    assert "a" not in {h["id"] for h in index.search(vectors[0], k=3)}
+
+    assert index.add(["a"], vectors[:1], ["A"]) == 1
+    assert index.search(vectors[0], k=1)[0]["id"] == "a"
+
+
+def test_index_rejects_wrong_shape():
+    index = VectorIndex(8)
+    try:
+        index.add(["a"], np.zeros((1, 4), dtype=np.float32), ["A"])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_ivf_matches_exact_when_probing_every_partition():
+    vectors = _unit_rows(600, 16, seed=1)
+    ids = [str(i) for i in range(600)]
+    index = VectorIndex(16, ivf_threshold=500, nprobe=4096)
+    index.add(ids, vectors, ids)
+    assert index.mode == "ivf"
+
+    query = vectors[42]
+    ivf = [h["id"] for h in index.search(query, k=5)]
+    exact = [h["id"] for h in index.search(query, k=5, exact=True)]
+    assert ivf == exact and ivf[0] == "42"
+
+
+def test_tombstones_are_compacted_past_the_ratio():
+    vectors = _unit_rows(600, 16, seed=2)
+    ids = [str(i) for i in range(600)]
+    index = VectorIndex(16, ivf_threshold=300, nprobe=4096, compact_ratio=0.25)
+    index.add(ids, vectors, ids)
+    assert index.mode == "ivf"
+
+    index.remove(ids[:100])
+    assert index.stats()["tombstones"] == 100 and index.stats()["compactions"] == 0
+    index.remove(ids[100:200])
+    stats = index.stats()
+    assert stats["tombstones"] == 0 and stats["compactions"] == 1 and stats["size"] == 400
+    # Partitions are renumbered, not retrained: probing all of them is still exact
+    assert index.mode == "ivf"
+    for row in (200, 420, 599):
+        ivf = [h["id"] for h in index.search(vectors[row], k=5)]
+        assert ivf == [h["id"] for h in index.search(vectors[row], k=5, exact=True)]
+        assert ivf[0] == str(row)
+    assert "50" not in index and index.search(vectors[50], k=1)[0]["id"] != "50"
+
+    index.remove(ids[200:400])
+    assert index.stats()["compactions"] == 2 and index.mode == "exact"
+    assert index.add(ids[:1], vectors[:1], ids[:1]) == 1
+    assert index.search(vectors[0], k=1)[0]["id"] == "0"
+
+
+def test_training_does_not_hold_the_index_lock(monkeypatch):
+    import threading
+
+    from app.services import vector_index
+
+    vectors = _unit_rows(600, 16, seed=3)
+    ids = [str(i) for i in range(600)]
+    index = VectorIndex(16, ivf_threshold=500)
+    index.add(ids[:400], vectors[:400], ids[:400])
+    started, release = threading.Event(), threading.Event()
+    train = vector_index._IVFPartitions.train
+
+    def slow_train(snapshot, seed=0):
+        started.set()
+        release.wait(5)
+        return train(snapshot, seed)
+
+    monkeypatch.setattr(vector_index._IVFPartitions, "train", staticmethod(slow_train))
+
+    async def run():
+        adding = asyncio.create_task(asyncio.to_thread(index.add, ids[400:], vectors[400:], ids[400:]))
+        await asyncio.to_thread(started.wait, 5)
+        # Searches and further adds proceed while k-means runs
+        hits = await asyncio.wait_for(asyncio.to_thread(index.search, vectors[450], 1), 1)
+        release.set()
+        await adding
+        return hits
+
+    hits = asyncio.run(run())
+    assert hits[0]["id"] == "450"
+    assert index.mode == "ivf"
+
+
+def test_embedder_base_class_is_abstract():
+    from app.services.embeddings import Embedder
+
+    try:
+        Embedder()
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("expected TypeError")
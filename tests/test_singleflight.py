@@ -0,0 +1,73 @@
+import asyncio
+
+from app.services.singleflight import SingleFlight
+from app.services.stream_registry import StreamRegistry
+
+
+def test_identical_streams_share_one_producer():
+    async def run():
+        registry = StreamRegistry(grace_s=60, abandon_grace_s=60)
+        flights = SingleFlight(registry)
+        calls = []
+        release = asyncio.Event()
+
+        async def produce():
+            calls.append(1)
+            yield b"data: one\n\n"
+            await release.wait()
+            yield b"data: two\n\n"
+
+        leader, started = flights.join("k", produce)
+        follower, joined = flights.join("k", produce)
+        readers = [asyncio.create_task(_read(b.follow())) for b in (leader, follower)]
+        await asyncio.sleep(0)
+        release.set()
+        frames = await asyncio.gather(*readers)
+        return calls, started, joined, leader is follower, frames, flights.stats()
+
+    calls, started, joined, same, frames, stats = asyncio.run(run())
+    assert calls == [1] and started and not joined and same
+    assert frames[0] == frames[1] and len(frames[0]) == 2
+    assert stats["upstream_streams"] == 1 and stats["coalesced_requests"] == 1
+    assert stats["inflight"] == 0
+
+
+def test_finished_stream_is_not_joined():
+    async def run():
+        flights = SingleFlight(StreamRegistry(grace_s=60, abandon_grace_s=60))
+
+        async def produce():
+            yield b"data: x\n\n"
+
+        first, _ = flights.join("k", produce)
+        await _read(first.follow())
+        second, started = flights.join("k", produce)
+        return first is second, started
+
+    assert asyncio.run(run()) == (False, True)
+
+
+def test_follower_cannot_join_after_ring_dropped_first_frame():
+    async def run():
+        registry = StreamRegistry(grace_s=60, abandon_grace_s=60)
+        flights = SingleFlight(registry)
+        release = asyncio.Event()
+
+        async def produce():
+            yield b"x" * 64
+            yield b"y" * 64
+            await release.wait()
+
+        leader, _ = flights.join("k", produce)
+        leader.max_bytes = 100
+        await asyncio.sleep(0.01)
+        late, started = flights.join("k", produce)
+        release.set()
+        return leader.first_seq, late is leader, started
+
+    first_seq, same, started = asyncio.run(run())
+    assert first_seq > 0 and not same and started
+
+
+async def _read(iterator):
+    return [frame async for frame in iterator]
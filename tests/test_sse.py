@@ -0,0 +1,99 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.sse import MergedDelta, coalesce_deltas, sse_delta_bytes, sse_event_bytes
+
+
+def _delta(text):
+    return SimpleNamespace(type="response.output_text.delta", delta=text)
+
+
+def _event(kind):
+    return SimpleNamespace(type=kind)
+
+
+async def _source(events, then_hang=False, error=None):
+    for event in events:
+        yield event
+    if error is not None:
+        raise error
+    if then_hang:
+        await asyncio.Event().wait()
+
+
+def _describe(item):
+    return ("delta", item.delta) if isinstance(item, MergedDelta) else ("event", item.type)
+
+
+def test_delta_frame_matches_the_generic_encoder():
+    text = 'quote " slash \\ newline \n é'
+    assert sse_delta_bytes(text) == sse_event_bytes({"type": "delta", "content": text})
+
+
+def test_runs_of_deltas_merge_in_order_around_other_events():
+    events = [_delta("a"), _delta("b"), _event("response.created"), _delta("c"), _delta(""), _delta("d"),
+              _event("response.completed")]
+
+    async def run():
+        return [_describe(item) async for item in coalesce_deltas(_source(events), window_ms=20, max_bytes=1024)]
+
+    assert asyncio.run(run()) == [
+        ("delta", "ab"), ("event", "response.created"), ("delta", "cd"), ("event", "response.completed"),
+    ]
+
+
+def test_zero_window_passes_events_through_untouched():
+    events = [_delta("a"), _delta("b")]
+
+    async def run():
+        return [item async for item in coalesce_deltas(_source(events), window_ms=0)]
+
+    assert asyncio.run(run()) == events
+
+
+async def _first(stream, count=1):
+    started = time.perf_counter()
+    items = []
+    async for item in stream:
+        items.append(_describe(item))
+        if len(items) == count:
+            break
+    await stream.aclose()
+    return items, time.perf_counter() - started
+
+
+def test_non_delta_event_flushes_without_waiting_for_the_window():
+    stream = coalesce_deltas(_source([_delta("a"), _event("response.completed")], then_hang=True), window_ms=5000)
+    items, elapsed = asyncio.run(_first(stream, 2))
+    assert items == [("delta", "a"), ("event", "response.completed")]
+    assert elapsed < 1
+
+
+def test_buffer_reaching_max_bytes_flushes_early():
+    stream = coalesce_deltas(_source([_delta("x" * 6), _delta("y" * 6)], then_hang=True), window_ms=5000, max_bytes=10)
+    items, elapsed = asyncio.run(_first(stream))
+    assert items == [("delta", "x" * 6 + "y" * 6)]
+    assert elapsed < 1
+
+
+def test_lone_delta_is_flushed_after_the_window():
+    stream = coalesce_deltas(_source([_delta("a")], then_hang=True), window_ms=80, max_bytes=1024)
+    items, elapsed = asyncio.run(_first(stream))
+    assert items == [("delta", "a")]
+    assert 0.06 <= elapsed < 1
+
+
+def test_upstream_errors_propagate_after_buffered_deltas():
+    async def run():
+        seen = []
+        with pytest.raises(RuntimeError, match="upstream reset"):
+            async for item in coalesce_deltas(
+                _source([_delta("a"), _delta("b")], error=RuntimeError("upstream reset")), window_ms=20
+            ):
+                seen.append(_describe(item))
+        return seen
+
+    assert asyncio.run(run()) == [("delta", "ab")]
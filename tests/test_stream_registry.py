@@ -0,0 +1,110 @@
+import asyncio
+
+from app.services.stream_registry import StreamBuffer, StreamRegistry, parse_event_id
+
+
+async def _read(iterator):
+    return [frame async for frame in iterator]
+
+
+def test_parse_event_id():
+    assert parse_event_id("abc123-7") == ("abc123", 7)
+    assert parse_event_id(" abc-def-12 ") == ("abc-def", 12)
+    for bad in (None, "", "abc", "abc-", "-3", "abc-x"):
+        assert parse_event_id(bad) is None
+
+
+def test_resume_continues_after_last_event_id():
+    async def run():
+        registry = StreamRegistry(grace_s=60, abandon_grace_s=60)
+
+        async def produce():
+            for i in range(4):
+                yield f"data: {i}\n\n"
+
+        buffer = registry.start(produce)
+        full = await _read(buffer.follow())
+        resumed = await _read(registry.resume(f"{buffer.stream_id}-1"))
+        return buffer.stream_id, full, resumed, registry.resume("unknown-1")
+
+    stream_id, full, resumed, unknown = asyncio.run(run())
+    assert full[0] == f"id: {stream_id}-0\ndata: 0\n\n".encode()
+    assert resumed == full[2:]
+    assert unknown is None
+
+
+def test_resume_past_the_ring_reports_a_gap():
+    async def run():
+        buffer = StreamBuffer("s", max_bytes=20)
+        for i in range(5):
+            buffer.publish(f"data: {i}\n\n")
+        buffer.close()
+        return buffer.first_seq, await _read(buffer.follow(0))
+
+    first_seq, frames = asyncio.run(run())
+    assert first_seq > 1
+    assert b'"code": "resume_gap"' in frames[0]
+    assert frames[1].startswith(f"id: s-{first_seq}\n".encode())
+
+
+def test_abandoned_stream_cancels_its_producer():
+    async def run():
+        registry = StreamRegistry(grace_s=60, abandon_grace_s=0.01)
+        cancelled = asyncio.Event()
+
+        async def produce():
+            try:
+                yield b"data: first\n\n"
+                await asyncio.sleep(60)
+            finally:
+                cancelled.set()
+
+        buffer = registry.start(produce)
+        reader = buffer.follow()
+        await reader.__anext__()
+        await reader.aclose()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await asyncio.sleep(0)
+        return buffer, registry.stats()
+
+    buffer, stats = asyncio.run(run())
+    assert buffer.closed and stats["abandoned"] == 1
+    assert b'"code": "cancelled"' in buffer.frames[-1]
+
+
+def test_reconnect_within_grace_keeps_producer_running():
+    async def run():
+        registry = StreamRegistry(grace_s=60, abandon_grace_s=0.05)
+        release = asyncio.Event()
+
+        async def produce():
+            yield b"data: first\n\n"
+            await release.wait()
+            yield b"data: last\n\n"
+
+        buffer = registry.start(produce)
+        reader = buffer.follow()
+        await reader.__anext__()
+        await reader.aclose()
+        again = asyncio.create_task(_read(registry.resume(f"{buffer.stream_id}-0")))
+        await asyncio.sleep(0.1)
+        release.set()
+        return await again, registry.stats()
+
+    frames, stats = asyncio.run(run())
+    assert stats["abandoned"] == 0
+    assert frames[-1].endswith(b"data: last\n\n")
+
+
+def test_failing_producer_publishes_an_error_frame():
+    async def run():
+        registry = StreamRegistry(grace_s=60, abandon_grace_s=60)
+
+        async def produce():
+            yield b"data: ok\n\n"
+            raise RuntimeError("upstream broke")
+
+        return await _read(registry.start(produce).follow())
+
+    frames = asyncio.run(run())
+    assert b"upstream broke" in frames[-1]
@@ -0,0 +1,139 @@
+import asyncio
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import threads
+from app.core.openai_client import hedged
+from app.services import chat_history, thread_hydration
+from app.services.chat_history import ChatHistory, encode_cursor
+from app.services.thread_hydration import ThreadHydrator
+
+
+class FakeResponses:
+    """responses.retrieve / input_items.list over a fixed chain of ids"""
+
+    def __init__(self, ids, delay=0.01, stall=(), fail_inputs=False):
+        self.chain = {rid: (ids[i - 1] if i else None) for i, rid in enumerate(ids)}
+        self.order = {rid: i for i, rid in enumerate(ids)}
+        self.delay = delay
+        self.stall = set(stall)
+        self.fail_inputs = fail_inputs
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self.input_items = SimpleNamespace(list=self._inputs)
+
+    async def _wait(self, kind, rid):
+        self.calls.append((kind, rid))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            if (kind, rid) in self.stall:
+                # Only the first attempt stalls; a hedged retry comes back quickly
+                self.stall.discard((kind, rid))
+                await asyncio.sleep(5)
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+
+    async def retrieve(self, rid):
+        await self._wait("retrieve", rid)
+        text = SimpleNamespace(type="output_text", text=f"a {rid}")
+        return SimpleNamespace(
+            id=rid, previous_response_id=self.chain[rid], output=[SimpleNamespace(content=[text])],
+            model="m", created_at=1_700_000_000.0 + self.order[rid], metadata=None,
+        )
+
+    async def _inputs(self, rid):
+        await self._wait("inputs", rid)
+        if self.fail_inputs:
+            raise RuntimeError("input items unavailable")
+        return SimpleNamespace(data=[SimpleNamespace(content=[SimpleNamespace(type="input_text", text=f"q {rid}")])])
+
+
+def _setup(monkeypatch, fake):
+    monkeypatch.setattr(chat_history, "_HISTORY", ChatHistory(max_entries=100, max_bytes=1 << 20, ttl=60))
+    monkeypatch.setattr(thread_hydration, "client", SimpleNamespace(responses=fake))
+    hydrator = ThreadHydrator()
+    monkeypatch.setattr(threads, "thread_hydrator", hydrator)
+    return hydrator
+
+
+def _assistant_ids(messages):
+    return [m["id"] for m in messages if m["role"] == "assistant"]
+
+
+def test_hydration_overlaps_inputs_with_the_next_retrieve(monkeypatch):
+    fake = FakeResponses(["p0", "p1", "p2", "p3"])
+    hydrator = _setup(monkeypatch, fake)
+    result = asyncio.run(hydrator.hydrate("p3", 10))
+
+    assert _assistant_ids(result["messages"]) == ["p0", "p1", "p2", "p3"]
+    assert [m["content"] for m in result["messages"]][:2] == ["q p0", "a p0"]
+    assert result["oldest_id"] == "p0" and result["missing_from"] is None
+    assert result["hydration"]["hops"] == 4 and result["hydration"]["round_trips"] == 8
+    # input_items.list for a hop runs alongside the retrieve of the next one
+    assert fake.max_active >= 2
+    assert chat_history._HISTORY.get("p0") is not None
+
+
+def test_max_hops_stops_early_and_reports_where(monkeypatch):
+    fake = FakeResponses(["p0", "p1", "p2", "p3"])
+    hydrator = _setup(monkeypatch, fake)
+    result = asyncio.run(hydrator.hydrate("p3", 2))
+    assert _assistant_ids(result["messages"]) == ["p2", "p3"]
+    assert result["missing_from"] == "p1"
+    assert ("retrieve", "p1") not in fake.calls
+
+
+def test_stalled_fetch_is_hedged_and_missing_inputs_degrade(monkeypatch):
+    fake = FakeResponses(["p0", "p1"], stall=[("retrieve", "p1")], fail_inputs=True)
+    hydrator = _setup(monkeypatch, fake)
+    monkeypatch.setattr(thread_hydration, "hedged", lambda call: hedged(call, after_ms=30))
+    result = asyncio.run(asyncio.wait_for(hydrator.hydrate("p1", 5), 2))
+
+    assert fake.calls.count(("retrieve", "p1")) == 2
+    assert _assistant_ids(result["messages"]) == ["p0", "p1"]
+    # input_items failed: the exchange is kept with its assistant side only
+    assert {m["role"] for m in result["messages"]} == {"assistant"}
+
+
+def test_concurrent_hydrations_share_one_upstream_walk(monkeypatch):
+    fake = FakeResponses(["p0", "p1"])
+    hydrator = _setup(monkeypatch, fake)
+
+    async def run():
+        return await asyncio.gather(hydrator.hydrate("p1", 5), hydrator.hydrate("p1", 5))
+
+    first, second = asyncio.run(run())
+    assert first["messages"] == second["messages"]
+    assert [first["hydration"]["coalesced"], second["hydration"]["coalesced"]] == [False, True]
+    assert fake.calls.count(("retrieve", "p1")) == 1
+    assert hydrator.stats()["coalesced"] == 1
+
+
+def test_cursor_pages_from_upstream_match_the_materialized_thread(monkeypatch):
+    ids = [f"h{i}" for i in range(5)]
+    fake = FakeResponses(ids)
+    _setup(monkeypatch, fake)
+    app = FastAPI()
+    app.include_router(threads.router)
+
+    with TestClient(app) as client:
+        pages = [client.get("/threads/h4/messages", params={"limit": 2}).json()]
+        while pages[-1]["cursors"]["before"]:
+            before = pages[-1]["cursors"]["before"]
+            pages.append(client.get("/threads/h4/messages", params={"limit": 2, "before": before}).json())
+        upstream_calls = len(fake.calls)
+        materialized = client.get("/threads/h4/messages", params={"limit": 5}).json()
+
+    assert [_assistant_ids(p["messages"]) for p in pages] == [["h3", "h4"], ["h1", "h2"], ["h0"]]
+    assert [p["source"] for p in pages] == ["openai"] * 3
+    assert pages[0]["cursors"]["before"] == encode_cursor("h3") and pages[0]["missing_from"] == "h2"
+    assert pages[-1]["missing_from"] is None
+    # Once hydrated, the thread is served from memory with the same content
+    assert materialized["source"] == "cache" and len(fake.calls) == upstream_calls
+    live = [m for page in reversed(pages) for m in page["messages"]]
+    assert materialized["messages"] == live
@@ -0,0 +1,113 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import threads
+from app.services import chat_history
+from app.services.chat_history import ChatHistory, _Entry, decode_cursor, encode_cursor, save_entry, thread_page
+
+
+def _entry(response_id, previous=None):
+    return _Entry(response_id, previous, f"q {response_id}", f"a {response_id}", "m", 0.0, None)
+
+
+def _history(*links):
+    history = ChatHistory(max_entries=100, max_bytes=1 << 20, ttl=60, shards=4)
+    for response_id, previous in links:
+        history.put(_entry(response_id, previous))
+    return history
+
+
+def _ids(entries):
+    return [e.response_id for e in entries]
+
+
+def test_before_pages_back_across_a_fork():
+    # a-b-c, then d forks off b
+    history = _history(("a", None), ("b", "a"), ("c", "b"), ("d", "b"))
+    entries, missing = history.before(history.get("d"), 2)
+    assert _ids(entries) == ["b", "d"] and missing == "a"
+    entries, missing = history.before(history.get("d"), 10)
+    assert _ids(entries) == ["a", "b", "d"] and missing is None
+
+
+def test_before_reports_the_first_evicted_exchange():
+    history = _history(("a", None), ("b", "a"), ("c", "b"))
+    history._drop(history._shard("b"), "b")
+    entries, missing = history.before(history.get("c"), 5)
+    assert _ids(entries) == ["c"] and missing == "b"
+
+
+def test_after_walks_forward_to_the_anchor():
+    history = _history(("a", None), ("b", "a"), ("c", "b"), ("d", "c"))
+    assert _ids(history.after(history.get("d"), history.get("a"), 2)) == ["b", "c"]
+    assert _ids(history.after(history.get("d"), history.get("c"), 5)) == ["d"]
+    assert history.after(history.get("b"), history.get("d"), 5) is None
+
+
+def test_non_positive_limits_return_empty_pages():
+    history = _history(("a", None), ("b", "a"))
+    assert history.before(history.get("b"), 0) == ([], "b")
+    assert history.after(history.get("b"), history.get("a"), 0) == []
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    assert decode_cursor(encode_cursor("resp_123")) == "resp_123"
+    try:
+        decode_cursor("!!!")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_thread_page_cursors_walk_the_whole_thread(monkeypatch):
+    monkeypatch.setattr(chat_history, "_HISTORY", ChatHistory(max_entries=100, max_bytes=1 << 20, ttl=60))
+
+    async def run():
+        previous = None
+        for i in range(5):
+            await save_entry(
+                response_id=f"t{i}", previous_response_id=previous, user_text=f"q{i}",
+                assistant_text=f"a{i}", model="m", created_at=float(i), persist=False,
+            )
+            previous = f"t{i}"
+        pages = [await thread_page("t4", limit=2)]
+        while pages[-1]["cursors"]["before"]:
+            pages.append(await thread_page("t4", limit=2, before=pages[-1]["cursors"]["before"]))
+        forward = await thread_page("t4", limit=2, after=pages[-1]["cursors"]["before"] or encode_cursor("t0"))
+        return pages, forward
+
+    pages, forward = asyncio.run(run())
+    assert [[m["id"] for m in p["messages"] if m["role"] == "assistant"] for p in pages] == [
+        ["t3", "t4"], ["t1", "t2"], ["t0"],
+    ]
+    assert all(p["source"] == "cache" and p["missing_id"] is None for p in pages)
+    assert [m["id"] for m in forward["messages"] if m["role"] == "assistant"] == ["t1", "t2"]
+    assert forward["cursors"]["after"] == encode_cursor("t2")
+
+
+def test_messages_endpoint_validates_limit():
+    app = FastAPI()
+    app.include_router(threads.router)
+    with TestClient(app) as client:
+        assert client.get("/threads/x/messages?limit=0").status_code == 422
+        assert client.get(f"/threads/x/messages?limit={chat_history.HISTORY_PAGE_MAX_LIMIT + 1}").status_code == 422
+
+
+def test_full_page_from_memory_is_served_with_an_etag(monkeypatch):
+    monkeypatch.setattr(chat_history, "_HISTORY", ChatHistory(max_entries=100, max_bytes=1 << 20, ttl=60))
+    history = chat_history._HISTORY
+    for response_id, previous in (("e0", None), ("e1", "e0"), ("e2", "e1")):
+        history.put(_entry(response_id, previous))
+
+    app = FastAPI()
+    app.include_router(threads.router)
+    with TestClient(app) as client:
+        first = client.get("/threads/e2/messages?limit=2")
+        again = client.get("/threads/e2/messages?limit=2", headers={"If-None-Match": first.headers["etag"]})
+
+    assert first.status_code == 200 and "hydration" not in first.json()
+    assert first.json()["cursors"]["before"] == encode_cursor("e1")
+    assert again.status_code == 304
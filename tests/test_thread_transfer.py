@@ -0,0 +1,160 @@
+import asyncio
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import app.db.session as db_session
+from app.api import threads
+from app.db.models import Base, Message, Thread
+from app.services import thread_transfer
+from app.services.thread_transfer import NDJSONError, export_ndjson, import_ndjson
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _rows():
+    threads = [{"id": t, "title": f"thread {t}", "created_at": START, "updated_at": START, "meta": None}
+               for t in ("t1", "t2")]
+    messages = [
+        {"id": f"m{i}", "thread_id": "t1" if i < 3 else "t2", "role": "user" if i % 2 == 0 else "assistant",
+         "content": f"message {i} é", "created_at": START + timedelta(minutes=i), "model": "m",
+         "meta": {"response_id": f"resp_{i}"}}
+        for i in range(5)
+    ]
+    return threads, messages
+
+
+async def _engine(directory, name, seed=False):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory, name)}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        if seed:
+            threads, messages = _rows()
+            await conn.execute(insert(Thread.__table__), threads)
+            await conn.execute(insert(Message.__table__), messages)
+    return engine
+
+
+async def _count(engine):
+    async with engine.connect() as conn:
+        return (
+            await conn.scalar(select(func.count()).select_from(Thread.__table__)),
+            await conn.scalar(select(func.count()).select_from(Message.__table__)),
+        )
+
+
+async def _body(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def _lines(*records):
+    return b"".join(json.dumps(r).encode() + b"\n" for r in records)
+
+
+THREAD = {"type": "thread", "id": "t9", "title": "x", "created_at": START.isoformat(),
+          "updated_at": START.isoformat(), "meta": None}
+MESSAGE = {"type": "message", "id": "m9", "thread_id": "t9", "role": "user", "content": "hi",
+           "created_at": START.isoformat(), "model": None, "meta": None}
+
+
+def test_export_import_round_trip(monkeypatch):
+    # Small chunks so the import spans several flushes
+    monkeypatch.setattr(thread_transfer, "IMPORT_CHUNK_ROWS", 2)
+    monkeypatch.setattr(thread_transfer, "EXPORT_YIELD_PER", 2)
+
+    async def run(directory):
+        source = await _engine(directory, "source.db", seed=True)
+        target = await _engine(directory, "target.db")
+        try:
+            monkeypatch.setattr(db_session, "engine", source)
+            exported = [chunk async for chunk in export_ndjson()]
+            monkeypatch.setattr(db_session, "engine", target)
+            counts = await import_ndjson(_body(*exported))
+            again = await import_ndjson(_body(*exported))
+            async with target.connect() as conn:
+                messages = (await conn.execute(select(Message.__table__).order_by(Message.id))).mappings().all()
+            return exported, counts, again, [dict(m) for m in messages]
+        finally:
+            await source.dispose()
+            await target.dispose()
+
+    with tempfile.TemporaryDirectory() as directory:
+        exported, counts, again, messages = asyncio.run(run(directory))
+
+    records = [json.loads(line) for line in b"".join(exported).splitlines()]
+    assert [r["type"] for r in records] == ["thread"] * 2 + ["message"] * 5
+    assert counts == {"threads": 2, "messages": 5, "chunks": counts["chunks"], "errors": 0}
+    # Re-importing skips existing ids
+    assert again["messages"] == 5
+    expected = _rows()[1]
+    assert [m["id"] for m in messages] == [m["id"] for m in expected]
+    assert [(m["content"], m["meta"]) for m in messages] == [(m["content"], m["meta"]) for m in expected]
+    assert [m["created_at"].replace(tzinfo=timezone.utc) for m in messages] == [m["created_at"] for m in expected]
+
+
+def _import_error(monkeypatch, *chunks):
+    async def run(directory):
+        engine = await _engine(directory, "import.db")
+        monkeypatch.setattr(db_session, "engine", engine)
+        try:
+            try:
+                await import_ndjson(_body(*chunks))
+            except NDJSONError as e:
+                return e, await _count(engine)
+            raise AssertionError("expected NDJSONError")
+        finally:
+            await engine.dispose()
+
+    with tempfile.TemporaryDirectory() as directory:
+        return asyncio.run(run(directory))
+
+
+def test_malformed_lines_name_their_line_number(monkeypatch):
+    for bad in (b"[1]", b'"x"', b"{not json", b"null"):
+        error, _ = _import_error(monkeypatch, _lines(THREAD) + b"\n" + bad + b"\n")
+        assert error.line == 3, bad
+
+
+def test_oversized_line_is_rejected_even_with_its_newline(monkeypatch):
+    monkeypatch.setattr(thread_transfer, "IMPORT_MAX_LINE_BYTES", 256)
+    long = dict(THREAD, title="x" * 300)
+    error, _ = _import_error(monkeypatch, _lines(THREAD, long))
+    assert error.line == 2 and "longer than 256 bytes" in str(error)
+    # Also when the line has no newline yet
+    error, _ = _import_error(monkeypatch, _lines(THREAD), b"x" * 200, b"x" * 200)
+    assert error.line == 2
+    # And when it is the unterminated last line
+    error, _ = _import_error(monkeypatch, _lines(THREAD) + json.dumps(long).encode())
+    assert error.line == 2
+
+
+def test_bad_line_mid_file_imports_nothing(monkeypatch):
+    monkeypatch.setattr(thread_transfer, "IMPORT_CHUNK_ROWS", 1)
+    bad_time = dict(MESSAGE, id="m10", created_at="yesterday")
+    error, counts = _import_error(monkeypatch, _lines(THREAD, MESSAGE), _lines(bad_time, dict(MESSAGE, id="m11")))
+    assert error.line == 3
+    # Earlier chunks were flushed but rolled back with the transaction
+    assert counts == (0, 0)
+
+
+def test_import_endpoint_returns_422_for_a_bad_line(monkeypatch):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = asyncio.run(_engine(directory, "api.db"))
+        monkeypatch.setattr(db_session, "engine", engine)
+        app = FastAPI()
+        app.include_router(threads.router)
+        with TestClient(app) as client:
+            bad = client.post("/threads/import", content=_lines(THREAD) + b"[1]\n")
+            good = client.post("/threads/import", content=_lines(THREAD, MESSAGE))
+        asyncio.run(engine.dispose())
+
+    assert bad.status_code == 422 and "line 2" in bad.json()["detail"]
+    assert good.status_code == 200, good.text
+    assert good.json()["messages"] == 1